@@ -1,12 +1,17 @@
 """
 Build script for CheatersBlocker using PyInstaller
 Run: python build.py
+     python build.py --onedir   (folder build, starts faster: no unpacking on launch)
 """
 
 import PyInstaller.__main__
 import os
+import sys
 import shutil
 
+# Onefile unpacks itself to a temp folder on every launch; onedir skips that
+onedir = '--onedir' in sys.argv
+
 # Clean previous builds
 print("Cleaning previous builds...")
 if os.path.exists('dist'):
@@ -18,7 +23,7 @@ if os.path.exists('build'):
 args = [
     'main.py',  # Main application file
     '--name=CheatersBlocker',
-    '--onefile',  # Single executable
+    '--onedir' if onedir else '--onefile',  # Folder or single executable
     '--windowed',  # No console window
     '--icon=data/logo.ico',
     '--add-data=data/logo.ico;data/',  # Include icon
@@ -38,7 +43,10 @@ print("Starting PyInstaller build...")
 PyInstaller.__main__.run(args)
 
 print("\nBuild completed successfully!")
-print("Executable file: dist/CheatersBlocker.exe")
+if onedir:
+    print("Executable file: dist/CheatersBlocker/CheatersBlocker.exe")
+else:
+    print("Executable file: dist/CheatersBlocker.exe")
 print("\nNote: The executable requires the following in the same directory:")
 print("1. audio/ folder with sound files (included in executable)")
 print("2. data/ folder with icon (included in executable)")
@@ -0,0 +1,795 @@
+"""
+Headless command line interface for CheatersBlocker (no Qt required)
+
+Examples:
+    python cli.py block --all
+    python cli.py block 1.2.3.4 --direction in
+    python cli.py block 1.2.3.4 --ttl 30m
+    python cli.py block 1.2.3.4 --terminate-flows --wait-drop 10
+    python cli.py block --all --plan --export plan.cmd
+    python cli.py unblock 1.2.3.0-1.2.3.255
+    python cli.py sync
+    python cli.py status
+    python cli.py allow 5.6.7.8
+    python cli.py watch --feed socket:47800
+    python cli.py serve --port 47810
+    python cli.py send "BLOCK both 1.2.3.4" "STATUS 1.2.3.4"
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+from core import (
+    DEFAULT_LIST_URL,
+    IPAddressManager,
+    BlocklistSnapshot,
+    BlockStatusManager,
+    AllowlistManager,
+    ExpiryQueue,
+    ActionPlanner,
+    SettingsManager,
+    check_admin_privileges,
+    parse_duration,
+    parse_entry,
+)
+from prefix_db import PrefixDatabase
+from enforcement import EnforcementPolicy, PolicyEngine, covers_direction, create_peer_feed
+from peer_discovery import PeerDiscoveryEngine
+from firewall_log import FirewallLogTailer, parse_log_time
+from drift import DriftDetector, get_expected_rules, record_repair
+from firewall_backends import create_firewall_backend
+from journal import TransactionJournal, iter_chunks
+from history import BlockHistory, format_duration
+from reports import ReportQueue
+from flows import DropTimer
+from list_feed import DEFAULT_MAX_DELTAS, publish_feed
+from control import (DEFAULT_CONTROL_PORT, DIRECTIONS, ControlDispatcher, ControlServer, format_status,
+                     get_transport, send_commands, split_direction)
+
+
+class HeadlessBlocker:
+    """Runs firewall, blocklist and status operations without a GUI"""
+    
+    def __init__(self, list_url=DEFAULT_LIST_URL):
+        self.list_url = list_url
+        self.settings_manager = SettingsManager()
+        self.firewall_manager = create_firewall_backend(self.settings_manager)
+        self.ip_manager = IPAddressManager()
+        self.block_status_manager = BlockStatusManager()
+        self.block_status_manager.history = BlockHistory(capacity=self.settings_manager.get_history_capacity())
+        self.allowlist_manager = AllowlistManager()
+        self.transaction_journal = TransactionJournal()
+        self.firewall_manager.set_allowlist(self.allowlist_manager)
+        # Set-based backends start from the saved status (netsh rules persist on their own)
+        self.firewall_manager.load_status(self.block_status_manager.block_status, self.ip_manager.get_interval)
+        self.rule_budget = self.settings_manager.get_rule_budget()
+        self.action_planner = ActionPlanner(self.firewall_manager, self.rule_budget)
+        self.firewall_manager.set_call_time_estimates(*self.settings_manager.get_call_time_estimates())
+        self.terminate_flows_enabled = self.settings_manager.get_terminate_flows()
+        self.drop_timer = DropTimer()
+    
+    def load_entries(self):
+        """Downloads the blocklist and returns all entries, falling back to the snapshot"""
+        snapshot = BlocklistSnapshot()
+        success, result = self.ip_manager.load_from_url(self.list_url)
+        if success:
+            snapshot.save(self.ip_manager)
+            return result
+        
+        if not snapshot.load():
+            raise RuntimeError(result)
+        try:
+            entries = self.ip_manager.load_from_snapshot(snapshot)
+        finally:
+            snapshot.close()
+        print(f"{result}; using saved snapshot ({len(entries)} entries)", file=sys.stderr)
+        return entries
+    
+    def normalize_entry(self, entry):
+        """Returns entry as stored in the list (CIDR becomes a range), None if invalid"""
+        parsed = parse_entry(entry.strip())
+        return parsed[0] if parsed else None
+    
+    def apply(self, entries, direction, action, forced=False, ttl=0):
+        """Blocks or unblocks entries in chunks, saving status once per chunk.
+        
+        Only directions that change are touched, like in plan(). With a rule
+        budget, forced entries always get rules; the others are picked by the
+        eviction policy. Blocks expire after ttl seconds if set.
+        Returns (changed, unchanged, errors)."""
+        blocked = action == 'block'
+        changed = []
+        errors = 0
+        started = time.time()
+        
+        # Entries already in the requested state are left alone
+        pending_directions = {}
+        for entry in entries:
+            pending = self.action_planner.get_pending_directions(
+                self.block_status_manager.get_status(entry), direction, action)
+            if pending:
+                pending_directions[entry] = pending
+        if not pending_directions:
+            return 0, len(entries), 0
+        
+        # Journal the intent, so an interrupted run is resumed item by item by 'sync'
+        transaction = self.transaction_journal.begin(
+            action, direction, {entry: self.block_status_manager.get_status(entry) for entry in pending_directions})
+        
+        # One firewall submission (one nft transaction / netsh script) and status write per chunk,
+        # so 'sync' after a crash only redoes the chunk that was in flight
+        for chunk in iter_chunks(list(pending_directions)):
+            chunk_changed = self._apply_chunk(chunk, pending_directions, direction, blocked, ttl)
+            changed.extend(chunk_changed)
+            errors += len(chunk) - len(chunk_changed)
+            transaction.mark_done(chunk_changed)
+        
+        # Rule budget changes settle in one more submission
+        self.firewall_manager.begin_batch()
+        self.enforce_rule_budget(changed if blocked and forced else ())
+        self.firewall_manager.submit_batch()
+        self.block_status_manager.save_status()
+        transaction.commit()
+        self.settings_manager.set_call_time_estimates(self.firewall_manager)
+        
+        # Entries left dormant by the rule budget have no rules to time or enforce
+        if blocked:
+            enforced = [entry for entry in changed if not self.block_status_manager.get_status(entry).get('dormant')]
+            self.drop_timer.start(enforced, started)
+            if self.terminate_flows_enabled and enforced:
+                self.terminate_flows(enforced)
+        self.block_status_manager.flush_history()
+        return len(changed), len(entries) - len(pending_directions), errors
+    
+    def _apply_chunk(self, chunk, pending_directions, direction, blocked, ttl):
+        """Applies one chunk of apply() in one firewall submission and saves status, returns the changed entries"""
+        changed = []
+        self.firewall_manager.begin_batch()
+        for entry in chunk:
+            pending = pending_directions[entry]
+            try:
+                status = dict(self.block_status_manager.get_status(entry))
+                entry_direction = direction if len(pending) == 2 else pending[0]
+                if blocked:
+                    # Same order as the GUI and plan(): wake a dormant entry, then create the new direction
+                    if status.get('dormant'):
+                        del status['dormant']
+                        for other in ['in', 'out']:
+                            if status[other] and other not in pending:
+                                self.firewall_manager.create_rule(entry, other)
+                    self.rule_budget.create_rule(entry, status, entry_direction, self.firewall_manager)
+                elif not status.get('dormant'):
+                    # Dormant entries have no rules to delete
+                    self.firewall_manager.delete_rule(entry, entry_direction)
+                
+                for pending_direction in pending:
+                    status[pending_direction] = blocked
+                if blocked and ttl:
+                    status['expires_at'] = int(time.time()) + ttl
+                elif blocked:
+                    status.pop('expires_at', None)
+                self.block_status_manager.block_status[entry] = status
+                changed.append(entry)
+            except Exception as e:
+                print(f"Error processing {entry}: {e}", file=sys.stderr)
+        self.firewall_manager.submit_batch()
+        self.block_status_manager.save_status()
+        return changed
+    
+    def terminate_flows(self, entries):
+        """Ends established flows of just blocked entries, returns the number of ended flows"""
+        started = time.perf_counter()
+        closed = self.firewall_manager.terminate_flows(entries)
+        print(f"Ended {closed} established flows in {(time.perf_counter() - started) * 1000:.0f} ms", file=sys.stderr)
+        return closed
+    
+    def wait_for_drops(self, entries, timeout):
+        """Waits up to timeout seconds for the first dropped packet of each just blocked entry.
+        
+        Drops are read from nftables element counters (nft_counters = true) or
+        the Windows firewall log (whole seconds, written with a delay).
+        Returns {entry: seconds from the block command, None if no drop was seen}."""
+        entries = [entry for entry in entries if entry in self.drop_timer.pending]
+        if self.firewall_manager.get_drop_counts(entries) is not None:
+            def poll():
+                return self.drop_timer.observe_counts(self.firewall_manager.get_drop_counts(entries) or {})
+            return self.drop_timer.wait(entries, poll, timeout)
+        
+        # A private tailer: the shared state file keeps the hit counters of all entries
+        tailer = FirewallLogTailer(self.settings_manager.get_firewall_log_path(), state_file=os.devnull)
+        tailer.skip_to_end()
+        tailer.set_entries({entry: self.ip_manager.get_interval(entry) for entry in entries})
+        
+        def poll():
+            measured = {}
+            for entry, (_, last_seen) in tailer.poll().items():
+                latency = self.drop_timer.observe(entry, parse_log_time(last_seen), resolution=1.0)
+                if latency is not None:
+                    measured[entry] = latency
+            return measured
+        return self.drop_timer.wait(entries, poll, timeout, poll_interval=0.5)
+    
+    def apply_rule_scope(self):
+        """Rewrites all enforced rules in one batch if they were created with another scope.
+        
+        Returns the number of firewall commands, None if the scope did not change."""
+        scope = self.firewall_manager.get_scope()
+        if self.settings_manager.get_applied_rule_scope() == scope:
+            return None
+        commands = self.firewall_manager.rewrite_rules(self.block_status_manager.block_status)
+        self.settings_manager.set_applied_rule_scope(scope)
+        return commands
+    
+    def recover(self):
+        """Resumes or rolls back bulk operations interrupted by a crash, returns (transactions, entries)"""
+        transactions, recovered = self.transaction_journal.recover(
+            self.block_status_manager.block_status, self.firewall_manager,
+            self.settings_manager.get_journal_recovery())
+        if transactions:
+            self.block_status_manager.save_status()
+            self.block_status_manager.flush_history()
+        return transactions, recovered
+    
+    def plan(self, entries, direction, action, forced=False):
+        """Returns the RulePlan of apply() without touching the firewall or the saved status"""
+        def get_interval(entry):
+            parsed = parse_entry(entry)
+            return parsed[1:] if parsed else None
+        
+        block_status = {entry: self.block_status_manager.get_status(entry) for entry in entries}
+        block_status.update(self.block_status_manager.block_status)
+        planner = ActionPlanner(self.firewall_manager, self.rule_budget)
+        return planner.plan(entries, direction, action, block_status, get_interval, FirewallLogTailer().hits,
+                            entries if action == 'block' and forced else ())
+    
+    def check_drift(self, repair=False):
+        """Compares firewall rules with the saved status, optionally repairing them. Returns DriftReport"""
+        if self.firewall_manager.name != 'netsh':
+            raise RuntimeError(f"drift check lists netsh rules; use 'sync' to re-apply the {self.firewall_manager.name} sets")
+        detector = DriftDetector()
+        
+        def get_interval(entry):
+            parsed = parse_entry(entry)
+            return parsed[1:] if parsed else None
+        
+        expected = get_expected_rules(self.block_status_manager.block_status, get_interval, self.allowlist_manager)
+        report = detector.diff(detector.enumerate_rules(), expected)
+        if repair and report.has_drift():
+            # One netsh process for the whole repair
+            self.firewall_manager.begin_batch()
+            try:
+                record_repair(report, self.firewall_manager)
+            finally:
+                self.firewall_manager.submit_batch()
+        return report
+    
+    def expire(self):
+        """Removes expired timed blocks in one batch, returns them"""
+        expired = ExpiryQueue(self.block_status_manager.block_status).expire(self.firewall_manager)
+        if expired:
+            self.enforce_rule_budget()
+            self.block_status_manager.save_status()
+            self.block_status_manager.flush_history()
+        return expired
+    
+    def enforce_rule_budget(self, forced=()):
+        """Keeps active rules within the budget, returns (activated, deactivated)"""
+        block_status = self.block_status_manager.block_status
+        if not self.rule_budget.is_limited() and not any(status.get('dormant') for status in block_status.values()):
+            return [], []
+        
+        def get_interval(entry):
+            parsed = parse_entry(entry)
+            return parsed[1:] if parsed else None
+        
+        return self.rule_budget.reconcile(block_status, get_interval, FirewallLogTailer().hits,
+                                          self.firewall_manager, forced)
+    
+    def sync(self):
+        """Re-applies saved status to the firewall for the current list.
+        
+        Returns (applied rules, removed orphaned entries)."""
+        current_entries = self.load_entries()
+        transactions, recovered = self.recover()
+        if transactions:
+            print(f"Recovered {len(transactions)} interrupted operations ({len(recovered)} entries)", file=sys.stderr)
+        if self.apply_rule_scope() is not None:
+            print(f"Rewrote rules for scope {self.firewall_manager.get_scope()}", file=sys.stderr)
+        
+        # Remember orphaned statuses before they are removed from the INI file
+        orphaned = {ip: self.block_status_manager.get_status(ip)
+                    for ip in self.block_status_manager.block_status
+                    if ip not in current_entries}
+        self.block_status_manager.cleanup_orphaned_ips(current_entries)
+        
+        for ip, status in orphaned.items():
+            if status['in']:
+                self.firewall_manager.delete_rule(ip, 'in')
+            if status['out']:
+                self.firewall_manager.delete_rule(ip, 'out')
+        
+        # Drop blocks that expired, then settle the rule budget; dormant entries get no rules
+        self.expire()
+        self.firewall_manager.begin_batch()
+        activated, _ = self.enforce_rule_budget()
+        applied = 0
+        for ip in current_entries:
+            status = self.block_status_manager.get_status(ip)
+            if status.get('dormant') or ip in activated:
+                continue
+            if status['in']:
+                self.firewall_manager.create_rule(ip, 'in')
+                applied += 1
+            if status['out']:
+                self.firewall_manager.create_rule(ip, 'out')
+                applied += 1
+        self.firewall_manager.submit_batch()
+        
+        self.block_status_manager.save_status()
+        self.transaction_journal.checkpoint()
+        return applied, list(orphaned)
+    
+    def update_allowlist(self, entries, remove=False):
+        """Adds or removes allowlist entries and re-applies only the blocked rules they touch.
+        
+        Returns (changed entries, re-applied entries)."""
+        blocked_intervals = {}
+        for entry in self.block_status_manager.get_all_blocked_ips():
+            parsed = parse_entry(entry)
+            # Dormant entries have no rules to re-create
+            if parsed is not None and not self.block_status_manager.get_status(entry).get('dormant'):
+                blocked_intervals[entry] = parsed[1:]
+        
+        changed = []
+        affected = set()
+        for entry in entries:
+            parsed = self.allowlist_manager.remove(entry) if remove else self.allowlist_manager.add(entry)
+            if parsed is None:
+                continue
+            changed.append(parsed[0])
+            affected.update(self.allowlist_manager.get_affected_entries(blocked_intervals, parsed[1], parsed[2]))
+        
+        self.firewall_manager.begin_batch()
+        try:
+            for entry in affected:
+                self.firewall_manager.update_rule(entry, self.block_status_manager.get_status(entry))
+        finally:
+            self.firewall_manager.submit_batch()
+        return changed, sorted(affected)
+    
+    def watch(self, feed_spec, direction, debounce, max_per_minute):
+        """Blocks list entries seen in a peer feed until interrupted, returns policy stats"""
+        entries = self.load_entries()
+        entry_intervals = {entry: self.ip_manager.get_interval(entry) for entry in entries}
+        blocked = [entry for entry in entries if covers_direction(self.block_status_manager.get_status(entry), direction)]
+        
+        def report(entry, direction, ip, latency_ms):
+            print(f"Blocked {entry} ({direction}) seen as {ip} in {latency_ms:.1f} ms", flush=True)
+        
+        policy = EnforcementPolicy(direction, debounce, max_per_minute, 60.0)
+        engine = PolicyEngine(policy, lambda entry, direction: self.apply([entry], direction, 'block', forced=True)[0] > 0,
+                              report)
+        engine.set_entries(entry_intervals, blocked)
+        
+        # 'capture' feeds new peers from live traffic, like the Session peers panel
+        stop_event = threading.Event()
+        feed = create_peer_feed(feed_spec)
+        if feed_spec == 'capture':
+            capture = PeerDiscoveryEngine(on_new_peer=feed.put)
+            threading.Thread(target=capture.capture_live, args=(stop_event,), daemon=True).start()
+        print(f"Watching {feed_spec} for {len(entry_intervals)} entries (Ctrl+C to stop)", file=sys.stderr)
+        
+        try:
+            feed.run(engine.on_sighting, stop_event)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop_event.set()
+        return engine.get_stats()
+    
+    def get_control_transport(self, port, path=None):
+        """Returns the control socket address: Unix socket where available, else TCP port and token"""
+        return get_transport(port, path or self.settings_manager.get_control_socket(),
+                             self.settings_manager.get_control_token())
+    
+    def serve(self, port, path=None):
+        """Runs the local control socket until interrupted, returns dispatcher stats"""
+        def get_entries(args):
+            entries = [self.normalize_entry(entry) for entry in args]
+            invalid = [entry for entry, result in zip(args, entries) if result is None]
+            if invalid or not entries:
+                raise ValueError(f"invalid entries {' '.join(invalid)}" if invalid else "no entries given")
+            return entries
+        
+        def action(args, name):
+            direction, entries = split_direction(args)
+            entries = get_entries(entries)
+            changed, unchanged, errors = self.apply(entries, direction, name, forced=True)
+            if len(entries) == 1:
+                return format_status(self.block_status_manager.get_status(entries[0]))
+            return f"changed={changed} unchanged={unchanged} errors={errors}"
+        
+        def batch(args):
+            if len(args) < 3 or args[0].lower() not in ['block', 'unblock'] or args[1].lower() not in DIRECTIONS:
+                raise ValueError("usage: BATCH block|unblock both|in|out ENTRY [ENTRY ...]")
+            return action(args[1:], args[0].lower())
+        
+        def status(args):
+            if args:
+                return format_status(self.block_status_manager.get_status(get_entries(args[:1])[0]))
+            return f"blocked={len(self.block_status_manager.get_all_blocked_ips())}"
+        
+        # Commands run on the server thread, one client batch at a time
+        dispatcher = ControlDispatcher()
+        dispatcher.register('block', lambda args: action(args, 'block'))
+        dispatcher.register('unblock', lambda args: action(args, 'unblock'))
+        dispatcher.register('batch', batch)
+        dispatcher.register('status', status)
+        
+        stop_event = threading.Event()
+        transport = self.get_control_transport(port, path)
+        address = transport['path'] if 'path' in transport else f"127.0.0.1:{port} (token in settings.ini)"
+        print(f"Serving control socket on {address} (Ctrl+C to stop)", file=sys.stderr)
+        try:
+            ControlServer(dispatcher, **transport).run(stop_event)
+        except KeyboardInterrupt:
+            pass
+        return dispatcher.get_stats()
+    
+    def status(self, entries=None):
+        """Returns [(entry, status)] for given entries or all saved entries"""
+        if not entries:
+            entries = list(self.block_status_manager.block_status)
+        return [(entry, self.block_status_manager.get_status(entry)) for entry in entries]
+    
+    def history(self, entries=None):
+        """Returns [(entry, statistics)] from the block history, most blocked first"""
+        history = self.block_status_manager.history
+        if entries:
+            stats = [(entry, history.get_stats(entry)) for entry in entries]
+            return [(entry, entry_stats) for entry, entry_stats in stats if entry_stats is not None]
+        return sorted(history.get_all_stats().items(), key=lambda item: (-item[1]['blocks'], item[0]))
+
+
+def build_parser():
+    """Creates the argument parser for headless commands"""
+    parser = argparse.ArgumentParser(prog='CheatersBlocker',
+                                     description='Headless CheatersBlocker commands')
+    parser.add_argument('--url', default=DEFAULT_LIST_URL, help='Blocklist URL')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    for command in ['block', 'unblock']:
+        sub = subparsers.add_parser(command, help=f'{command.capitalize()} entries')
+        sub.add_argument('entries', nargs='*', metavar='ENTRY', help='IP address, range (a.b.c.d-e.f.g.h) or CIDR')
+        sub.add_argument('--all', action='store_true', help='Apply to ALL entries')
+        sub.add_argument('--direction', choices=['both', 'in', 'out'], default='both',
+                         help='Traffic direction (default: both)')
+    subparsers.choices['block'].add_argument('--ttl', metavar='DURATION',
+                                             help='Remove the block after e.g. 90s, 30m, 2h or 1d')
+    subparsers.choices['block'].add_argument('--terminate-flows', action='store_true',
+                                             help='End established flows of the blocked entries (also terminate_flows = true)')
+    subparsers.choices['block'].add_argument('--wait-drop', type=float, metavar='SECONDS',
+                                             help='Wait for the first dropped packet of each entry and show the delay')
+    for command in ['block', 'unblock']:
+        subparsers.choices[command].add_argument('--plan', action='store_true',
+                                                 help='Only show the firewall operations and estimated time')
+        subparsers.choices[command].add_argument('--export', metavar='FILE',
+                                                 help='Write the planned netsh calls to a batch script (implies --plan)')
+    
+    subparsers.add_parser('sync', help='Re-apply saved block status to the firewall')
+    subparsers.add_parser('expire', help='Remove timed blocks that have expired')
+    
+    check_parser = subparsers.add_parser('check', help='Compare firewall rules with saved block status')
+    check_parser.add_argument('--repair', action='store_true', help='Re-create missing rules, remove unexpected ones')
+    
+    import_parser = subparsers.add_parser('import-prefixes', help='Import a TSV/CSV IP-to-prefix/ASN dataset')
+    import_parser.add_argument('source', help='Dataset file')
+    
+    feed_parser = subparsers.add_parser('publish-feed', help='Publish a text list as the next version of a list feed')
+    feed_parser.add_argument('feed_dir', help='Feed directory to upload to a web server (index.json, snapshot, deltas)')
+    feed_parser.add_argument('list_file', help='New plain-text list, one entry per line')
+    feed_parser.add_argument('--max-deltas', type=int, default=DEFAULT_MAX_DELTAS,
+                             help='Delta patches kept; clients further behind download the snapshot')
+    
+    expand_parser = subparsers.add_parser('expand', help='Show (or block) the provider range of a single IP')
+    expand_parser.add_argument('ip')
+    expand_parser.add_argument('--apply', action='store_true', help='Block the provider range')
+    expand_parser.add_argument('--direction', choices=['both', 'in', 'out'], default='both')
+    
+    allow_parser = subparsers.add_parser('allow', help='Keep IPs/ranges reachable inside blocked ranges')
+    allow_parser.add_argument('entries', nargs='*', metavar='ENTRY', help='IP address, range or CIDR')
+    allow_parser.add_argument('--remove', action='store_true', help='Remove entries from the allowlist')
+    allow_parser.add_argument('--list', action='store_true', help='Show the allowlist')
+    
+    watch_parser = subparsers.add_parser('watch', help='Automatically block list entries seen in a peer feed')
+    watch_parser.add_argument('--feed', default='capture',
+                              help="'capture' (live traffic), 'file:PATH' or 'socket:PORT' (default: capture)")
+    watch_parser.add_argument('--direction', choices=['both', 'in', 'out'], default='both')
+    watch_parser.add_argument('--debounce', type=float, default=30.0, help='Seconds between actions per entry')
+    watch_parser.add_argument('--max-per-minute', type=int, default=10, help='Rate limit for automatic blocks')
+    
+    serve_parser = subparsers.add_parser('serve', help='Accept block/unblock/status commands on a local socket')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_CONTROL_PORT,
+                              help=f'Loopback TCP port where there are no Unix sockets (default: {DEFAULT_CONTROL_PORT})')
+    serve_parser.add_argument('--socket', help='Unix socket path (default: control_socket in settings.ini)')
+    
+    send_parser = subparsers.add_parser('send', help='Send pipelined commands to a running control socket')
+    send_parser.add_argument('commands', nargs='+', metavar='COMMAND', help='e.g. "BLOCK both 1.2.3.4"')
+    send_parser.add_argument('--port', type=int, default=DEFAULT_CONTROL_PORT)
+    send_parser.add_argument('--socket', help='Unix socket path (default: control_socket in settings.ini)')
+    
+    ruleset_parser = subparsers.add_parser('ruleset', help='Print the nftables ruleset for the saved status')
+    ruleset_parser.add_argument('--check', action='store_true', help='Validate it with nft -c instead of printing')
+    
+    scope_parser = subparsers.add_parser('scope', help='Show or set which program/protocol block rules apply to')
+    scope_parser.add_argument('--program', help="'auto' (detect the game), 'none' (all programs) or an executable path")
+    scope_parser.add_argument('--protocol', choices=['any', 'udp'])
+    
+    history_parser = subparsers.add_parser('history', help='Show how often and how long entries were blocked')
+    history_parser.add_argument('entries', nargs='*', metavar='ENTRY')
+    history_parser.add_argument('--events', action='store_true', help='List the individual block/unblock events')
+    history_parser.add_argument('--never', action='store_true', help='List list entries that were never blocked')
+    
+    reports_parser = subparsers.add_parser('reports', help='Show or upload queued cheater reports (needs report_url)')
+    reports_parser.add_argument('--add', nargs='+', metavar='IP', default=[], help='Queue reports for these IPs')
+    reports_parser.add_argument('--flush', action='store_true', help='Upload queued reports now')
+    
+    status_parser = subparsers.add_parser('status', help='Show saved block status')
+    status_parser.add_argument('entries', nargs='*', metavar='ENTRY')
+    status_parser.add_argument('--blocked', action='store_true', help='Only show blocked entries')
+    
+    return parser
+
+
+def run(argv=None):
+    """Runs a headless command and returns the process exit code"""
+    args = build_parser().parse_args(argv)
+    
+    needs_admin = args.command not in ['status', 'history', 'reports', 'import-prefixes', 'publish-feed', 'send',
+                                       'ruleset'] and not (args.command == 'expand' and not args.apply)
+    needs_admin = needs_admin and not (args.command == 'allow' and not args.entries)
+    needs_admin = needs_admin and not (args.command == 'check' and not args.repair)
+    needs_admin = needs_admin and not (args.command == 'scope' and args.program is None and args.protocol is None)
+    needs_admin = needs_admin and not (args.command in ['block', 'unblock'] and (args.plan or args.export))
+    if needs_admin and not check_admin_privileges():
+        print("Administrator privileges are required to modify firewall rules.", file=sys.stderr)
+        return 1
+    
+    blocker = HeadlessBlocker(args.url)
+    
+    try:
+        if args.command in ['block', 'unblock']:
+            if args.all == bool(args.entries):
+                print("Specify either --all or one or more entries.", file=sys.stderr)
+                return 2
+            
+            if args.all and args.command == 'block':
+                entries = blocker.load_entries()
+            elif args.all:
+                # Unblocking everything only needs the saved status
+                entries = blocker.block_status_manager.get_all_blocked_ips()
+            else:
+                normalized = [blocker.normalize_entry(entry) for entry in args.entries]
+                invalid = [entry for entry, result in zip(args.entries, normalized) if result is None]
+                if invalid:
+                    print(f"Invalid entries: {', '.join(invalid)}", file=sys.stderr)
+                    return 2
+                entries = normalized
+            
+            ttl = 0
+            if getattr(args, 'ttl', None):
+                ttl = parse_duration(args.ttl)
+                if not ttl:
+                    print(f"Invalid duration: {args.ttl}", file=sys.stderr)
+                    return 2
+            
+            if args.plan or args.export:
+                plan = blocker.plan(entries, args.direction, args.command, forced=not args.all)
+                print(f"Plan: {plan}")
+                if args.export:
+                    plan.export_script(args.export)
+                    print(f"Wrote {len(plan.commands)} commands to {args.export}")
+                return 0
+            
+            if getattr(args, 'terminate_flows', False):
+                blocker.terminate_flows_enabled = True
+            changed, unchanged, errors = blocker.apply(entries, args.direction, args.command,
+                                                       forced=not args.all, ttl=ttl)
+            print(f"{args.command.capitalize()}ed {args.direction} traffic for {changed}/{len(entries)} entries"
+                  + (f", {unchanged} unchanged" if unchanged else '') + (f" ({errors} errors)" if errors else ''))
+            if getattr(args, 'wait_drop', None):
+                for entry, latency in blocker.wait_for_drops(entries, args.wait_drop).items():
+                    if latency is None:
+                        print(f"{entry}\tno drop within {args.wait_drop:g}s")
+                    else:
+                        print(f"{entry}\tfirst drop after {latency * 1000:.0f} ms")
+            return 1 if errors else 0
+        
+        if args.command == 'sync':
+            applied, orphaned = blocker.sync()
+            print(f"Applied {applied} rules, removed {len(orphaned)} orphaned entries")
+            return 0
+        
+        if args.command == 'check':
+            report = blocker.check_drift(args.repair)
+            for entry, direction in report.missing:
+                print(f"missing\t{entry}\t{direction.upper()}")
+            for entry, direction in report.changed:
+                print(f"changed\t{entry}\t{direction.upper()}")
+            for rule_name in report.extra:
+                print(f"unexpected\t{rule_name}")
+            print(f"{'Repaired' if args.repair and report.has_drift() else 'Drift'}: {report}")
+            return 1 if report.has_drift() and not args.repair else 0
+        
+        if args.command == 'expire':
+            expired = blocker.expire()
+            print(f"Removed {len(expired)} expired blocks")
+            return 0
+        
+        if args.command == 'import-prefixes':
+            count = PrefixDatabase().import_file(args.source)
+            print(f"Imported {count} provider prefixes")
+            return 0
+        
+        if args.command == 'publish-feed':
+            with open(args.list_file, 'r', encoding='utf-8') as list_file:
+                text = list_file.read()
+            version, added, removed = publish_feed(args.feed_dir, text, max(args.max_deltas, 0))
+            if added or removed:
+                print(f"Published version {version}: {len(added)} added, {len(removed)} removed")
+            else:
+                print(f"No changes, feed stays at version {version}")
+            return 0
+        
+        if args.command == 'expand':
+            prefix_db = PrefixDatabase()
+            if not prefix_db.load():
+                print("No prefix database. Run import-prefixes first.", file=sys.stderr)
+                return 1
+            provider = blocker.ip_manager.get_provider_range(args.ip, prefix_db)
+            prefix_db.close()
+            if provider is None:
+                print(f"No provider prefix found for {args.ip}", file=sys.stderr)
+                return 1
+            print(f"{provider['entry']}\tAS{provider['asn']}\t{provider['country']}\t{provider['name']}")
+            if args.apply:
+                blocker.block_status_manager.block_status.setdefault(provider['entry'], {'in': False, 'out': False, 'manual': True})
+                _, _, errors = blocker.apply([provider['entry']], args.direction, 'block', forced=True)
+                return 1 if errors else 0
+            return 0
+        
+        if args.command == 'allow':
+            if args.entries:
+                changed, affected = blocker.update_allowlist(args.entries, args.remove)
+                print(f"{'Removed' if args.remove else 'Allowed'} {len(changed)} entries, re-applied {len(affected)} blocked entries")
+                if len(changed) != len(args.entries):
+                    return 2
+            if args.list or not args.entries:
+                for entry, note in blocker.allowlist_manager.get_entries():
+                    print(f"{entry}\t{note}" if note else entry)
+            return 0
+        
+        if args.command == 'watch':
+            stats = blocker.watch(args.feed, args.direction, args.debounce, args.max_per_minute)
+            summary = (f"{stats['sightings']} sightings, {stats['matches']} matches, {stats['actions']} blocks, "
+                       f"{stats['rate_limited']} rate limited")
+            if stats['actions']:
+                summary += (f"; sighting to rule avg {stats['latency_mean_ms']:.1f} ms, "
+                            f"p95 {stats['latency_p95_ms']:.1f} ms, max {stats['latency_max_ms']:.1f} ms")
+            print(summary)
+            return 0
+        
+        if args.command == 'ruleset':
+            if blocker.firewall_manager.name != 'nftables':
+                print("Set firewall_backend = nftables in settings.ini first.", file=sys.stderr)
+                return 1
+            if args.check:
+                ok = blocker.firewall_manager.check_ruleset()
+                print("Ruleset OK" if ok else "Ruleset rejected by nft")
+                return 0 if ok else 1
+            print('\n'.join(blocker.firewall_manager.compile_ruleset()))
+            return 0
+        
+        if args.command == 'serve':
+            stats = blocker.serve(args.port, args.socket)
+            summary = f"{stats['commands']} commands, {stats['errors']} errors"
+            if 'overhead_mean_us' in stats:
+                summary += (f"; dispatch overhead avg {stats['overhead_mean_us']:.1f} us, "
+                            f"p95 {stats['overhead_p95_us']:.1f} us")
+            print(summary)
+            return 0
+        
+        if args.command == 'send':
+            replies = send_commands(args.commands, **blocker.get_control_transport(args.port, args.socket))
+            for reply in replies:
+                print(reply)
+            return 1 if any(not reply.startswith('OK') for reply in replies) else 0
+        
+        if args.command == 'scope':
+            program, protocol = blocker.settings_manager.get_rule_scope_setting()
+            if args.program is not None or args.protocol is not None:
+                if args.program is not None:
+                    program = '' if args.program.lower() == 'none' else args.program
+                if args.protocol is not None:
+                    protocol = args.protocol
+                blocker.settings_manager.set_rule_scope(program, protocol)
+                blocker.firewall_manager.set_scope(*blocker.settings_manager.get_rule_scope())
+                started = time.perf_counter()
+                commands = blocker.apply_rule_scope()
+                if commands is not None:
+                    print(f"Rewrote rules with {commands} firewall commands in {time.perf_counter() - started:.2f}s")
+            resolved_program, protocol = blocker.firewall_manager.get_scope()
+            if program.lower() == 'auto' and not resolved_program:
+                print("Game executable not found; rules apply to all programs", file=sys.stderr)
+            print(f"Program: {resolved_program or 'all programs'}\tProtocol: {protocol}")
+            return 0
+        
+        if args.command == 'history':
+            history = blocker.block_status_manager.history
+            if args.never:
+                for entry in history.get_never_blocked(blocker.load_entries()):
+                    print(entry)
+                return 0
+            if args.events:
+                entries = set(args.entries)
+                for timestamp, entry, direction, action, duration in history.get_events():
+                    if entries and entry not in entries:
+                        continue
+                    duration_text = f"\tafter {format_duration(duration)}" if action == 'unblock' else ''
+                    print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}\t{entry}\t"
+                          f"{action} {direction.upper()}{duration_text}")
+                return 0
+            for entry, stats in blocker.history(args.entries):
+                last_blocked = (time.strftime('%Y-%m-%d %H:%M', time.localtime(stats['last_blocked']))
+                                if stats['last_blocked'] else '-')
+                now_text = '\tblocked now' if stats['blocked_now'] else ''
+                print(f"{entry}\tblocked {stats['blocks']}x\ttotal {format_duration(stats['blocked_seconds'])}\t"
+                      f"last {last_blocked}{now_text}")
+            count, capacity, oldest = history.get_summary()
+            if oldest:
+                print(f"{count}/{capacity} events kept since {time.strftime('%Y-%m-%d %H:%M', time.localtime(oldest))}",
+                      file=sys.stderr)
+            return 0
+        
+        if args.command == 'reports':
+            url, batch_size, dedupe_hours = blocker.settings_manager.get_report_settings()
+            if not url:
+                print("Cheater reports are off; set report_url in settings.ini to enable them", file=sys.stderr)
+                return 1
+            report_queue = ReportQueue(url, batch_size=batch_size, dedupe_seconds=dedupe_hours * 3600)
+            for ip in args.add:
+                if parse_entry(ip) is None or blocker.ip_manager.is_range(ip):
+                    print(f"Error: invalid IP address: {ip}", file=sys.stderr)
+                    return 1
+                report_queue.add(ip, 'both')
+            if args.flush:
+                sent = report_queue.flush()
+                print(f"Sent {sent} reports, {report_queue.get_pending_count()} still queued")
+                return 0 if not report_queue.pending else 1
+            report_queue.take_incoming()
+            print(f"{report_queue.get_pending_count()} reports queued for {url}")
+            return 0
+        
+        if args.command == 'status':
+            for entry, status in blocker.status(args.entries):
+                if args.blocked and not (status['in'] or status['out']):
+                    continue
+                in_text = 'Blocked' if status['in'] else 'Unblocked'
+                out_text = 'Blocked' if status['out'] else 'Unblocked'
+                extra_text = '\tdormant (over rule budget)' if status.get('dormant') else ''
+                if status.get('expires_at'):
+                    extra_text += f"\tuntil {time.strftime('%Y-%m-%d %H:%M', time.localtime(status['expires_at']))}"
+                print(f"{entry}\tIN: {in_text}\tOUT: {out_text}{extra_text}")
+            return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,305 @@
+"""
+Local control socket for external triggers (stream decks, overlays, scripts)
+
+Line protocol over a Unix socket with owner-only permissions where the
+platform has them, else over TCP loopback (Windows, tests). One command per
+line, answered by one line "OK <text>" or "ERR <text>" in the same order.
+Clients may pipeline any number of commands per write; every complete line
+received in one read is dispatched as one batch and answered with one write.
+
+Any web page can make the browser send data to a loopback port, so a TCP
+client has to start with "AUTH <token>" (a per-install secret from
+settings.ini), and a connection is closed at its first unknown line (such
+as an HTTP request line or header) instead of running the lines after it.
+No Qt imports here.
+
+Commands (case-insensitive names):
+    PING
+    BLOCK [both|in|out] [ENTRY ...]     (no entry: acts like the hotkeys)
+    UNBLOCK [both|in|out] [ENTRY ...]
+    BATCH block|unblock both|in|out ENTRY [ENTRY ...]
+    KEY 1|2|3                           (same as pressing F1/F2/F3)
+    STATUS [ENTRY]
+    STATS
+"""
+
+import os
+import hmac
+import time
+import socket
+import selectors
+from collections import deque
+
+DEFAULT_CONTROL_PORT = 47810
+MAX_LINE_LENGTH = 65536
+DIRECTIONS = ['both', 'in', 'out']
+
+
+def split_direction(args):
+    """Returns (direction, remaining args), direction defaults to 'both'"""
+    if args and args[0].lower() in DIRECTIONS:
+        return args[0].lower(), args[1:]
+    return 'both', args
+
+
+def get_transport(port, path, token):
+    """Returns ControlServer/send_commands keyword arguments: the Unix socket where the
+    platform has them, else the TCP port with the token (Windows builds of Python)"""
+    if hasattr(socket, 'AF_UNIX'):
+        return {'path': path}
+    return {'port': port, 'token': token}
+
+
+def format_status(status):
+    """Formats a block status as "in=1 out=0" plus dormant/until flags"""
+    text = f"in={int(bool(status['in']))} out={int(bool(status['out']))}"
+    if status.get('dormant'):
+        text += ' dormant=1'
+    if status.get('expires_at'):
+        text += f" expires_at={status['expires_at']}"
+    return text
+
+
+class ControlDispatcher:
+    """Maps command names to handlers and measures dispatch overhead.
+    
+    A handler takes the argument list and returns the reply text; raising
+    ValueError turns the message into an ERR reply."""
+    
+    def __init__(self, samples=1000):
+        self.handlers = {}
+        self.commands = 0
+        self.errors = 0
+        self.overheads = deque(maxlen=samples)  # Seconds per command outside the handlers
+        self.last_handler_seconds = 0.0
+        self.register('ping', lambda args: 'pong')
+        self.register('stats', lambda args: self.format_stats())
+    
+    def register(self, name, handler):
+        """Adds or replaces the handler of a command"""
+        self.handlers[name.lower()] = handler
+    
+    def is_known(self, line):
+        """Checks if a line is blank or starts with a registered command"""
+        words = line.split()
+        return not words or words[0].lower() in self.handlers
+    
+    def dispatch_batch(self, lines):
+        """Runs pipelined command lines in order, returns reply lines"""
+        replies = []
+        handler_seconds = 0.0
+        for line in lines:
+            words = line.split()
+            if not words:
+                continue
+            self.commands += 1
+            handler = self.handlers.get(words[0].lower())
+            if handler is None:
+                self.errors += 1
+                replies.append(f"ERR unknown command {words[0]}")
+                continue
+            
+            started = time.perf_counter()
+            try:
+                reply = f"OK {handler(words[1:])}".rstrip()
+            except ValueError as e:
+                self.errors += 1
+                reply = f"ERR {e}"
+            except Exception as e:
+                self.errors += 1
+                reply = f"ERR {type(e).__name__}: {e}"
+            handler_seconds += time.perf_counter() - started
+            replies.append(reply.replace('\n', ' '))
+        self.last_handler_seconds = handler_seconds
+        return replies
+    
+    def record_overhead(self, seconds, count):
+        """Stores per-command overhead of a batch (total time minus handler time)"""
+        if count:
+            self.overheads.append(max(seconds - self.last_handler_seconds, 0.0) / count)
+    
+    def get_stats(self):
+        """Returns command counters and dispatch overhead in microseconds"""
+        overheads = sorted(self.overheads)
+        stats = {'commands': self.commands, 'errors': self.errors}
+        if overheads:
+            stats['overhead_mean_us'] = sum(overheads) / len(overheads) * 1e6
+            stats['overhead_p95_us'] = overheads[min(int(len(overheads) * 0.95), len(overheads) - 1)] * 1e6
+            stats['overhead_max_us'] = overheads[-1] * 1e6
+        return stats
+    
+    def format_stats(self):
+        """Returns get_stats() as "key=value" pairs"""
+        return ' '.join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in self.get_stats().items())
+
+
+class ControlClient:
+    """Read buffer and handshake state of one connection"""
+    
+    __slots__ = ('pending', 'authenticated')
+    
+    def __init__(self, authenticated):
+        self.pending = bytearray()
+        self.authenticated = authenticated
+
+
+class ControlServer:
+    """Serves the line protocol on a Unix socket (path) or a loopback TCP port that needs the token"""
+    
+    def __init__(self, dispatcher, port=DEFAULT_CONTROL_PORT, host='127.0.0.1', token=None, path=None):
+        if path is None and not token:
+            raise ValueError("a TCP control socket needs a token")
+        self.dispatcher = dispatcher
+        self.host = host
+        self.port = port
+        self.token = token
+        self.path = path
+    
+    def _listen(self):
+        """Returns the listening socket; a Unix socket is only accessible to its owner"""
+        if self.path is None:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.host, self.port))
+            self.port = listener.getsockname()[1]  # Port 0 picks a free one
+            return listener
+        
+        # A socket file left by a crashed run would make bind() fail
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            listener.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.path, 0o600)
+        return listener
+    
+    def run(self, stop_event, invoke=None):
+        """Accepts clients until stopped.
+        
+        invoke(dispatch_batch, lines) runs a batch on the thread that owns the
+        handlers (e.g. the GUI thread) and returns the replies; by default
+        batches run on the calling thread."""
+        if invoke is None:
+            invoke = lambda dispatch_batch, lines: dispatch_batch(lines)
+        
+        listener = self._listen()
+        listener.listen(8)
+        listener.setblocking(False)
+        
+        selector = selectors.DefaultSelector()
+        selector.register(listener, selectors.EVENT_READ, None)
+        try:
+            while not stop_event.is_set():
+                for key, _ in selector.select(timeout=0.5):
+                    if key.data is None:
+                        client, _ = listener.accept()
+                        client.setblocking(False)
+                        if self.path is None:
+                            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                        selector.register(client, selectors.EVENT_READ, ControlClient(self.token is None))
+                    elif not self._serve(key.fileobj, key.data, invoke):
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
+    
+    def _check_token(self, line):
+        """Checks an "AUTH <token>" handshake line"""
+        words = line.split()
+        return (len(words) == 2 and words[0].lower() == 'auth'
+                and hmac.compare_digest(words[1].encode('utf-8'), self.token.encode('utf-8')))
+    
+    def _serve(self, client, state, invoke):
+        """Reads from a client and answers its complete lines, returns False when it is gone or rejected"""
+        try:
+            data = client.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+        if not data:
+            return False
+        
+        pending = state.pending
+        pending += data
+        end = pending.rfind(b'\n')
+        if end < 0:
+            if len(pending) > MAX_LINE_LENGTH:
+                self._send(client, b"ERR line too long\n")
+                return False
+            return True
+        lines = pending[:end].decode('utf-8', 'replace').split('\n')
+        del pending[:end + 1]
+        
+        replies = []
+        if not state.authenticated:
+            if not self._check_token(lines[0]):
+                self._send(client, b"ERR unauthorized\n")
+                return False
+            state.authenticated = True
+            replies.append("OK authenticated")
+            lines = lines[1:]
+        
+        # Nothing after an unknown line runs: it may be an HTTP request smuggling commands in its body
+        rejected = next((index for index, line in enumerate(lines) if not self.dispatcher.is_known(line)), None)
+        if rejected is not None:
+            unknown = lines[rejected].split()[0]
+            lines = lines[:rejected]
+        
+        # One hop to the handler thread and one write for all pipelined commands
+        if any(line.strip() for line in lines):
+            started = time.perf_counter()
+            command_replies = invoke(self.dispatcher.dispatch_batch, lines)
+            self.dispatcher.record_overhead(time.perf_counter() - started, len(command_replies))
+            replies += command_replies
+        if rejected is not None:
+            self.dispatcher.errors += 1
+            replies.append(f"ERR unknown command {unknown[:64]}")
+        sent = self._send(client, ''.join(f"{reply}\n" for reply in replies).encode('utf-8'))
+        return sent and rejected is None
+    
+    def _send(self, client, data):
+        """Writes a reply block, returns False if the client went away"""
+        try:
+            client.setblocking(True)
+            client.sendall(data)
+            client.setblocking(False)
+            return True
+        except OSError:
+            return False
+
+
+def send_commands(commands, port=DEFAULT_CONTROL_PORT, host='127.0.0.1', timeout=30.0, token=None, path=None):
+    """Sends pipelined commands in one write to a Unix socket (path) or TCP port, returns their reply lines"""
+    commands = [command for command in commands if command.strip()]
+    if path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(path)
+    else:
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    with sock:
+        handshake = [] if token is None else [f"AUTH {token}"]
+        sock.sendall(''.join(f"{command}\n" for command in handshake + commands).encode('utf-8'))
+        expected = len(handshake) + len(commands)
+        replies = []
+        buffer = b''
+        while len(replies) < expected:
+            data = sock.recv(65536)
+            if not data:
+                break
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            replies.extend(line.decode('utf-8', 'replace') for line in lines)
+        if handshake and replies and replies[0].startswith('OK'):
+            replies = replies[1:]
+        return replies
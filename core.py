@@ -0,0 +1,1997 @@
+"""
+Core managers for CheatersBlocker that do not depend on Qt.
+
+Used by the GUI (main.py) and by the headless command line (cli.py).
+"""
+
+import sys
+import os
+import configparser
+import subprocess
+import ctypes
+import ipaddress
+import threading
+import time
+import struct
+import mmap
+import array
+import hashlib
+import secrets
+import bisect
+import heapq
+import tempfile
+from collections import deque
+
+# Default blocklist location
+DEFAULT_LIST_URL = "https://pastebin.com/raw/5M4Ciz6m"
+
+# Game executables (multiplayer first) used when rule_program = auto
+GAME_EXECUTABLES = ['AC4BFMP.exe', 'AC4BFSP.exe']
+GAME_INSTALL_DIRS = [
+    r"C:\Program Files (x86)\Steam\steamapps\common\Assassin's Creed IV Black Flag",
+    r"C:\Program Files (x86)\Ubisoft\Ubisoft Game Launcher\games\Assassin's Creed IV Black Flag",
+    r"C:\Program Files\Ubisoft\Ubisoft Game Launcher\games\Assassin's Creed IV Black Flag",
+]
+RULE_PROTOCOLS = ['any', 'udp']
+
+# Windows Firewall log location (dropped packets are logged here when enabled)
+DEFAULT_FIREWALL_LOG = os.path.join(os.environ.get('SystemRoot', r'C:\Windows'),
+                                    'System32', 'LogFiles', 'Firewall', 'pfirewall.log')
+
+# Cold-start goal: time from process start to the first painted frame
+STARTUP_TARGET_MS = 1000
+
+
+class FirewallBackend:
+    """Interface of firewall backends: block and unblock entries per direction"""
+    
+    name = ''
+    persistent = False  # True if rules survive restarts of the app and the machine
+    
+    def __init__(self):
+        self.allowlist = None  # AllowlistManager whose holes are cut out of new rules
+        self.recording = None  # List of (action, target, command) in plan or batch mode
+        self.call_times = {'add': deque(maxlen=200), 'delete': deque(maxlen=200)}
+        self.call_time_estimates = {'add': 0.15, 'delete': 0.12}  # Seconds, replaced by measurements
+        self.program = ''  # Executable new rules apply to ('' = all programs)
+        self.protocol = 'any'  # Protocol new rules apply to ('any' or 'udp')
+    
+    def set_allowlist(self, allowlist):
+        """Sets the allowlist applied when rules are created"""
+        self.allowlist = allowlist
+    
+    def set_scope(self, program='', protocol='any'):
+        """Limits new rules to a program and protocol; existing rules change with rewrite_rules()"""
+        self.program = program or ''
+        self.protocol = protocol if protocol in RULE_PROTOCOLS else 'any'
+    
+    def get_scope(self):
+        """Returns (program, protocol) of new rules"""
+        return self.program, self.protocol
+    
+    def rewrite_rules(self, block_status):
+        """Re-creates the rules of all enforced entries in one batch (after the scope changed), returns the commands"""
+        self.begin_batch()
+        for entry, status in block_status.items():
+            if not status.get('dormant') and (status['in'] or status['out']):
+                self.update_rule(entry, status)
+        return self.submit_batch()
+    
+    def load_status(self, block_status, get_interval):
+        """Tells the backend which entries are enforced (for backends that keep no per-entry rules)"""
+        pass
+    
+    def create_rule(self, ip_range, direction='both'):
+        """Blocks an entry in direction ('both', 'in' or 'out')"""
+        raise NotImplementedError
+    
+    def delete_rule(self, ip_range, direction='both'):
+        """Unblocks an entry in direction"""
+        raise NotImplementedError
+    
+    def update_rule(self, ip_range, status):
+        """Re-creates the rules of a blocked entry (e.g. after an allowlist change)"""
+        if status.get('dormant'):
+            return
+        for direction in ['in', 'out']:
+            if status[direction]:
+                self.delete_rule(ip_range, direction)
+                self.create_rule(ip_range, direction)
+    
+    def begin_batch(self):
+        """Collects changes until submit_batch() instead of applying them one by one"""
+        self.recording = []
+    
+    def submit_batch(self):
+        """Applies collected changes at once, returns the number of commands"""
+        raise NotImplementedError
+    
+    def create_recorder(self):
+        """Returns a backend in the same state that records commands instead of running them"""
+        raise NotImplementedError
+    
+    def format_script(self, commands, title):
+        """Returns recorded commands as a script for manual review"""
+        raise NotImplementedError
+    
+    def enable_drop_logging(self):
+        """Turns on logging of dropped packets where the backend supports it"""
+        return False
+    
+    def get_flow_intervals(self, entries):
+        """Returns the blocked (start, end) intervals of entries, without allowlisted holes"""
+        intervals = []
+        for entry in entries:
+            parsed = parse_entry(entry.strip())
+            if parsed is None:
+                continue
+            if self.allowlist is not None:
+                intervals.extend(self.allowlist.split(parsed[1], parsed[2]))
+            else:
+                intervals.append((parsed[1], parsed[2]))
+        return intervals
+    
+    def terminate_flows(self, entries):
+        """Ends established flows of just blocked entries, returns how many (0 where not supported)"""
+        return 0
+    
+    def get_drop_counts(self, entries):
+        """Returns {entry: dropped packets} from firewall counters, None if the backend has none"""
+        return None
+    
+    def delete_specific_rule(self, rule_name):
+        """Deletes a rule by name where the backend has named rules"""
+        pass
+    
+    def get_call_time(self, action):
+        """Returns measured average seconds per firewall call, or the saved estimate"""
+        samples = self.call_times[action]
+        if samples:
+            return sum(samples) / len(samples)
+        return self.call_time_estimates[action]
+    
+    def set_call_time_estimates(self, add_seconds, delete_seconds):
+        """Sets per-call estimates used until calls have been measured"""
+        self.call_time_estimates = {'add': add_seconds, 'delete': delete_seconds}
+
+
+class FirewallRuleManager(FirewallBackend):
+    """Manager for working with Windows Firewall rules"""
+    
+    name = 'netsh'
+    persistent = True
+    
+    def create_rule(self, ip_range, direction='both'):
+        """Creates a firewall rule for IP or IP range"""
+        # Cut allowed addresses out of the blocked interval
+        if self.allowlist is not None:
+            parsed = parse_entry(ip_range.strip())
+            if parsed is not None and self.allowlist.overlaps(parsed[1], parsed[2]):
+                self._create_split_rule(ip_range, parsed[1], parsed[2], direction)
+                return
+        
+        # Check if it's a range
+        if '-' in ip_range:
+            start_ip, end_ip = ip_range.split('-')
+            start_ip = start_ip.strip()
+            end_ip = end_ip.strip()
+            
+            # Create rule name for range
+            rule_base_name = f"IPBlocker_RANGE_{start_ip.replace('.', '_')}_to_{end_ip.replace('.', '_')}"
+            
+            if direction in ['in', 'both']:
+                rule_name = f"{rule_base_name}_IN"
+                self._execute_rule_command_range('add', rule_name, start_ip, end_ip, 'in')
+            
+            if direction in ['out', 'both']:
+                rule_name = f"{rule_base_name}_OUT"
+                self._execute_rule_command_range('add', rule_name, start_ip, end_ip, 'out')
+        else:
+            # Single IP
+            rule_base_name = f"IPBlocker_{ip_range.replace('.', '_')}"
+            
+            if direction in ['in', 'both']:
+                rule_name = f"{rule_base_name}_IN"
+                self._execute_rule_command('add', rule_name, ip_range, 'in')
+            
+            if direction in ['out', 'both']:
+                rule_name = f"{rule_base_name}_OUT"
+                self._execute_rule_command('add', rule_name, ip_range, 'out')
+    
+    def delete_rule(self, ip_range, direction='both'):
+        """Deletes a firewall rule for IP or IP range"""
+        # Check if it's a range
+        if '-' in ip_range:
+            start_ip, end_ip = ip_range.split('-')
+            start_ip = start_ip.strip()
+            end_ip = end_ip.strip()
+            
+            # Create rule name for range
+            rule_base_name = f"IPBlocker_RANGE_{start_ip.replace('.', '_')}_to_{end_ip.replace('.', '_')}"
+            
+            if direction in ['in', 'both']:
+                rule_name = f"{rule_base_name}_IN"
+                self._execute_rule_command_range('delete', rule_name, start_ip, end_ip, 'in')
+            
+            if direction in ['out', 'both']:
+                rule_name = f"{rule_base_name}_OUT"
+                self._execute_rule_command_range('delete', rule_name, start_ip, end_ip, 'out')
+        else:
+            # Single IP
+            rule_base_name = f"IPBlocker_{ip_range.replace('.', '_')}"
+            
+            if direction in ['in', 'both']:
+                rule_name = f"{rule_base_name}_IN"
+                self._execute_rule_command('delete', rule_name, ip_range, 'in')
+            
+            if direction in ['out', 'both']:
+                rule_name = f"{rule_base_name}_OUT"
+                self._execute_rule_command('delete', rule_name, ip_range, 'out')
+    
+    def _create_split_rule(self, ip_range, start, end, direction):
+        """Creates a rule whose remote addresses skip allowlisted holes"""
+        pieces = self.allowlist.split(start, end)
+        if not pieces:
+            return  # Whole entry is allowed
+        
+        remote_ips = [int_to_ip(a) if a == b else f"{int_to_ip(a)}-{int_to_ip(b)}" for a, b in pieces]
+        rule_base_name = get_rule_base_name(ip_range)
+        
+        # Rules sharing a name are deleted together, so long lists are split to fit the command line
+        for index in range(0, len(remote_ips), 200):
+            chunk = ','.join(remote_ips[index:index + 200])
+            if direction in ['in', 'both']:
+                self._execute_rule_command('add', f"{rule_base_name}_IN", chunk, 'in')
+            if direction in ['out', 'both']:
+                self._execute_rule_command('add', f"{rule_base_name}_OUT", chunk, 'out')
+    
+    def _execute_rule_command(self, action, rule_name, ip_address, direction):
+        """Executes netsh command for single IP rule operations"""
+        self._run_command(action, rule_name, self._build_command(action, rule_name, ip_address, direction))
+    
+    def _execute_rule_command_range(self, action, rule_name, start_ip, end_ip, direction):
+        """Executes netsh command for IP range rule operations"""
+        self._run_command(action, rule_name, self._build_command(action, rule_name, f'{start_ip}-{end_ip}', direction))
+    
+    def _build_command(self, action, rule_name, remote_ip, direction):
+        """Returns netsh arguments for adding or deleting a rule"""
+        dir_param = 'in' if direction == 'in' else 'out'
+        if action == 'add':
+            command = [
+                'netsh', 'advfirewall', 'firewall', 'add', 'rule',
+                f'name={rule_name}',
+                f'dir={dir_param}',
+                'action=block',
+                f'remoteip={remote_ip}',
+                f'protocol={self.protocol}'
+            ]
+            # Scoped rules are only evaluated for the game's traffic
+            if self.program:
+                command.append(f'program={self.program}')
+            return command
+        return [
+            'netsh', 'advfirewall', 'firewall', 'delete', 'rule',
+            f'name={rule_name}'
+        ]
+    
+    def _run_command(self, action, rule_name, command):
+        """Runs (or, in plan mode, records) a netsh command and measures its latency"""
+        if self.recording is not None:
+            self.recording.append((action, rule_name, command))
+            return
+        
+        started = time.perf_counter()
+        try:
+            if action == 'add':
+                subprocess.run(command, shell=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW)
+            elif action == 'delete':
+                # Use timeout to prevent hanging
+                subprocess.run(command, shell=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW, timeout=2)
+        except subprocess.CalledProcessError as e:
+            # Don't print error for missing rules
+            if action == 'delete' and 'No rules match the specified criteria' not in str(e):
+                print(f"Error executing {action} command for {rule_name}: {e}")
+        except subprocess.TimeoutExpired:
+            # Force terminate if hanging
+            print(f"Timeout executing {action} command for {rule_name}")
+        except Exception as e:
+            # Silent fail for other exceptions
+            pass
+        self.call_times[action].append(time.perf_counter() - started)
+    
+    def submit_batch(self):
+        """Runs the collected commands in a single netsh process, returns their number"""
+        commands = self.recording or []
+        self.recording = None
+        if len(commands) <= 1:
+            for command in commands:
+                self._run_command(*command)
+            return len(commands)
+        
+        script_path = None
+        try:
+            # netsh -f runs a script of netsh commands (without the leading "netsh")
+            fd, script_path = tempfile.mkstemp(suffix='.netsh', text=True)
+            with os.fdopen(fd, 'w', encoding='utf-8') as script:
+                for _, _, command in commands:
+                    script.write(subprocess.list2cmdline(command[1:]) + '\n')
+            subprocess.run(['netsh', '-f', script_path], shell=True, check=True,
+                           creationflags=subprocess.CREATE_NO_WINDOW, timeout=30 + len(commands))
+        except Exception as e:
+            print(f"Batched firewall submission failed ({e}), running {len(commands)} commands one by one")
+            self._replay_commands(commands)
+        finally:
+            if script_path is not None:
+                try:
+                    os.remove(script_path)
+                except OSError:
+                    pass
+        return len(commands)
+    
+    def _replay_commands(self, commands):
+        """Runs commands one by one after a failed batch without duplicating rules it already added"""
+        replaced = set()
+        for action, rule_name, command in commands:
+            if action == 'add' and rule_name not in replaced:
+                replaced.add(rule_name)
+                self._run_command('delete', rule_name, self._build_command('delete', rule_name, None, None))
+            self._run_command(action, rule_name, command)
+    
+    def create_recorder(self):
+        """Returns a manager with the same allowlist that records netsh commands"""
+        recorder = FirewallRuleManager()
+        recorder.allowlist = self.allowlist
+        recorder.set_scope(self.program, self.protocol)
+        recorder.recording = []
+        return recorder
+    
+    def format_script(self, commands, title):
+        """Returns netsh commands as a batch script that can be run as administrator"""
+        lines = ['@echo off', f'rem {title}']
+        lines += [subprocess.list2cmdline(command) for _, _, command in commands]
+        return '\n'.join(lines) + '\n'
+    
+    def enable_drop_logging(self):
+        """Turns on logging of dropped packets for all firewall profiles"""
+        try:
+            subprocess.run([
+                'netsh', 'advfirewall', 'set', 'allprofiles', 'logging', 'droppedconnections', 'enable'
+            ], shell=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW, timeout=5)
+            return True
+        except Exception as e:
+            print(f"Error enabling firewall drop logging: {e}")
+            return False
+    
+    def terminate_flows(self, entries):
+        """Resets established TCP connections to just blocked entries.
+        
+        UDP has no connection table to clear; new filters make Windows
+        re-authorize existing UDP flows, so their next packet is dropped."""
+        if self.protocol == 'udp':
+            return 0
+        return close_tcp_connections(self.get_flow_intervals(entries), self.program)
+    
+    def delete_specific_rule(self, rule_name):
+        """Deletes a specific firewall rule by name (recorded while a batch is open)"""
+        self._run_command('delete', rule_name, self._build_command('delete', rule_name, None, None))
+
+
+# Dotted-quad octet lookup: validates and converts in one step
+# (rejects leading zeros, signs and whitespace like ipaddress does)
+_OCTETS = {str(i): i for i in range(256)}
+_PREFIX_LENGTHS = {str(i): i for i in range(33)}
+
+
+def ip_to_int(ip):
+    """Converts dotted IPv4 text to an integer, returns None if invalid"""
+    parts = ip.split('.')
+    if len(parts) != 4:
+        return None
+    try:
+        return (_OCTETS[parts[0]] << 24) | (_OCTETS[parts[1]] << 16) | (_OCTETS[parts[2]] << 8) | _OCTETS[parts[3]]
+    except KeyError:
+        return None
+
+
+def int_to_ip(value):
+    """Converts an integer to dotted IPv4 text"""
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+
+def get_rule_base_name(ip_range):
+    """Returns the firewall rule name prefix used for an entry"""
+    if '-' in ip_range:
+        start_ip, end_ip = [part.strip() for part in ip_range.split('-')]
+        return f"IPBlocker_RANGE_{start_ip.replace('.', '_')}_to_{end_ip.replace('.', '_')}"
+    return f"IPBlocker_{ip_range.replace('.', '_')}"
+
+
+def subtract_intervals(start, end, hole_starts, hole_ends):
+    """Returns [(start, end)] pieces of an interval not covered by holes.
+    
+    Holes must be sorted and non-overlapping; only the holes that touch the
+    interval are visited (one binary search, then a walk)."""
+    pieces = []
+    position = bisect.bisect_left(hole_ends, start)
+    cursor = start
+    while position < len(hole_starts) and hole_starts[position] <= end:
+        if hole_starts[position] > cursor:
+            pieces.append((cursor, hole_starts[position] - 1))
+        cursor = hole_ends[position] + 1
+        position += 1
+    if cursor <= end:
+        pieces.append((cursor, end))
+    return pieces
+
+
+def parse_entry(line):
+    """Parses single IP, a-b range or CIDR into (entry, start, end).
+    
+    CIDR blocks are normalized to range entries. Returns None if invalid."""
+    if '/' in line:
+        network, _, prefix = line.partition('/')
+        start = ip_to_int(network.strip())
+        prefix_length = _PREFIX_LENGTHS.get(prefix.strip())
+        if start is None or prefix_length is None:
+            return None
+        size = 1 << (32 - prefix_length)
+        start &= ~(size - 1) & 0xFFFFFFFF  # Drop host bits
+        end = start + size - 1
+        if size == 1:
+            return int_to_ip(start), start, end
+        return f"{int_to_ip(start)}-{int_to_ip(end)}", start, end
+    
+    if '-' in line:
+        parts = line.split('-')
+        if len(parts) != 2:
+            return None
+        start = ip_to_int(parts[0].strip())
+        end = ip_to_int(parts[1].strip())
+        if start is None or end is None or start > end:
+            return None
+        return line, start, end
+    
+    start = ip_to_int(line)
+    if start is None:
+        return None
+    return line, start, start
+
+
+class IPAddressManager:
+    """Manager for loading and managing IP addresses"""
+    
+    def __init__(self):
+        self.ip_addresses = []
+        self.ip_ranges = []
+        self.entry_intervals = {}  # entry -> (start, end) as integers
+        self.invalid_lines = []
+        self.duplicate_count = 0
+        self.load_message = ''  # What a versioned feed download fetched
+    
+    def load_from_url(self, url):
+        """Loads IP addresses and ranges from specified URL"""
+        # A .json URL is the index of a versioned feed (snapshot plus delta patches)
+        if url.lower().split('?')[0].endswith('.json'):
+            return self.load_from_feed(url)
+        
+        # Imported on first use to keep start-up fast
+        import requests
+        
+        try:
+            response = requests.get(url, timeout=10)
+            response.raise_for_status()
+            
+            self.parse_text(response.text)
+            
+            return True, self.ip_addresses + self.ip_ranges
+        except requests.RequestException as e:
+            return False, f"Loading error: {e}"
+        except Exception as e:
+            return False, f"Unexpected error: {e}"
+    
+    def load_from_feed(self, index_url):
+        """Loads the list from a versioned feed, downloading only patches since the last load"""
+        from list_feed import ListFeedClient
+        
+        try:
+            text, self.load_message = ListFeedClient(index_url).fetch()
+            self.parse_text(text)
+            return True, self.ip_addresses + self.ip_ranges
+        except Exception as e:
+            return False, f"Loading error: {e}"
+    
+    def parse_text(self, text):
+        """Parses whole blocklist payload into entries and integer intervals"""
+        ip_addresses = []
+        ip_ranges = []
+        entry_intervals = {}
+        invalid_lines = []
+        duplicate_count = 0
+        
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            
+            parsed = parse_entry(line)
+            if parsed is None:
+                invalid_lines.append(line)
+                continue
+            
+            entry, start, end = parsed
+            if entry in entry_intervals:
+                duplicate_count += 1
+                continue
+            
+            entry_intervals[entry] = (start, end)
+            if start == end and '-' not in entry:
+                ip_addresses.append(entry)
+            else:
+                ip_ranges.append(entry)
+        
+        self.ip_addresses = ip_addresses
+        self.ip_ranges = ip_ranges
+        self.entry_intervals = entry_intervals
+        self.invalid_lines = invalid_lines
+        self.duplicate_count = duplicate_count
+        
+        # One summary instead of a message per line
+        if invalid_lines:
+            print(self.get_invalid_summary())
+        
+        return self.ip_addresses + self.ip_ranges
+    
+    def get_invalid_summary(self, limit=10):
+        """Returns a one-line report of skipped invalid lines"""
+        if not self.invalid_lines:
+            return ''
+        shown = ', '.join(self.invalid_lines[:limit])
+        more = f" and {len(self.invalid_lines) - limit} more" if len(self.invalid_lines) > limit else ''
+        return f"Skipped {len(self.invalid_lines)} invalid lines: {shown}{more}"
+    
+    def get_interval(self, ip_entry):
+        """Returns (start, end) integers for an entry, None if invalid"""
+        interval = self.entry_intervals.get(ip_entry)
+        if interval is None:
+            parsed = parse_entry(ip_entry)
+            if parsed is None:
+                return None
+            interval = parsed[1], parsed[2]
+        return interval
+    
+    def get_provider_range(self, ip_entry, prefix_db):
+        """Returns provider prefix info (see PrefixDatabase.lookup) enclosing a single IP"""
+        if prefix_db is None or self.is_range(ip_entry):
+            return None
+        ip = ip_to_int(ip_entry.strip())
+        if ip is None:
+            return None
+        return prefix_db.lookup(ip)
+    
+    def load_from_snapshot(self, snapshot):
+        """Loads entries from a mapped BlocklistSnapshot"""
+        entries = snapshot.get_entries()
+        range_entries = snapshot.get_range_entries()
+        self.ip_addresses = [entry for entry in entries if entry not in range_entries]
+        self.ip_ranges = [entry for entry in entries if entry in range_entries]
+        self.entry_intervals = snapshot.get_intervals_by_entry()
+        self.invalid_lines = []
+        self.duplicate_count = 0
+        return self.ip_addresses + self.ip_ranges
+    
+    def _is_valid_ip(self, ip):
+        """Validates single IP address"""
+        return ip_to_int(ip) is not None
+    
+    def _is_valid_ip_range(self, ip_range):
+        """Validates IP range format XXX.XXX.XXX.XXX-XXX.XXX.XXX.XXX"""
+        return '-' in ip_range and '/' not in ip_range and parse_entry(ip_range) is not None
+    
+    def get_ips(self):
+        """Returns list of all loaded IP addresses and ranges"""
+        return self.ip_addresses + self.ip_ranges
+    
+    def is_range(self, ip_entry):
+        """Checks if entry is an IP range"""
+        return '-' in ip_entry
+    
+    def get_range_ips(self, ip_range):
+        """Returns list of all IPs in a range (for display purposes)"""
+        if not self.is_range(ip_range):
+            return [ip_range]
+        
+        try:
+            start_ip, end_ip = ip_range.split('-')
+            start = ipaddress.IPv4Address(start_ip.strip())
+            end = ipaddress.IPv4Address(end_ip.strip())
+            
+            ips = []
+            # Limit to reasonable number for display
+            total_ips = int(end) - int(start) + 1
+            if total_ips <= 100:  # Only generate if range is small
+                current = start
+                while current <= end:
+                    ips.append(str(current))
+                    current += 1
+            
+            return ips
+        except:
+            return [ip_range]
+
+
+class IntervalIndex:
+    """Sorted interval index for O(log n) IP-to-entry lookups.
+    
+    Overlapping intervals are supported through a running maximum of end
+    addresses, so lookups only walk back over intervals that can still
+    contain the address."""
+    
+    def __init__(self, intervals=None):
+        self.starts = []
+        self.ends = []
+        self.values = []
+        self.max_ends = []
+        if intervals:
+            self.build(intervals)
+    
+    def build(self, intervals):
+        """Builds index from iterable of (start, end, value)"""
+        items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self.starts = [item[0] for item in items]
+        self.ends = [item[1] for item in items]
+        self.values = [item[2] for item in items]
+        self.max_ends = []
+        max_end = -1
+        for end in self.ends:
+            max_end = max(max_end, end)
+            self.max_ends.append(max_end)
+        return self
+    
+    @classmethod
+    def from_entries(cls, entry_intervals):
+        """Builds index from {entry: (start, end)}"""
+        return cls((start, end, entry) for entry, (start, end) in entry_intervals.items())
+    
+    def find(self, ip):
+        """Returns all values whose interval contains integer ip"""
+        matches = []
+        position = bisect.bisect_right(self.starts, ip) - 1
+        while position >= 0 and self.max_ends[position] >= ip:
+            if self.ends[position] >= ip:
+                matches.append(self.values[position])
+            position -= 1
+        return matches
+    
+    def find_first(self, ip):
+        """Returns the closest-starting value containing ip, or None"""
+        position = bisect.bisect_right(self.starts, ip) - 1
+        while position >= 0 and self.max_ends[position] >= ip:
+            if self.ends[position] >= ip:
+                return self.values[position]
+            position -= 1
+        return None
+    
+    def find_overlapping(self, start, end):
+        """Returns all values whose interval overlaps [start, end]"""
+        matches = []
+        position = bisect.bisect_right(self.starts, end) - 1
+        while position >= 0 and self.max_ends[position] >= start:
+            if self.ends[position] >= start:
+                matches.append(self.values[position])
+            position -= 1
+        return matches
+    
+    def add(self, start, end, value):
+        """Inserts one interval, updating running maximums only as far as they change"""
+        position = self._find_position(start, end)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.values.insert(position, value)
+        self.max_ends.insert(position, max(end, self.max_ends[position - 1] if position else -1))
+        for index in range(position + 1, len(self.max_ends)):
+            if self.max_ends[index] >= self.max_ends[position]:
+                break
+            self.max_ends[index] = self.max_ends[position]
+    
+    def remove(self, start, end, value):
+        """Removes one interval, returns False if it is not indexed"""
+        position = bisect.bisect_left(self.starts, start)
+        while position < len(self.starts) and self.starts[position] == start:
+            if self.ends[position] == end and self.values[position] == value:
+                break
+            position += 1
+        else:
+            return False
+        del self.starts[position], self.ends[position], self.values[position], self.max_ends[position]
+        # Running maximums after the removed interval can only shrink; stop once they are stable
+        max_end = self.max_ends[position - 1] if position else -1
+        for index in range(position, len(self.max_ends)):
+            max_end = max(max_end, self.ends[index])
+            if self.max_ends[index] == max_end:
+                break
+            self.max_ends[index] = max_end
+        return True
+    
+    def _find_position(self, start, end):
+        """Returns the insertion position keeping (start, end) order"""
+        position = bisect.bisect_right(self.starts, start)
+        while position > 0 and self.starts[position - 1] == start and self.ends[position - 1] > end:
+            position -= 1
+        return position
+    
+    def __len__(self):
+        return len(self.starts)
+
+
+def get_search_interval(text):
+    """Returns the (start, end) addresses a search text stands for, None if it is not an address.
+    
+    Complete addresses, ranges and CIDRs are taken as they are; a partial
+    address ending in a dot ("10.0.") covers its whole block (10.0.0.0/16)."""
+    text = text.strip()
+    if text.endswith('.'):
+        octets = text[:-1].split('.')
+        if not 1 <= len(octets) <= 3 or not all(octet.isdigit() and int(octet) <= 255 for octet in octets):
+            return None
+        text = '.'.join(octets + ['0'] * (4 - len(octets))) + f"/{8 * len(octets)}"
+    parsed = parse_entry(text)
+    return None if parsed is None else (parsed[1], parsed[2])
+
+
+class EntrySearchIndex:
+    """Incremental search index over table entries.
+    
+    Entries are kept as sorted text for prefix matching ("1.2.3" finds
+    1.2.3.4 and 1.2.30.0-1.2.30.255) and in an IntervalIndex for numeric
+    containment (1.2.3.4 also finds the range 1.2.0.0-1.2.255.255). Adding
+    or removing an entry does not rebuild either structure."""
+    
+    def __init__(self):
+        self.keys = []  # Sorted entry texts
+        self.intervals = {}  # entry -> (start, end)
+        self.interval_index = IntervalIndex()
+    
+    def build(self, entries, get_interval):
+        """Indexes all entries at once (table repopulated)"""
+        self.keys = sorted(set(entries))
+        self.intervals = {}
+        for entry in self.keys:
+            interval = get_interval(entry)
+            if interval is not None:
+                self.intervals[entry] = interval
+        self.interval_index = IntervalIndex.from_entries(self.intervals)
+    
+    def add(self, entry, interval):
+        """Indexes one entry (e.g. a session peer row appended to the table)"""
+        position = bisect.bisect_left(self.keys, entry)
+        if position < len(self.keys) and self.keys[position] == entry:
+            return
+        self.keys.insert(position, entry)
+        if interval is not None:
+            self.intervals[entry] = interval
+            self.interval_index.add(interval[0], interval[1], entry)
+    
+    def remove(self, entry):
+        """Removes one entry from the index"""
+        position = bisect.bisect_left(self.keys, entry)
+        if position < len(self.keys) and self.keys[position] == entry:
+            del self.keys[position]
+        interval = self.intervals.pop(entry, None)
+        if interval is not None:
+            self.interval_index.remove(interval[0], interval[1], entry)
+    
+    def search(self, text):
+        """Returns entries matching text: containing ranges first, then text prefix matches in order"""
+        text = text.strip()
+        if not text:
+            return list(self.keys)
+        
+        matches = []
+        interval = get_search_interval(text)
+        if interval is not None:
+            matches = sorted(self.interval_index.find_overlapping(*interval),
+                             key=lambda entry: self.intervals[entry][1] - self.intervals[entry][0])
+        
+        # All keys with the prefix are one contiguous slice of the sorted texts
+        seen = set(matches)
+        start = bisect.bisect_left(self.keys, text)
+        end = bisect.bisect_left(self.keys, text + '\uffff', start)
+        matches += [entry for entry in self.keys[start:end] if entry not in seen]
+        return matches
+    
+    def __len__(self):
+        return len(self.keys)
+
+
+class BlocklistSnapshot:
+    """Versioned binary snapshot of the compiled blocklist.
+    
+    Layout (little-endian): 32-byte header, then uint32 starts[count] and
+    ends[count] sorted by start, uint8 flags[count] padded to 4 bytes,
+    uint32 text_offsets[count + 1], uint32 display_order[count] and the
+    UTF-8 entry text blob."""
+    
+    MAGIC = b'CBSN'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHIIQ8s')  # magic, version, reserved, count, text size, created, digest
+    FLAG_RANGE = 0x01
+    
+    def __init__(self, path="blocklist.snapshot"):
+        self.path = path
+        self.count = 0
+        self.created = 0
+        self.digest = b''
+        self.starts = None
+        self.ends = None
+        self.flags = None
+        self.text_offsets = None
+        self.display_order = None
+        self.text = None
+        self._file = None
+        self._mmap = None
+        self._view = None
+        self._sorted_entries = None
+    
+    def save(self, ip_manager):
+        """Writes snapshot for the manager's entries, returns True on success"""
+        entries = ip_manager.get_ips()
+        records = []
+        for display_index, entry in enumerate(entries):
+            start, end = ip_manager.get_interval(entry)
+            flags = self.FLAG_RANGE if ip_manager.is_range(entry) else 0
+            records.append((start, end, flags, entry, display_index))
+        records.sort(key=lambda record: (record[0], record[1]))
+        
+        count = len(records)
+        starts = array.array('I', (record[0] for record in records))
+        ends = array.array('I', (record[1] for record in records))
+        flags = bytes(record[2] for record in records)
+        flags += b'\0' * (-len(flags) % 4)
+        
+        encoded = [record[3].encode('utf-8') for record in records]
+        text_offsets = array.array('I', [0])
+        for data in encoded:
+            text_offsets.append(text_offsets[-1] + len(data))
+        text = b''.join(encoded)
+        
+        # display_order[i] = sorted position of the i-th entry in list order
+        display_order = array.array('I', [0] * count)
+        for sorted_index, record in enumerate(records):
+            display_order[record[4]] = sorted_index
+        
+        for values in (starts, ends, text_offsets, display_order):
+            if sys.byteorder != 'little':
+                values.byteswap()
+        
+        digest = hashlib.blake2b(text, digest_size=8).digest()
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, 0, count, len(text), int(time.time()), digest)
+        
+        # Write to temp file and replace, so a crash never leaves a torn snapshot
+        temp_path = f"{self.path}.tmp"
+        try:
+            self.close()
+            with open(temp_path, 'wb') as snapshot_file:
+                snapshot_file.write(header)
+                for section in (starts, ends, flags, text_offsets, display_order, text):
+                    snapshot_file.write(section)
+            os.replace(temp_path, self.path)
+            return True
+        except Exception as e:
+            print(f"Error saving blocklist snapshot: {e}")
+            return False
+    
+    def load(self):
+        """Maps snapshot file for zero-copy reads, returns True on success"""
+        self.close()
+        if not os.path.exists(self.path):
+            return False
+        
+        try:
+            self._file = open(self.path, 'rb')
+            size = os.fstat(self._file.fileno()).st_size
+            if size < self.HEADER.size:
+                raise ValueError("file too small")
+            
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+            
+            magic, version, _, count, text_size, created, digest = self.HEADER.unpack_from(self._view, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError(f"unsupported snapshot format {magic!r} v{version}")
+            
+            flags_size = count + (-count % 4)
+            expected = self.HEADER.size + 8 * count + flags_size + 4 * (count + 1) + 4 * count + text_size
+            if size != expected:
+                raise ValueError(f"size mismatch ({size} != {expected})")
+            
+            offset = self.HEADER.size
+            self.starts = self._section(offset, count)
+            offset += 4 * count
+            self.ends = self._section(offset, count)
+            offset += 4 * count
+            self.flags = self._view[offset:offset + count]
+            offset += flags_size
+            self.text_offsets = self._section(offset, count + 1)
+            offset += 4 * (count + 1)
+            self.display_order = self._section(offset, count)
+            offset += 4 * count
+            self.text = self._view[offset:offset + text_size]
+            
+            self.count = count
+            self.created = created
+            self.digest = digest
+            return True
+        except Exception as e:
+            print(f"Error loading blocklist snapshot: {e}")
+            self.close()
+            return False
+    
+    def _section(self, offset, count):
+        """Returns uint32 view of a section without copying on little-endian"""
+        view = self._view[offset:offset + 4 * count]
+        if sys.byteorder == 'little':
+            return view.cast('I')
+        values = array.array('I', view)
+        values.byteswap()
+        return values
+    
+    def get_sorted_entries(self):
+        """Returns entry texts in sorted (start, end) order, decoding once"""
+        if self._sorted_entries is None:
+            raw = self.text.tobytes()
+            text = raw.decode('utf-8')
+            offsets = self.text_offsets.tolist()
+            if len(text) == len(raw):
+                # ASCII only: byte offsets are character offsets
+                self._sorted_entries = [text[offsets[i]:offsets[i + 1]] for i in range(self.count)]
+            else:
+                self._sorted_entries = [raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.count)]
+        return self._sorted_entries
+    
+    def get_entries(self):
+        """Returns entries in original list order"""
+        sorted_entries = self.get_sorted_entries()
+        return [sorted_entries[sorted_index] for sorted_index in self.display_order]
+    
+    def get_intervals_by_entry(self):
+        """Returns {entry: (start, end)}"""
+        return dict(zip(self.get_sorted_entries(), zip(self.starts, self.ends)))
+    
+    def get_range_entries(self):
+        """Returns set of entries flagged as ranges"""
+        return {entry for entry, flags in zip(self.get_sorted_entries(), self.flags) if flags & self.FLAG_RANGE}
+    
+    def close(self):
+        """Releases the memory map"""
+        for view in (self.starts, self.ends, self.flags, self.text_offsets, self.display_order, self.text):
+            if isinstance(view, memoryview):
+                view.release()
+        self.starts = self.ends = self.flags = self.text_offsets = self.display_order = self.text = None
+        self._sorted_entries = None
+        self.count = 0
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BlockStatusManager:
+    """Manager for handling block status persistence in INI file"""
+    
+    def __init__(self):
+        self.ini_file = "block_status.ini"
+        self.config = configparser.ConfigParser()
+        self.block_status = {}
+        self.history = None  # Optional BlockHistory that gets every saved in/out change
+        self.saved_flags = {}  # entry -> (in, out) as last loaded or saved
+        self.load_status()
+    
+    def load_status(self):
+        """Loads block status from INI file"""
+        if os.path.exists(self.ini_file):
+            try:
+                self.config.read(self.ini_file, encoding='utf-8')
+                
+                # Load all IPs and their statuses from INI
+                for section in self.config.sections():
+                    if section.startswith('IP_'):
+                        ip = section[3:]  # Remove 'IP_' prefix
+                        in_blocked = self.config.getboolean(section, 'in_blocked', fallback=False)
+                        out_blocked = self.config.getboolean(section, 'out_blocked', fallback=False)
+                        self.block_status[ip] = {'in': in_blocked, 'out': out_blocked}
+                        # Entries added outside the list (e.g. session peers)
+                        if self.config.getboolean(section, 'manual', fallback=False):
+                            self.block_status[ip]['manual'] = True
+                        # Rule budget state (see RuleBudget)
+                        if self.config.getboolean(section, 'dormant', fallback=False):
+                            self.block_status[ip]['dormant'] = True
+                        for key in ['enforced_at', 'priority', 'expires_at']:
+                            if self.config.has_option(section, key):
+                                self.block_status[ip][key] = self.config.getint(section, key, fallback=0)
+            except Exception as e:
+                print(f"Error loading INI file: {e}")
+                # Create new file if corrupted
+                self.block_status = {}
+                self.save_status()
+        else:
+            # Create new INI file
+            self.save_status()
+        self.saved_flags = self._get_flags()
+    
+    def _get_flags(self):
+        """Returns {entry: (in, out)} of the current status"""
+        return {ip: (bool(status['in']), bool(status['out'])) for ip, status in self.block_status.items()}
+    
+    def _record_history(self):
+        """Records in/out changes since the last save, so every code path that saves is covered"""
+        flags = self._get_flags()
+        if self.history is not None:
+            for ip in flags.keys() | self.saved_flags.keys():
+                old = self.saved_flags.get(ip, (False, False))
+                new = flags.get(ip, (False, False))
+                for index, direction in enumerate(['in', 'out']):
+                    if old[index] != new[index]:
+                        self.history.record(ip, direction, 'block' if new[index] else 'unblock')
+        self.saved_flags = flags
+    
+    def flush_history(self):
+        """Writes history events recorded by saves since the last flush (once per operation)"""
+        if self.history is not None:
+            self.history.flush()
+    
+    def save_status(self):
+        """Saves block status to INI file"""
+        try:
+            # Clear existing config
+            self.config.clear()
+            
+            # Add settings section
+            if not self.config.has_section('Settings'):
+                self.config.add_section('Settings')
+            
+            # Add each IP with its status
+            for ip, status in self.block_status.items():
+                section_name = f'IP_{ip}'
+                if not self.config.has_section(section_name):
+                    self.config.add_section(section_name)
+                self.config.set(section_name, 'in_blocked', str(status['in']).lower())
+                self.config.set(section_name, 'out_blocked', str(status['out']).lower())
+                if status.get('manual'):
+                    self.config.set(section_name, 'manual', 'true')
+                if status.get('dormant'):
+                    self.config.set(section_name, 'dormant', 'true')
+                for key in ['enforced_at', 'priority', 'expires_at']:
+                    if key in status:
+                        self.config.set(section_name, key, str(status[key]))
+            
+            # Write to file
+            with open(self.ini_file, 'w', encoding='utf-8') as configfile:
+                self.config.write(configfile)
+            self._record_history()
+        except Exception as e:
+            print(f"Error saving INI file: {e}")
+    
+    def update_status(self, ip, status):
+        """Updates status for specific IP"""
+        self.block_status[ip] = status
+        self.save_status()
+    
+    def remove_ip(self, ip):
+        """Removes IP from INI file"""
+        if ip in self.block_status:
+            del self.block_status[ip]
+            
+            # Also remove from config
+            section_name = f'IP_{ip}'
+            if self.config.has_section(section_name):
+                self.config.remove_section(section_name)
+            
+            self.save_status()
+            return True
+        return False
+    
+    def cleanup_orphaned_ips(self, current_ips):
+        """Removes IPs that are in INI but not in current list (manual entries are kept)"""
+        current_ips = set(current_ips)
+        ips_to_remove = []
+        for ip, status in self.block_status.items():
+            if ip not in current_ips and not status.get('manual'):
+                ips_to_remove.append(ip)
+        
+        for ip in ips_to_remove:
+            self.remove_ip(ip)
+        
+        return ips_to_remove
+    
+    def get_status(self, ip):
+        """Gets status for specific IP"""
+        return self.block_status.get(ip, {'in': False, 'out': False})
+    
+    def get_manual_ips(self):
+        """Returns entries that were added outside the loaded list"""
+        return [ip for ip, status in self.block_status.items() if status.get('manual')]
+    
+    def get_all_blocked_ips(self):
+        """Returns all IPs with any blocking"""
+        blocked_ips = []
+        for ip, status in self.block_status.items():
+            if status['in'] or status['out']:
+                blocked_ips.append(ip)
+        return blocked_ips
+
+
+class AllowlistManager:
+    """Manager for IPs and ranges that are never blocked (e.g. friends on a cheater's ISP)"""
+    
+    def __init__(self, ini_file="allowlist.ini"):
+        self.ini_file = ini_file
+        self.entries = {}  # entry -> note
+        self.hole_starts = []  # Merged, sorted allowed intervals
+        self.hole_ends = []
+        self.load()
+    
+    def load(self):
+        """Loads allowlist from INI file"""
+        if not os.path.exists(self.ini_file):
+            return
+        config = configparser.ConfigParser(delimiters=('=',), interpolation=None)
+        try:
+            config.read(self.ini_file, encoding='utf-8')
+            if config.has_section('Allowlist'):
+                for entry, note in config.items('Allowlist'):
+                    parsed = parse_entry(entry)
+                    if parsed is not None:
+                        self.entries[parsed[0]] = note
+        except Exception as e:
+            print(f"Error loading allowlist: {e}")
+        self._rebuild()
+    
+    def save(self):
+        """Saves allowlist to INI file"""
+        config = configparser.ConfigParser(delimiters=('=',), interpolation=None)
+        config['Allowlist'] = self.entries
+        try:
+            with open(self.ini_file, 'w', encoding='utf-8') as allowlist_file:
+                config.write(allowlist_file)
+        except Exception as e:
+            print(f"Error saving allowlist: {e}")
+    
+    def _rebuild(self):
+        """Merges allowed entries into sorted non-overlapping holes"""
+        intervals = sorted(parse_entry(entry)[1:] for entry in self.entries)
+        starts = []
+        ends = []
+        for start, end in intervals:
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.hole_starts = starts
+        self.hole_ends = ends
+    
+    def add(self, entry, note=''):
+        """Adds an IP, range or CIDR. Returns (entry, start, end) or None if invalid"""
+        parsed = parse_entry(entry.strip())
+        if parsed is None:
+            return None
+        self.entries[parsed[0]] = note
+        self._rebuild()
+        self.save()
+        return parsed
+    
+    def remove(self, entry):
+        """Removes an entry. Returns (entry, start, end) or None if it was not allowed"""
+        parsed = parse_entry(entry.strip())
+        if parsed is None or parsed[0] not in self.entries:
+            return None
+        del self.entries[parsed[0]]
+        self._rebuild()
+        self.save()
+        return parsed
+    
+    def get_entries(self):
+        """Returns [(entry, note)]"""
+        return list(self.entries.items())
+    
+    def overlaps(self, start, end):
+        """Checks if any allowed address lies in [start, end]"""
+        position = bisect.bisect_left(self.hole_ends, start)
+        return position < len(self.hole_starts) and self.hole_starts[position] <= end
+    
+    def split(self, start, end):
+        """Returns the pieces of [start, end] that may be blocked"""
+        return subtract_intervals(start, end, self.hole_starts, self.hole_ends)
+    
+    def get_affected_entries(self, entry_intervals, start, end):
+        """Returns entries from {entry: (start, end)} whose rules change with [start, end]"""
+        return IntervalIndex.from_entries(entry_intervals).find_overlapping(start, end)
+
+
+# Units accepted by parse_duration
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(text):
+    """Parses '90', '90s', '30m', '2h' or '1d' into seconds, None if invalid"""
+    text = text.strip().lower()
+    multiplier = _DURATION_UNITS.get(text[-1:], None)
+    number = text[:-1] if multiplier else text
+    if not number.isdigit():
+        return None
+    return int(number) * (multiplier or 1)
+
+
+class ExpiryQueue:
+    """Min-heap of absolute block expiry times for timed blocks.
+    
+    Heap items are invalidated lazily: an item only counts while the entry's
+    status still has the same expires_at, so re-blocking or unblocking never
+    needs a heap removal."""
+    
+    def __init__(self, block_status):
+        self.block_status = block_status  # {entry: status}, shared with the caller
+        self.heap = []
+        for entry in block_status:
+            self.schedule(entry)
+    
+    def schedule(self, entry):
+        """Adds entry if its status has an expiry time"""
+        expires_at = self.block_status.get(entry, {}).get('expires_at')
+        if expires_at:
+            heapq.heappush(self.heap, (expires_at, entry))
+    
+    def _is_current(self, expires_at, entry):
+        status = self.block_status.get(entry)
+        return status is not None and status.get('expires_at') == expires_at and (status['in'] or status['out'])
+    
+    def next_expiry(self):
+        """Returns the earliest pending expiry time, or None"""
+        while self.heap and not self._is_current(*self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+    
+    def pop_expired(self, now=None):
+        """Removes and returns entries whose block has expired"""
+        now = time.time() if now is None else now
+        expired = {}  # Ordered set: an entry can be scheduled more than once
+        while self.heap and self.heap[0][0] <= now:
+            expires_at, entry = heapq.heappop(self.heap)
+            if self._is_current(expires_at, entry):
+                expired[entry] = None
+        return list(expired)
+    
+    def expire(self, firewall_manager, now=None):
+        """Unblocks all expired entries in one batch, returns them.
+        
+        Statuses are updated in place; the caller saves them once."""
+        expired = self.pop_expired(now)
+        if not expired:
+            return expired
+        firewall_manager.begin_batch()
+        try:
+            for entry in expired:
+                status = self.block_status[entry]
+                if not status.get('dormant'):
+                    for direction in ['in', 'out']:
+                        if status[direction]:
+                            firewall_manager.delete_rule(entry, direction)
+                status['in'] = False
+                status['out'] = False
+                for key in ['expires_at', 'dormant']:
+                    status.pop(key, None)
+        finally:
+            firewall_manager.submit_batch()
+        return expired
+
+
+class RuleBudget:
+    """Keeps active firewall rules (or blocked addresses) under a limit.
+    
+    Blocked entries over the budget stay marked as blocked but "dormant"
+    (no firewall rule) until room frees up or they are needed again."""
+    
+    POLICIES = ['lru_hit', 'oldest', 'priority']
+    UNITS = ['rules', 'addresses']
+    
+    def __init__(self, limit=0, unit='rules', policy='lru_hit'):
+        self.limit = limit  # 0 = unlimited
+        self.unit = unit if unit in self.UNITS else 'rules'
+        self.policy = policy if policy in self.POLICIES else 'lru_hit'
+    
+    def is_limited(self):
+        """Checks if a budget is configured"""
+        return self.limit > 0
+    
+    def get_cost(self, status, interval):
+        """Returns how much of the budget an enforced entry uses"""
+        rules = int(status['in']) + int(status['out'])
+        if self.unit == 'rules' or not rules:
+            return rules
+        return interval[1] - interval[0] + 1 if interval else 1
+    
+    def get_keep_key(self, status, last_hit):
+        """Returns sort key, higher keys are kept first"""
+        enforced_at = status.get('enforced_at', 0)
+        if self.policy == 'oldest':
+            return (enforced_at,)
+        if self.policy == 'priority':
+            return (status.get('priority', 0), enforced_at)
+        return (last_hit, enforced_at)  # "YYYY-MM-DD HH:MM:SS" sorts in time order, '' = never hit
+    
+    def create_rule(self, entry, status, direction, firewall_manager):
+        """Creates the rule for a newly blocked direction unless the entry is (or becomes) dormant.
+        
+        Returns False when the entry was left for reconcile() to decide."""
+        if status.get('dormant') or (self.is_limited() and not (status['in'] or status['out'])):
+            status['dormant'] = True
+            return False
+        firewall_manager.create_rule(entry, direction)
+        status.setdefault('enforced_at', int(time.time()))
+        return True
+    
+    def select(self, candidates, forced=()):
+        """Picks enforced entries from [(entry, cost, keep_key)] within the limit"""
+        if not self.is_limited():
+            return {entry for entry, _, _ in candidates}
+        
+        enforced = set()
+        used = 0
+        costs = {entry: cost for entry, cost, _ in candidates}
+        # Entries the user just acted on always get their rules
+        for entry in forced:
+            if entry in costs:
+                enforced.add(entry)
+                used += costs[entry]
+        for entry, cost, _ in sorted(candidates, key=lambda candidate: candidate[2], reverse=True):
+            if entry not in enforced and used + cost <= self.limit:
+                enforced.add(entry)
+                used += cost
+        return enforced
+    
+    def reconcile(self, block_status, get_interval, last_hits, firewall_manager, forced=()):
+        """Creates/deletes rules so only selected blocked entries are enforced.
+        
+        block_status is {entry: status} and is updated in place; last_hits is
+        {entry: [count, last_seen]}. Returns (activated, deactivated) entries."""
+        candidates = []
+        for entry, status in block_status.items():
+            if status['in'] or status['out']:
+                hit = last_hits.get(entry)
+                candidates.append((entry, self.get_cost(status, get_interval(entry)),
+                                   self.get_keep_key(status, hit[1] if hit else '')))
+            elif status.get('dormant'):
+                del status['dormant']  # Unblocked entries are neither enforced nor dormant
+        
+        enforced = self.select(candidates, forced)
+        now = int(time.time())
+        activated = []
+        deactivated = []
+        for entry, _, _ in candidates:
+            status = block_status[entry]
+            directions = [direction for direction in ['in', 'out'] if status[direction]]
+            if entry in enforced:
+                if entry in forced:
+                    status['enforced_at'] = now
+                if status.get('dormant'):
+                    del status['dormant']
+                    for direction in directions:
+                        firewall_manager.create_rule(entry, direction)
+                    status.setdefault('enforced_at', now)
+                    activated.append(entry)
+            elif not status.get('dormant'):
+                for direction in directions:
+                    firewall_manager.delete_rule(entry, direction)
+                status['dormant'] = True
+                deactivated.append(entry)
+        return activated, deactivated
+
+
+class RulePlan:
+    """Firewall operations an action would run, with a wall time estimate"""
+    
+    def __init__(self, action, direction, commands, skipped, dormant, estimated_seconds, backend=None):
+        self.backend = backend  # Firewall backend that formats the exported script
+        self.action = action
+        self.direction = direction
+        self.commands = commands  # [(action, rule name, netsh arguments)] in execution order
+        self.skipped = skipped  # Entries that already have the requested state
+        self.dormant = dormant  # Entries that would be marked blocked without a rule (rule budget)
+        self.estimated_seconds = estimated_seconds
+    
+    def count(self, action):
+        """Returns number of firewall calls with 'add' or 'delete'"""
+        return sum(1 for command_action, _, _ in self.commands if command_action == action)
+    
+    def get_rule_names(self):
+        """Returns distinct rule names touched by the plan"""
+        return {rule_name for _, rule_name, _ in self.commands}
+    
+    def is_empty(self):
+        """Checks if the action would change nothing"""
+        return not self.commands and not self.dormant
+    
+    def export_script(self, path):
+        """Writes the firewall calls as a script that can be reviewed and run as administrator"""
+        backend = self.backend if self.backend is not None else FirewallRuleManager()
+        newline = '\r\n' if backend.name == 'netsh' else '\n'
+        with open(path, 'w', encoding='utf-8', newline=newline) as script:
+            script.write(backend.format_script(self.commands, f'CheatersBlocker plan: {self}'))
+    
+    def __str__(self):
+        return (f"{self.action} {self.direction}: {len(self.commands)} firewall calls "
+                f"({self.count('add')} add, {self.count('delete')} delete), "
+                f"{len(self.get_rule_names())} rules, {len(self.dormant)} dormant, "
+                f"{self.skipped} unchanged, ~{self.estimated_seconds:.1f} s")
+
+
+class ActionPlanner:
+    """Builds a RulePlan by running an action against a copy of the block status
+    with a firewall backend that records commands instead of executing them"""
+    
+    def __init__(self, firewall_manager, rule_budget):
+        self.firewall_manager = firewall_manager  # Supplies the allowlist and measured call times
+        self.rule_budget = rule_budget
+    
+    def get_pending_directions(self, status, direction, action):
+        """Returns directions the action would actually change"""
+        directions = ['in', 'out'] if direction == 'both' else [direction]
+        if action == 'block':
+            return [d for d in directions if not status[d]]
+        return [d for d in directions if status[d]]
+    
+    def plan(self, entries, direction, action, block_status, get_interval, last_hits, forced=()):
+        """Returns the RulePlan for applying action to entries; block_status is not modified"""
+        recorder = self.firewall_manager.create_recorder()
+        statuses = {entry: dict(status) for entry, status in block_status.items()}
+        
+        skipped = 0
+        for entry in entries:
+            status = statuses.setdefault(entry, {'in': False, 'out': False})
+            pending = self.get_pending_directions(status, direction, action)
+            if not pending:
+                skipped += 1
+                continue
+            
+            if action == 'block':
+                # Same order as the GUI: wake a dormant entry, then create the new direction
+                if status.get('dormant'):
+                    del status['dormant']
+                    for other in ['in', 'out']:
+                        if status[other] and other not in pending:
+                            recorder.create_rule(entry, other)
+                for pending_direction in pending:
+                    self.rule_budget.create_rule(entry, status, pending_direction, recorder)
+                    status[pending_direction] = True
+            else:
+                # Dormant entries have no rules to delete
+                if not status.get('dormant'):
+                    for pending_direction in pending:
+                        recorder.delete_rule(entry, pending_direction)
+                for pending_direction in pending:
+                    status[pending_direction] = False
+        
+        # Rule budget settles after the action, as in the real run
+        if self.rule_budget.is_limited() or any(status.get('dormant') for status in statuses.values()):
+            self.rule_budget.reconcile(statuses, get_interval, last_hits, recorder, forced)
+        
+        dormant = [entry for entry, status in statuses.items()
+                   if status.get('dormant') and not block_status.get(entry, {}).get('dormant')]
+        commands = recorder.recording
+        estimated_seconds = sum(self.firewall_manager.get_call_time(command_action)
+                                for command_action, _, _ in commands)
+        return RulePlan(action, direction, commands, skipped, dormant, estimated_seconds, self.firewall_manager)
+
+
+class SettingsManager:
+    """Manager for handling settings"""
+    
+    def __init__(self):
+        self.config_file = "settings.ini"
+        self.config = configparser.ConfigParser()
+        self.load_settings()
+    
+    def load_settings(self):
+        """Loads settings from file"""
+        if os.path.exists(self.config_file):
+            try:
+                self.config.read(self.config_file, encoding='utf-8')
+            except:
+                # Create default settings if file is corrupted
+                self.config['Settings'] = {
+                    'sounds_enabled': 'true',
+                    'global_block_enabled': 'true'
+                }
+                self.save_settings()
+        else:
+            # Create default settings
+            self.config['Settings'] = {
+                'sounds_enabled': 'true',
+                'global_block_enabled': 'true'
+            }
+            self.save_settings()
+    
+    def save_settings(self):
+        """Saves settings to file"""
+        try:
+            with open(self.config_file, 'w', encoding='utf-8') as configfile:
+                self.config.write(configfile)
+        except Exception as e:
+            print(f"Error saving settings: {e}")
+    
+    def get_sounds_enabled(self):
+        """Returns sound status"""
+        return self.config.getboolean('Settings', 'sounds_enabled', fallback=True)
+    
+    def set_sounds_enabled(self, enabled):
+        """Sets sound status"""
+        self.config.set('Settings', 'sounds_enabled', str(enabled).lower())
+        self.save_settings()
+    
+    def get_global_block_enabled(self):
+        """Returns global block checkbox status"""
+        return self.config.getboolean('Settings', 'global_block_enabled', fallback=True)
+    
+    def set_global_block_enabled(self, enabled):
+        """Sets global block checkbox status"""
+        self.config.set('Settings', 'global_block_enabled', str(enabled).lower())
+        self.save_settings()
+    
+    def get_firewall_log_enabled(self):
+        """Returns whether dropped packets are counted from the firewall log"""
+        return self.config.getboolean('Settings', 'firewall_log_enabled', fallback=True)
+    
+    def get_firewall_log_path(self):
+        """Returns firewall log path (pfirewall.log)"""
+        return self.config.get('Settings', 'firewall_log_path', fallback=DEFAULT_FIREWALL_LOG)
+    
+    def get_auto_block_enabled(self):
+        """Returns whether list entries seen in the peer feed are blocked automatically"""
+        return self.config.getboolean('Settings', 'auto_block_enabled', fallback=False)
+    
+    def set_auto_block_enabled(self, enabled):
+        """Sets automatic blocking status"""
+        self.config.set('Settings', 'auto_block_enabled', str(enabled).lower())
+        self.save_settings()
+    
+    def get_auto_block_direction(self):
+        """Returns direction blocked automatically ('both', 'in' or 'out')"""
+        direction = self.config.get('Settings', 'auto_block_direction', fallback='both')
+        return direction if direction in ['both', 'in', 'out'] else 'both'
+    
+    def get_auto_block_feed(self):
+        """Returns peer feed for automatic blocking: 'peers', 'file:PATH' or 'socket:PORT'"""
+        return self.config.get('Settings', 'auto_block_feed', fallback='peers')
+    
+    def get_auto_block_limits(self):
+        """Returns (debounce seconds, max actions per minute) for automatic blocking"""
+        debounce = self.config.getfloat('Settings', 'auto_block_debounce', fallback=30.0)
+        max_per_minute = self.config.getint('Settings', 'auto_block_max_per_minute', fallback=10)
+        return debounce, max_per_minute
+    
+    def get_rule_budget(self):
+        """Returns RuleBudget from settings (rule_budget = 0 means unlimited)"""
+        return RuleBudget(self.config.getint('Settings', 'rule_budget', fallback=0),
+                          self.config.get('Settings', 'rule_budget_unit', fallback='rules'),
+                          self.config.get('Settings', 'eviction_policy', fallback='lru_hit'))
+    
+    def get_drift_settings(self):
+        """Returns (check interval seconds, CPU budget percent, max checks per hour, auto repair)"""
+        interval = self.config.getfloat('Settings', 'drift_check_interval', fallback=60.0)
+        cpu_percent = self.config.getfloat('Settings', 'drift_cpu_budget_percent', fallback=1.0)
+        max_per_hour = self.config.getint('Settings', 'drift_max_checks_per_hour', fallback=60)
+        repair = self.config.getboolean('Settings', 'drift_repair', fallback=True)
+        return interval, cpu_percent, max_per_hour, repair
+    
+    def get_terminate_flows(self):
+        """Returns whether established flows of newly blocked entries are ended"""
+        return self.config.getboolean('Settings', 'terminate_flows', fallback=False)
+    
+    def set_terminate_flows(self, enabled):
+        """Sets whether established flows are ended after a block"""
+        self.config.set('Settings', 'terminate_flows', str(enabled).lower())
+        self.save_settings()
+    
+    def get_conntrack_path(self):
+        """Returns path of the conntrack binary used to end flows on Linux gateways"""
+        return self.config.get('Settings', 'conntrack_path', fallback='conntrack')
+    
+    def get_nft_counters(self):
+        """Returns whether nftables set elements count dropped packets (times the first drop)"""
+        return self.config.getboolean('Settings', 'nft_counters', fallback=False)
+    
+    def get_firewall_backend(self):
+        """Returns firewall backend name: 'netsh' (Windows) or 'nftables' (Linux gateways)"""
+        default = 'netsh' if sys.platform == 'win32' else 'nftables'
+        backend = self.config.get('Settings', 'firewall_backend', fallback=default)
+        return backend if backend in ['netsh', 'nftables'] else default
+    
+    def get_nft_path(self):
+        """Returns path of the nft binary used by the nftables backend"""
+        return self.config.get('Settings', 'nft_path', fallback='nft')
+    
+    def get_rule_scope_setting(self):
+        """Returns (rule_program, rule_protocol) as configured.
+        
+        rule_program is empty (all programs), 'auto' (detected game) or a path;
+        rule_protocol is 'any' or 'udp'."""
+        program = self.config.get('Settings', 'rule_program', fallback='').strip()
+        protocol = self.config.get('Settings', 'rule_protocol', fallback='any').strip().lower()
+        return program, protocol if protocol in RULE_PROTOCOLS else 'any'
+    
+    def get_rule_scope(self):
+        """Returns (program, protocol) that firewall rules are limited to, with 'auto' resolved"""
+        program, protocol = self.get_rule_scope_setting()
+        if program.lower() == 'auto':
+            program = detect_game_executable() or ''
+        return program, protocol
+    
+    def set_rule_scope(self, program, protocol):
+        """Sets the rule scope ('auto' detects the game executable)"""
+        self.config.set('Settings', 'rule_program', program)
+        self.config.set('Settings', 'rule_protocol', protocol)
+        self.save_settings()
+    
+    def get_applied_rule_scope(self):
+        """Returns (program, protocol) the existing rules were created with"""
+        return (self.config.get('Settings', 'rule_scope_program', fallback=''),
+                self.config.get('Settings', 'rule_scope_protocol', fallback='any'))
+    
+    def set_applied_rule_scope(self, scope):
+        """Remembers the scope the existing rules were created with"""
+        self.config.set('Settings', 'rule_scope_program', scope[0])
+        self.config.set('Settings', 'rule_scope_protocol', scope[1])
+        self.save_settings()
+    
+    def get_journal_recovery(self):
+        """Returns how interrupted bulk operations are recovered: 'resume' or 'rollback'"""
+        policy = self.config.get('Settings', 'journal_recovery', fallback='resume')
+        return policy if policy in ['resume', 'rollback'] else 'resume'
+    
+    def get_history_capacity(self):
+        """Returns how many block/unblock events the block history keeps"""
+        return max(self.config.getint('Settings', 'history_capacity', fallback=100000), 1)
+    
+    def get_control_port(self):
+        """Returns loopback TCP port of the control socket (0 = disabled)"""
+        return self.config.getint('Settings', 'control_port', fallback=0)
+    
+    def get_control_socket(self):
+        """Returns the Unix socket path of the control socket where the platform has Unix sockets"""
+        return self.config.get('Settings', 'control_socket', fallback='control.sock')
+    
+    def get_control_token(self):
+        """Returns the per-install secret TCP control clients authenticate with, creating it on first use"""
+        token = self.config.get('Settings', 'control_token', fallback='')
+        if not token:
+            token = secrets.token_hex(16)
+            if not self.config.has_section('Settings'):
+                self.config.add_section('Settings')
+            self.config.set('Settings', 'control_token', token)
+            self.save_settings()
+        return token
+    
+    def get_call_time_estimates(self):
+        """Returns last measured seconds per netsh add/delete call (used by plan estimates)"""
+        add_seconds = self.config.getfloat('Settings', 'netsh_add_seconds', fallback=0.15)
+        delete_seconds = self.config.getfloat('Settings', 'netsh_delete_seconds', fallback=0.12)
+        return add_seconds, delete_seconds
+    
+    def set_call_time_estimates(self, firewall_manager):
+        """Stores the average measured netsh call times for the next session"""
+        changed = False
+        for action in ['add', 'delete']:
+            if firewall_manager.call_times[action]:
+                self.config.set('Settings', f'netsh_{action}_seconds',
+                                f"{firewall_manager.get_call_time(action):.4f}")
+                changed = True
+        if changed:
+            self.save_settings()
+    
+    def get_report_settings(self):
+        """Returns (collector URL, batch size, dedupe hours) for cheater reports; no URL means off"""
+        return (self.config.get('Settings', 'report_url', fallback='').strip(),
+                self.config.getint('Settings', 'report_batch_size', fallback=100),
+                self.config.getfloat('Settings', 'report_dedupe_hours', fallback=24.0))
+    
+    def get_peer_ports(self):
+        """Returns UDP ports used for session peer discovery (empty = all)"""
+        value = self.config.get('Settings', 'peer_ports', fallback='')
+        return [int(port) for port in value.replace(' ', '').split(',') if port.isdigit()]
+
+
+class StartupTimer:
+    """Collects start-up phase timings and logs a breakdown"""
+    
+    def __init__(self, start_time=None, log_file="startup.log", target_ms=STARTUP_TARGET_MS):
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.log_file = log_file
+        self.target_ms = target_ms
+        self.marks = []
+        self.goal_phase = 'first_paint'
+    
+    def mark(self, phase):
+        """Records the end of a start-up phase"""
+        self.marks.append((phase, time.perf_counter()))
+    
+    def elapsed_ms(self, phase=None):
+        """Returns ms from start to phase (or to now)"""
+        for name, timestamp in self.marks:
+            if name == phase:
+                return (timestamp - self.start_time) * 1000
+        return (time.perf_counter() - self.start_time) * 1000
+    
+    def report(self):
+        """Prints and appends the timing breakdown to the log file"""
+        lines = []
+        previous = self.start_time
+        for phase, timestamp in self.marks:
+            lines.append(f"  {phase:<20} +{(timestamp - previous) * 1000:8.1f} ms  "
+                         f"(at {(timestamp - self.start_time) * 1000:8.1f} ms)")
+            previous = timestamp
+        
+        goal_ms = self.elapsed_ms(self.goal_phase)
+        goal_text = 'met' if goal_ms <= self.target_ms else 'MISSED'
+        header = (f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Start-up: {self.goal_phase} at {goal_ms:.1f} ms "
+                  f"(goal {self.target_ms} ms, {goal_text})")
+        text = '\n'.join([header] + lines) + '\n'
+        print(text, end='')
+        
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as log:
+                log.write(text)
+        except Exception as e:
+            print(f"Error writing start-up log: {e}")
+        
+        return goal_ms
+
+
+class ProfilingManager:
+    """Manager for on-demand profiling captures of single actions"""
+    
+    def __init__(self, output_dir='.'):
+        self.output_dir = output_dir
+        self.enabled = False
+        self.top_n = 5
+        self.sample_interval = 0.002  # Seconds between stack samples of watched threads
+        self.last_report_path = None
+    
+    def set_enabled(self, enabled):
+        """Enables or disables profiling of subsequent actions"""
+        self.enabled = enabled
+    
+    def capture(self, label, func, *args, watch_threads=None):
+        """Runs func under cProfile + tracemalloc and samples watched threads.
+        
+        Returns (func result, report path, short summary)."""
+        import cProfile
+        import tracemalloc
+        
+        # Sample other threads (e.g. hotkey thread) while the action runs
+        watch_threads = {ident: name for ident, name in (watch_threads or {}).items() if ident}
+        samples = {name: {} for name in watch_threads.values()}
+        stop_event = threading.Event()
+        sampler = threading.Thread(target=self._sample_threads,
+                                   args=(watch_threads, samples, stop_event),
+                                   daemon=True)
+        
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        snapshot_before = tracemalloc.take_snapshot()
+        
+        profiler = cProfile.Profile()
+        sampler.start()
+        start_time = time.perf_counter()
+        profiler.enable()
+        try:
+            result = func(*args)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start_time
+            stop_event.set()
+            sampler.join(timeout=1)
+            snapshot_after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+        
+        memory_diff = snapshot_after.compare_to(snapshot_before, 'lineno')
+        report_path, summary = self._write_report(label, elapsed, profiler, samples, memory_diff)
+        return result, report_path, summary
+    
+    def _sample_threads(self, watch_threads, samples, stop_event):
+        """Collects stack samples for watched threads until stopped"""
+        while not stop_event.wait(self.sample_interval):
+            frames = sys._current_frames()
+            for ident, name in watch_threads.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                # Count each function once per sample (inclusive time)
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    key = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+                    if key not in seen:
+                        seen.add(key)
+                        samples[name][key] = samples[name].get(key, 0) + 1
+                    frame = frame.f_back
+    
+    def _write_report(self, label, elapsed, profiler, samples, memory_diff):
+        """Writes profile report and raw stats next to settings file"""
+        import io
+        import pstats
+        
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
+        base_name = os.path.join(self.output_dir, f"profile_{label}_{timestamp}")
+        report_path = f"{base_name}.txt"
+        
+        stats_stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stats_stream)
+        stats.sort_stats('cumulative').print_stats(40)
+        
+        # Short summary for status bar: top-N own functions by cumulative time
+        top_entries = []
+        for func, (cc, nc, tt, ct, callers) in sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True):
+            filename, lineno, func_name = func
+            if filename == '~' or func_name.startswith('<'):
+                continue  # Skip builtins and module-level frames
+            top_entries.append(f"{func_name} {ct * 1000:.1f}ms")
+            if len(top_entries) >= self.top_n:
+                break
+        summary = f"{label}: {elapsed * 1000:.1f}ms total; top: " + ', '.join(top_entries)
+        
+        try:
+            profiler.dump_stats(f"{base_name}.prof")
+            with open(report_path, 'w', encoding='utf-8') as report:
+                report.write(f"Action: {label}\n")
+                report.write(f"Captured: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                report.write(f"Wall time: {elapsed * 1000:.2f} ms\n\n")
+                
+                report.write("=== cProfile (GUI thread) ===\n")
+                report.write(stats_stream.getvalue())
+                
+                for name, counts in samples.items():
+                    total = sum(counts.values())
+                    report.write(f"\n=== Sampled stacks ({name} thread, {total} hits) ===\n")
+                    for key, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:20]:
+                        report.write(f"{count:8d}  {key}\n")
+                
+                report.write("\n=== tracemalloc diff (top 20) ===\n")
+                for stat in memory_diff[:20]:
+                    report.write(f"{stat}\n")
+            
+            self.last_report_path = report_path
+        except Exception as e:
+            print(f"Error writing profile report: {e}")
+            report_path = None
+        
+        return report_path, summary
+
+
+def detect_game_executable():
+    """Returns the path of the running or installed game executable, None if not found"""
+    if sys.platform == 'win32':
+        path = _find_running_executable(GAME_EXECUTABLES)
+        if path:
+            return path
+    for name in GAME_EXECUTABLES:
+        for directory in GAME_INSTALL_DIRS:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def _get_process_path(process_id):
+    """Returns the full image path of a process, None if it cannot be opened (Windows)"""
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(0x1000, False, process_id)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not handle:
+        return None
+    try:
+        buffer = ctypes.create_unicode_buffer(32768)
+        size = ctypes.c_ulong(len(buffer))
+        if kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+            return buffer.value
+        return None
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _find_running_executable(names):
+    """Returns the full image path of the first running process with one of the names (Windows)"""
+    try:
+        psapi = ctypes.windll.psapi
+        process_ids = (ctypes.c_ulong * 4096)()
+        returned = ctypes.c_ulong()
+        if not psapi.EnumProcesses(process_ids, ctypes.sizeof(process_ids), ctypes.byref(returned)):
+            return None
+        
+        wanted = {name.lower() for name in names}
+        best = None
+        for process_id in process_ids[:returned.value // ctypes.sizeof(ctypes.c_ulong)]:
+            path = _get_process_path(process_id)
+            if path is None:
+                continue
+            name = os.path.basename(path).lower()
+            # Multiplayer wins over single player if both run
+            if name in wanted and (best is None or names[0].lower() == name):
+                best = path
+        return best
+    except Exception as e:
+        print(f"Error detecting game executable: {e}")
+        return None
+
+
+class MIB_TCPROW_OWNER_PID(ctypes.Structure):
+    """Row of the IPv4 TCP table; the first five fields are the MIB_TCPROW SetTcpEntry takes"""
+    _fields_ = [('dwState', ctypes.c_ulong), ('dwLocalAddr', ctypes.c_ulong), ('dwLocalPort', ctypes.c_ulong),
+                ('dwRemoteAddr', ctypes.c_ulong), ('dwRemotePort', ctypes.c_ulong), ('dwOwningPid', ctypes.c_ulong)]
+
+
+def close_tcp_connections(intervals, program=''):
+    """Resets IPv4 TCP connections whose remote address is in one of the (start, end) intervals.
+    
+    With a program, only its connections are reset. Returns the number of
+    reset connections (0 where the TCP table is not available)."""
+    if not intervals:
+        return 0
+    try:
+        iphlpapi = ctypes.windll.iphlpapi
+        # The table can grow between the size query and the read
+        size = ctypes.c_ulong(0)
+        buffer = None
+        for _ in range(3):
+            buffer = ctypes.create_string_buffer(size.value or 4)
+            # AF_INET, TCP_TABLE_OWNER_PID_ALL
+            result = iphlpapi.GetExtendedTcpTable(buffer, ctypes.byref(size), False, 2, 5, 0)
+            if result == 0:
+                break
+            if result != 122:  # ERROR_INSUFFICIENT_BUFFER
+                print(f"Error reading TCP table: {result}")
+                return 0
+        else:
+            return 0
+        count = ctypes.c_ulong.from_buffer(buffer).value
+        rows = (MIB_TCPROW_OWNER_PID * count).from_buffer(buffer, ctypes.sizeof(ctypes.c_ulong))
+    except Exception as e:
+        print(f"Error reading TCP table: {e}")
+        return 0
+    
+    index = IntervalIndex((start, end, True) for start, end in intervals)
+    program = os.path.normcase(program) if program else ''
+    paths = {}
+    closed = 0
+    for row in rows:
+        # Skip CLOSED and LISTEN; addresses are in network byte order
+        if row.dwState <= 2:
+            continue
+        if index.find_first(int.from_bytes(struct.pack('<I', row.dwRemoteAddr), 'big')) is None:
+            continue
+        if program:
+            if row.dwOwningPid not in paths:
+                paths[row.dwOwningPid] = os.path.normcase(_get_process_path(row.dwOwningPid) or '')
+            if paths[row.dwOwningPid] != program:
+                continue
+        row.dwState = 12  # MIB_TCP_STATE_DELETE_TCB
+        if iphlpapi.SetTcpEntry(ctypes.byref(row)) == 0:
+            closed += 1
+    return closed
+
+
+def check_admin_privileges():
+    """Check if program is running with administrator privileges"""
+    try:
+        # Linux gateways (nftables backend) need root instead
+        if sys.platform != 'win32':
+            return os.geteuid() == 0
+        is_admin = ctypes.windll.shell32.IsUserAnAdmin()
+        return is_admin
+    except:
+        return False
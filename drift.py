@@ -0,0 +1,222 @@
+"""
+Drift detection between saved block status and the actual firewall rules
+
+One `netsh` enumeration per check is reduced to a fingerprint (rule count
+plus a hash over names and remote addresses of IPBlocker_* rules). The
+full diff against the expected rule set only runs when the fingerprint
+changes. A status generation, bumped on every reset, tells whether a rule
+listing was taken before the saved status last changed. Repairs are
+recorded as one batch and run in place of the next check, so they share
+its process and CPU budget. No Qt imports here.
+"""
+
+import sys
+import time
+import hashlib
+import threading
+import subprocess
+
+from core import get_rule_base_name, parse_entry
+
+RULE_PREFIX = 'IPBlocker_'
+
+
+def parse_rule_listing(text, prefix=RULE_PREFIX):
+    """Parses `netsh advfirewall firewall show rule` output into [(name, remote_ip)].
+    
+    A rule starts with its name line followed by a dashed separator, so
+    localized field labels do not matter for finding rule names."""
+    rules = []
+    lines = text.splitlines()
+    name = None
+    for index, line in enumerate(lines):
+        if line.startswith('---') and index > 0:
+            _, _, value = lines[index - 1].partition(':')
+            value = value.strip()
+            name = value if value.startswith(prefix) else None
+            if name:
+                rules.append([name, ''])
+            continue
+        if name and line.replace(' ', '').lower().startswith('remoteip:'):
+            rules[-1][1] = line.partition(':')[2].strip()
+    return [(name, remote) for name, remote in rules]
+
+
+def parse_remote_intervals(remote):
+    """Converts a netsh RemoteIP value ("1.2.3.4/32,5.6.7.0-5.6.7.255") to a set of intervals"""
+    intervals = set()
+    for item in remote.split(','):
+        parsed = parse_entry(item.strip())
+        if parsed is not None:
+            intervals.add((parsed[1], parsed[2]))
+    return intervals
+
+
+def get_expected_rules(block_status, get_interval, allowlist=None):
+    """Returns {rule name: (entry, direction, intervals)} for enforced blocked entries"""
+    expected = {}
+    for entry, status in block_status.items():
+        if status.get('dormant') or not (status['in'] or status['out']):
+            continue
+        interval = get_interval(entry)
+        if interval is None:
+            continue
+        intervals = set(allowlist.split(*interval)) if allowlist is not None else {tuple(interval)}
+        if not intervals:
+            continue  # Fully allowlisted entries have no rules
+        base_name = get_rule_base_name(entry)
+        for direction in ['in', 'out']:
+            if status[direction]:
+                expected[f"{base_name}_{direction.upper()}"] = (entry, direction, intervals)
+    return expected
+
+
+def record_repair(report, firewall_manager):
+    """Adds the rule changes that undo drift to the open batch of firewall_manager"""
+    for entry, direction in report.changed:
+        firewall_manager.delete_rule(entry, direction)
+    for entry, direction in report.missing + report.changed:
+        firewall_manager.create_rule(entry, direction)
+    for rule_name in report.extra:
+        firewall_manager.delete_specific_rule(rule_name)
+
+
+class DriftReport:
+    """Differences between expected and actual rules"""
+    
+    def __init__(self, missing, changed, extra):
+        self.missing = missing  # [(entry, direction)] blocked without a rule
+        self.changed = changed  # [(entry, direction)] rule with other addresses
+        self.extra = extra  # [rule name] tool rules without a blocked entry
+    
+    def has_drift(self):
+        """Checks if anything differs"""
+        return bool(self.missing or self.changed or self.extra)
+    
+    def get_entries(self):
+        """Returns entries whose rules are missing or changed"""
+        return {entry for entry, _ in self.missing + self.changed}
+    
+    def __str__(self):
+        return f"{len(self.missing)} missing, {len(self.changed)} changed, {len(self.extra)} unexpected rules"
+
+
+class DriftDetector:
+    """Enumerates tool rules cheaply and diffs them only when they change"""
+    
+    def __init__(self, prefix=RULE_PREFIX):
+        self.prefix = prefix
+        self.last_fingerprint = None
+        self.last_rules = []
+        self.last_duration = 0.0
+        self.generation = 0  # Bumped by reset(); listings taken under an older one are stale
+        self.pending_repair = None  # (recorded batch, generation) run by the next check()
+        self.lock = threading.Lock()  # Polls run on a worker thread, resets on the GUI thread
+    
+    def enumerate_rules(self):
+        """Lists tool rules with a single netsh call, returns [(name, remote_ip)]"""
+        kwargs = {'creationflags': subprocess.CREATE_NO_WINDOW} if sys.platform == 'win32' else {}
+        result = subprocess.run(['netsh', 'advfirewall', 'firewall', 'show', 'rule', 'name=all'],
+                                capture_output=True, timeout=60, **kwargs)
+        return parse_rule_listing(result.stdout.decode('utf-8', 'replace'), self.prefix)
+    
+    def get_fingerprint(self, rules):
+        """Returns (count, hash) over sorted rule names and addresses"""
+        digest = hashlib.blake2b(digest_size=16)
+        for name, remote in sorted(rules):
+            digest.update(f"{name}|{remote}\n".encode('utf-8'))
+        return len(rules), digest.hexdigest()
+    
+    def poll(self):
+        """Enumerates rules, returns (rules, generation) if the fingerprint changed since the last poll, else None"""
+        with self.lock:
+            generation = self.generation
+        started = time.perf_counter()
+        rules = self.enumerate_rules()
+        fingerprint = self.get_fingerprint(rules)
+        self.last_duration = time.perf_counter() - started
+        
+        with self.lock:
+            if fingerprint == self.last_fingerprint:
+                return None
+            # Status changed while listing: the fingerprint stays reset, so the next poll reports
+            if generation != self.generation:
+                return None
+            self.last_fingerprint = fingerprint
+            self.last_rules = rules
+        return rules, generation
+    
+    def queue_repair(self, batch, generation):
+        """Queues a recorded repair batch to run in place of the next poll"""
+        with self.lock:
+            self.pending_repair = (batch, generation)
+    
+    def check(self):
+        """Runs one netsh process: a queued repair, else a poll. Returns poll() output, None after a repair"""
+        with self.lock:
+            repair, self.pending_repair = self.pending_repair, None
+        if repair is None:
+            return self.poll()
+        
+        batch, generation = repair
+        started = time.perf_counter()
+        # A block or unblock since the diff makes the repair stale; its reset already forces a new diff
+        if self.is_current(generation):
+            batch.submit_batch()
+            self.set_last_fingerprint(None)  # The next poll diffs again to confirm the repair
+        self.last_duration = time.perf_counter() - started
+        return None
+    
+    def reset(self):
+        """Forces the next poll to report the rules (e.g. after saved status changed)"""
+        with self.lock:
+            self.generation += 1
+            self.last_fingerprint = None
+    
+    def is_current(self, generation):
+        """Checks if the saved status did not change since a poll of that generation started"""
+        with self.lock:
+            return generation == self.generation
+    
+    def get_last_fingerprint(self):
+        """Returns the fingerprint of the last reported rules"""
+        with self.lock:
+            return self.last_fingerprint
+    
+    def set_last_fingerprint(self, fingerprint):
+        """Restores (or clears, to re-check) the fingerprint after the rules were handled"""
+        with self.lock:
+            self.last_fingerprint = fingerprint
+    
+    def diff(self, rules, expected):
+        """Compares actual [(name, remote_ip)] with get_expected_rules() output"""
+        actual = {}
+        for name, remote in rules:
+            # Long allowlist-split rules are several rules with the same name
+            actual.setdefault(name, set()).update(parse_remote_intervals(remote))
+        
+        missing = []
+        changed = []
+        for name, (entry, direction, intervals) in expected.items():
+            if name not in actual:
+                missing.append((entry, direction))
+            elif actual[name] and not self._covers(actual[name], intervals):
+                changed.append((entry, direction))
+        extra = [name for name in actual if name not in expected]
+        return DriftReport(missing, changed, extra)
+    
+    def _covers(self, actual, expected):
+        """Checks if the rule addresses equal the expected ones (netsh may merge or split them)"""
+        if actual == expected:
+            return True
+        return self._merge(actual) == self._merge(expected)
+    
+    def _merge(self, intervals):
+        """Merges adjacent and overlapping intervals"""
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
@@ -0,0 +1,240 @@
+"""
+Automatic enforcement of the loaded blocklist from a live peer feed
+
+A feed delivers remote peer addresses (from a file being written, a local
+UDP socket or an in-process producer such as PeerDiscoveryEngine). Every
+sighting is matched against the loaded entries with an IntervalIndex and
+the configured block direction is applied to matches, with per-entry
+debouncing, a global rate limit and sighting-to-rule latency tracking.
+No Qt imports here.
+"""
+
+import os
+import time
+import queue
+import socket
+import threading
+from collections import deque
+
+from core import IntervalIndex, ip_to_int
+
+
+class QueuePeerFeed:
+    """In-process feed: producers call put() from any thread"""
+    
+    def __init__(self, max_pending=10000):
+        self.pending = queue.Queue(max_pending)
+    
+    def put(self, ip):
+        """Queues a sighted address (dotted text), dropped if the queue is full"""
+        try:
+            self.pending.put_nowait((ip, time.perf_counter()))
+        except queue.Full:
+            pass
+    
+    def run(self, callback, stop_event):
+        """Delivers queued sightings to callback(ip, sighted_at) until stopped"""
+        while not stop_event.is_set():
+            try:
+                ip, sighted_at = self.pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            callback(ip, sighted_at)
+
+
+class FilePeerFeed:
+    """Follows a text file (one address per line) as another program appends to it"""
+    
+    def __init__(self, path, poll_interval=0.2, from_start=False):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.from_start = from_start
+    
+    def run(self, callback, stop_event):
+        """Delivers new lines to callback(ip, sighted_at) until stopped"""
+        offset = None if not self.from_start else 0
+        pending = b''
+        while not stop_event.is_set():
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                stop_event.wait(self.poll_interval)
+                continue
+            
+            # Skip existing content unless asked for it; start over after truncation
+            if offset is None:
+                offset = size
+            elif size < offset:
+                offset = 0
+                pending = b''
+            
+            if size > offset:
+                with open(self.path, 'rb') as feed_file:
+                    feed_file.seek(offset)
+                    data = pending + feed_file.read(size - offset)
+                offset = size
+                lines = data.split(b'\n')
+                pending = lines.pop()  # Incomplete last line
+                sighted_at = time.perf_counter()
+                for line in lines:
+                    ip = line.strip().decode('ascii', 'replace')
+                    if ip:
+                        callback(ip, sighted_at)
+            else:
+                stop_event.wait(self.poll_interval)
+
+
+class SocketPeerFeed:
+    """Receives addresses as UDP datagrams on a loopback port (one or more per line)"""
+    
+    def __init__(self, port, host='127.0.0.1'):
+        self.host = host
+        self.port = port
+    
+    def run(self, callback, stop_event):
+        """Delivers received addresses to callback(ip, sighted_at) until stopped"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((self.host, self.port))
+        sock.settimeout(0.5)
+        try:
+            while not stop_event.is_set():
+                try:
+                    data = sock.recv(65536)
+                except socket.timeout:
+                    continue
+                sighted_at = time.perf_counter()
+                for line in data.split(b'\n'):
+                    ip = line.strip().decode('ascii', 'replace')
+                    if ip:
+                        callback(ip, sighted_at)
+        finally:
+            sock.close()
+
+
+def create_peer_feed(spec):
+    """Creates a feed from a settings value: 'peers', 'file:PATH' or 'socket:PORT'"""
+    kind, _, value = spec.partition(':')
+    if kind == 'file' and value:
+        return FilePeerFeed(value)
+    if kind == 'socket' and value.isdigit():
+        return SocketPeerFeed(int(value))
+    return QueuePeerFeed()
+
+
+def covers_direction(status, direction):
+    """Checks if a block status already includes direction ('both', 'in' or 'out')"""
+    if direction == 'both':
+        return status['in'] and status['out']
+    return status[direction]
+
+
+class EnforcementPolicy:
+    """What to apply to a match and how often"""
+    
+    def __init__(self, direction='both', debounce=30.0, max_actions=10, per_seconds=60.0):
+        self.direction = direction
+        self.debounce = debounce  # Seconds an entry is ignored after an action
+        self.max_actions = max_actions  # Rate limit: actions per window
+        self.per_seconds = per_seconds
+
+
+class PolicyEngine:
+    """Matches sighted peers to blocklist entries and applies the policy"""
+    
+    def __init__(self, policy, apply_callback, report_callback=None, latency_samples=1000):
+        self.policy = policy
+        self.apply_callback = apply_callback  # apply_callback(entry, direction) creates the rules, False if nothing changed
+        self.report_callback = report_callback  # report_callback(entry, direction, ip, latency_ms)
+        self.index = IntervalIndex()
+        self.blocked = set()  # Entries already blocked in the policy direction
+        self.last_action = {}  # entry -> perf_counter of last action
+        self.action_times = deque()  # Actions inside the rate limit window
+        self.latencies = deque(maxlen=latency_samples)
+        self.sightings = 0
+        self.matches = 0
+        self.rate_limited = 0
+        self.actions = 0
+        self.lock = threading.Lock()
+    
+    def set_entries(self, entry_intervals, blocked_entries=()):
+        """Rebuilds the index from {entry: (start, end)} and the already blocked entries"""
+        index = IntervalIndex.from_entries(entry_intervals)
+        with self.lock:
+            self.index = index
+            self.blocked = set(blocked_entries)
+    
+    def set_blocked(self, entry, blocked):
+        """Keeps the engine in sync with manual block/unblock actions"""
+        with self.lock:
+            if blocked:
+                self.blocked.add(entry)
+            else:
+                self.blocked.discard(entry)
+    
+    def on_sighting(self, ip, sighted_at=None):
+        """Handles one sighted address, returns the entry that was blocked or None"""
+        if sighted_at is None:
+            sighted_at = time.perf_counter()
+        self.sightings += 1
+        
+        ip_value = ip_to_int(ip)
+        if ip_value is None:
+            return None
+        
+        with self.lock:
+            entry = self.index.find_first(ip_value)
+            if entry is None or entry in self.blocked:
+                return None
+            self.matches += 1
+            
+            # Per-entry debounce: a cheater seen in many packets triggers one action
+            now = time.perf_counter()
+            last = self.last_action.get(entry)
+            if last is not None and now - last < self.policy.debounce:
+                return None
+            
+            # Global rate limit over a sliding window
+            while self.action_times and now - self.action_times[0] > self.policy.per_seconds:
+                self.action_times.popleft()
+            if len(self.action_times) >= self.policy.max_actions:
+                self.rate_limited += 1
+                return None
+            
+            self.action_times.append(now)
+            self.last_action[entry] = now
+        
+        try:
+            applied = self.apply_callback(entry, self.policy.direction)
+        except Exception as e:
+            print(f"Error enforcing {entry}: {e}")
+            return None
+        if applied is False:
+            # Already blocked in the meantime (e.g. by hand): nothing to time or report
+            with self.lock:
+                self.blocked.add(entry)
+            return None
+        
+        latency_ms = (time.perf_counter() - sighted_at) * 1000
+        with self.lock:
+            self.latencies.append(latency_ms)
+            self.blocked.add(entry)
+            self.actions += 1
+        if self.report_callback is not None:
+            self.report_callback(entry, self.policy.direction, ip, latency_ms)
+        return entry
+    
+    def get_stats(self):
+        """Returns counters and sighting-to-rule latency summary in milliseconds"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+        stats = {
+            'sightings': self.sightings,
+            'matches': self.matches,
+            'actions': self.actions,
+            'rate_limited': self.rate_limited,
+        }
+        if latencies:
+            stats['latency_mean_ms'] = sum(latencies) / len(latencies)
+            stats['latency_p95_ms'] = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+            stats['latency_max_ms'] = latencies[-1]
+        return stats
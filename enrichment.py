@@ -0,0 +1,95 @@
+"""
+Batched annotation of table entries (provider, country, source)
+
+Lookups against local datasets run in chunks off the GUI thread. Results
+are kept in a bounded LRU cache keyed by the entry's integer interval, so
+the same entry is never looked up twice while it stays cached. No Qt
+imports here.
+"""
+
+import threading
+from collections import OrderedDict
+
+# Source column values
+SOURCE_BLOCKLIST = 'Blocklist'
+SOURCE_SESSION_PEER = 'Session peer'
+SOURCE_PROVIDER_RANGE = 'Provider range'
+
+
+class AnnotationCache:
+    """Bounded LRU of (provider, country) keyed by (start, end) interval"""
+    
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, interval):
+        """Returns cached (provider, country) or None"""
+        with self.lock:
+            annotation = self.entries.get(interval)
+            if annotation is not None:
+                self.entries.move_to_end(interval)
+            return annotation
+    
+    def put(self, interval, annotation):
+        """Stores annotation, evicting the least recently used one when full"""
+        with self.lock:
+            self.entries[interval] = annotation
+            self.entries.move_to_end(interval)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def clear(self):
+        """Drops all cached annotations (e.g. after a new dataset import)"""
+        with self.lock:
+            self.entries.clear()
+    
+    def __len__(self):
+        return len(self.entries)
+
+
+class EntryAnnotator:
+    """Annotates table entries from the local prefix/ASN database"""
+    
+    def __init__(self, prefix_db, cache=None):
+        self.prefix_db = prefix_db
+        self.cache = cache if cache is not None else AnnotationCache()
+        self.lookups = 0  # Number of database lookups, cache hits excluded
+    
+    def get_source(self, start, end, manual):
+        """Returns where an entry comes from"""
+        if not manual:
+            return SOURCE_BLOCKLIST
+        return SOURCE_PROVIDER_RANGE if start != end else SOURCE_SESSION_PEER
+    
+    def get_cached(self, interval, manual):
+        """Returns (provider, country, source) from cache, None on miss"""
+        annotation = self.cache.get(interval)
+        if annotation is None:
+            return None
+        return annotation + (self.get_source(interval[0], interval[1], manual),)
+    
+    def lookup(self, start, end):
+        """Returns (provider, country) for an interval from the prefix database"""
+        self.lookups += 1
+        provider = self.prefix_db.lookup(start)
+        if provider is None:
+            return ('', '')
+        
+        name = f"AS{provider['asn']} {provider['name']}".strip() if provider['asn'] else provider['name']
+        # Ranges spanning several provider prefixes are labelled by their first one
+        if end > provider['end']:
+            name += ' (+more)'
+        return (name, provider['country'])
+    
+    def annotate_batch(self, items):
+        """Annotates [(entry, (start, end), manual)], returns {entry: (provider, country, source)}"""
+        results = {}
+        for entry, interval, manual in items:
+            annotation = self.cache.get(interval)
+            if annotation is None:
+                annotation = self.lookup(*interval)
+                self.cache.put(interval, annotation)
+            results[entry] = annotation + (self.get_source(interval[0], interval[1], manual),)
+        return results
@@ -0,0 +1,361 @@
+"""
+Firewall backend selection and the nftables backend for Linux gateways
+
+FirewallRuleManager (core) creates one netsh rule per entry and direction.
+NftablesBackend instead keeps two interval sets (block_in / block_out) in
+one table and turns every block or unblock into set element changes. All
+changes are applied as a single `nft -f` transaction; a batch of many
+entries is one transaction too. After a block, established flows of the
+entry can be ended through conntrack. No Qt imports here.
+"""
+
+import json
+import time
+import subprocess
+
+from core import FirewallBackend, FirewallRuleManager, IntervalIndex, int_to_ip, ip_to_int, parse_entry
+from flows import ConntrackFlows
+
+NFT_TABLE = 'cheatersblocker'
+NFT_SETS = {'in': 'block_in', 'out': 'block_out'}
+ELEMENTS_PER_LINE = 8
+ELEMENTS_PER_STATEMENT = 1000
+
+
+def merge_intervals(intervals):
+    """Merges overlapping and adjacent (start, end) intervals into sorted disjoint ones"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def parse_set_element(element):
+    """Converts an element of `nft -j` output (address, range or prefix) to (start, end)"""
+    if isinstance(element, dict) and 'elem' in element:
+        element = element['elem'].get('val')
+    if isinstance(element, str):
+        value = ip_to_int(element)
+        return None if value is None else (value, value)
+    if isinstance(element, dict) and 'range' in element:
+        start, end = (ip_to_int(value) for value in element['range'])
+        return None if start is None or end is None else (start, end)
+    if isinstance(element, dict) and 'prefix' in element:
+        parsed = parse_entry(f"{element['prefix']['addr']}/{element['prefix']['len']}")
+        return None if parsed is None else (parsed[1], parsed[2])
+    return None
+
+
+def has_counters(set_object):
+    """Checks if a set in `nft -j` output keeps per-element counters"""
+    if 'counter' in json.dumps(set_object.get('stmt', [])):
+        return True
+    return any(isinstance(element, dict) and 'counter' in element.get('elem', {})
+               for element in set_object.get('elem', []))
+
+
+def format_element(interval):
+    """Formats an interval as an nft set element ("1.2.3.4" or "1.2.3.0-1.2.3.255")"""
+    start, end = interval
+    return int_to_ip(start) if start == end else f"{int_to_ip(start)}-{int_to_ip(end)}"
+
+
+class NftablesBackend(FirewallBackend):
+    """Blocks entries as elements of nftables interval sets, one set per direction"""
+    
+    name = 'nftables'
+    
+    def __init__(self, nft_path='nft', table=NFT_TABLE, family='inet', conntrack_path='conntrack', counters=False):
+        super().__init__()
+        self.nft_path = nft_path
+        self.table = table
+        self.family = family
+        self.conntrack = ConntrackFlows(conntrack_path)
+        self.counters = counters  # Per-element packet counters, so the first drop of a block can be timed
+        self.entries = {'in': {}, 'out': {}}  # direction -> {entry: [(start, end)] without allowlist holes}
+        self.applied = None  # direction -> merged intervals in the kernel set, None until the table is installed
+        self.deferred = False  # True between begin_batch() and submit_batch()
+    
+    def load_status(self, block_status, get_interval):
+        """Takes the enforced entries from saved status, so the first apply installs all of them"""
+        self.entries = {'in': {}, 'out': {}}
+        for entry, status in block_status.items():
+            if status.get('dormant'):
+                continue
+            interval = get_interval(entry)
+            if interval is None:
+                continue
+            intervals = self._split(*interval)
+            for direction in ['in', 'out']:
+                if status[direction]:
+                    self.entries[direction][entry] = intervals
+    
+    def _split(self, start, end):
+        """Returns the blocked intervals of an entry with allowlisted holes cut out"""
+        if self.allowlist is not None:
+            return list(self.allowlist.split(start, end))
+        return [(start, end)]
+    
+    def _get_directions(self, direction):
+        """Expands 'both' into ['in', 'out']"""
+        return ['in', 'out'] if direction == 'both' else [direction]
+    
+    def create_rule(self, ip_range, direction='both'):
+        """Adds the entry's intervals to the direction sets"""
+        parsed = parse_entry(ip_range.strip())
+        if parsed is None:
+            return
+        intervals = self._split(parsed[1], parsed[2])
+        for set_direction in self._get_directions(direction):
+            self.entries[set_direction][ip_range] = intervals
+        self._flush()
+    
+    def delete_rule(self, ip_range, direction='both'):
+        """Removes the entry's intervals from the direction sets"""
+        for set_direction in self._get_directions(direction):
+            self.entries[set_direction].pop(ip_range, None)
+        self._flush()
+    
+    def update_rule(self, ip_range, status):
+        """Re-splits a blocked entry around the allowlist in one transaction"""
+        parsed = parse_entry(ip_range.strip())
+        if parsed is None or status.get('dormant'):
+            return
+        intervals = self._split(parsed[1], parsed[2])
+        for direction in ['in', 'out']:
+            if status[direction]:
+                self.entries[direction][ip_range] = intervals
+        self._flush()
+    
+    def begin_batch(self):
+        """Defers set changes until submit_batch()"""
+        self.deferred = True
+    
+    def submit_batch(self):
+        """Applies all deferred changes as one nft transaction, returns the number of statements"""
+        self.deferred = False
+        return self._flush()
+    
+    def create_recorder(self):
+        """Returns a backend with the same sets that records nft statements"""
+        recorder = NftablesBackend(self.nft_path, self.table, self.family, self.conntrack.conntrack_path, self.counters)
+        recorder.allowlist = self.allowlist
+        recorder.set_scope(self.program, self.protocol)
+        recorder.entries = {direction: dict(entries) for direction, entries in self.entries.items()}
+        recorder.applied = None if self.applied is None else dict(self.applied)
+        recorder.recording = []
+        return recorder
+    
+    def format_script(self, commands, title):
+        """Returns recorded statements as an nft script"""
+        lines = ['#!/usr/sbin/nft -f', f'# {title}']
+        for _, _, statements in commands:
+            lines += statements
+        return '\n'.join(lines) + '\n'
+    
+    def get_desired(self):
+        """Returns direction -> merged intervals of all blocked entries"""
+        return {direction: merge_intervals(interval for intervals in entries.values() for interval in intervals)
+                for direction, entries in self.entries.items()}
+    
+    def compile_ruleset(self, desired=None):
+        """Returns statements that atomically replace the whole table with the given sets"""
+        if desired is None:
+            desired = self.get_desired()
+        table = f"{self.family} {self.table}"
+        # Declaring the table first lets "delete table" succeed on the first run
+        lines = [f"table {table}", f"delete table {table}", f"table {table} {{"]
+        for direction, set_name in NFT_SETS.items():
+            lines += [f"\tset {set_name} {{", "\t\ttype ipv4_addr", "\t\tflags interval"]
+            if self.counters:
+                lines.append("\t\tcounter")
+            elements = [format_element(interval) for interval in desired[direction]]
+            if elements:
+                lines.append("\t\telements = {")
+                for index in range(0, len(elements), ELEMENTS_PER_LINE):
+                    separator = ',' if index + ELEMENTS_PER_LINE < len(elements) else ''
+                    lines.append("\t\t\t" + ', '.join(elements[index:index + ELEMENTS_PER_LINE]) + separator)
+                lines.append("\t\t}")
+            lines.append("\t}")
+        # Forward covers consoles/PCs behind the gateway, input/output the gateway itself.
+        # A UDP scope checks the protocol first, so other traffic skips the set lookups.
+        match = "meta l4proto udp " if self.protocol == 'udp' else ""
+        lines += [
+            "\tchain input {",
+            "\t\ttype filter hook input priority 0; policy accept;",
+            f"\t\t{match}ip saddr @{NFT_SETS['in']} drop",
+            "\t}",
+            "\tchain forward {",
+            "\t\ttype filter hook forward priority 0; policy accept;",
+            f"\t\t{match}ip saddr @{NFT_SETS['in']} drop",
+            f"\t\t{match}ip daddr @{NFT_SETS['out']} drop",
+            "\t}",
+            "\tchain output {",
+            "\t\ttype filter hook output priority 0; policy accept;",
+            f"\t\t{match}ip daddr @{NFT_SETS['out']} drop",
+            "\t}",
+            "}",
+        ]
+        return lines
+    
+    def rewrite_rules(self, block_status):
+        """Re-installs the whole table so its chains use the current scope (one transaction)"""
+        desired = self.get_desired()
+        statements = self.compile_ruleset(desired)
+        if self.recording is not None:
+            self.recording.append(('add', self.table, statements))
+            self.applied = desired
+            return len(statements)
+        self.applied = desired if self.run_nft(statements) else None
+        return len(statements)
+    
+    def compile_update(self, desired):
+        """Returns (statements, action) that turn the applied sets into desired ones"""
+        if self.applied is None:
+            return self.compile_ruleset(desired), 'add'
+        
+        deletes = []
+        adds = []
+        for direction, set_name in NFT_SETS.items():
+            old = set(self.applied[direction])
+            new = set(desired[direction])
+            target = f"{self.family} {self.table} {set_name}"
+            # Deletes go first so a grown interval never collides with the one it replaces
+            for statements, intervals, verb in ((deletes, sorted(old - new), 'delete'),
+                                                (adds, sorted(new - old), 'add')):
+                for index in range(0, len(intervals), ELEMENTS_PER_STATEMENT):
+                    chunk = ', '.join(format_element(interval)
+                                      for interval in intervals[index:index + ELEMENTS_PER_STATEMENT])
+                    statements.append(f"{verb} element {target} {{ {chunk} }}")
+        return deletes + adds, 'add' if adds else 'delete'
+    
+    def read_applied(self):
+        """Reads the current set contents from the kernel, None if the table is missing or unreadable"""
+        try:
+            result = subprocess.run([self.nft_path, '-j', 'list', 'table', self.family, self.table],
+                                    capture_output=True, text=True, timeout=30)
+            if result.returncode != 0:
+                return None
+            objects = json.loads(result.stdout).get('nftables', [])
+        except Exception as e:
+            print(f"Error reading nftables sets: {e}")
+            return None
+        
+        applied = {}
+        chains = set()
+        for item in objects:
+            if 'chain' in item:
+                chains.add(item['chain'].get('name'))
+            if 'set' not in item:
+                continue
+            for direction, set_name in NFT_SETS.items():
+                if item['set'].get('name') == set_name:
+                    if item['set'].get('elem') and has_counters(item['set']) != self.counters:
+                        return None  # Counters were switched on or off: re-install the table
+                    intervals = [parse_set_element(element) for element in item['set'].get('elem', [])]
+                    if None in intervals:
+                        return None  # Unknown element format: re-install instead of guessing
+                    applied[direction] = sorted(intervals)
+        # Only a complete table of ours can be updated element by element
+        if set(applied) != set(NFT_SETS) or not {'input', 'forward', 'output'} <= chains:
+            return None
+        return applied
+    
+    def _flush(self):
+        """Applies the difference between the entry sets and the kernel, returns the number of statements"""
+        if self.deferred:
+            return 0
+        # A new process continues from the kernel state instead of re-installing the table
+        if self.applied is None and self.recording is None:
+            self.applied = self.read_applied()
+        desired = self.get_desired()
+        statements, action = self.compile_update(desired)
+        if not statements:
+            return 0
+        
+        if self.recording is not None:
+            self.recording.append((action, self.table, statements))
+            self.applied = desired
+            return len(statements)
+        
+        started = time.perf_counter()
+        if self.run_nft(statements):
+            self.applied = desired
+        else:
+            self.applied = None  # Re-install the whole table on the next change
+        self.call_times[action].append(time.perf_counter() - started)
+        return len(statements)
+    
+    def terminate_flows(self, entries):
+        """Deletes conntrack entries of just blocked entries (matching the rule protocol)"""
+        intervals = []
+        for entry in entries:
+            for direction in ['in', 'out']:
+                intervals.extend(self.entries[direction].get(entry, []))
+        return self.conntrack.terminate(merge_intervals(intervals), self.protocol)
+    
+    def get_drop_counts(self, entries):
+        """Returns {entry: packets dropped by the set elements covering it}, None without counters.
+        
+        Adjacent entries share a merged element, so they share its count."""
+        if not self.counters:
+            return None
+        try:
+            result = subprocess.run([self.nft_path, '-j', 'list', 'table', self.family, self.table],
+                                    capture_output=True, text=True, timeout=30)
+            objects = json.loads(result.stdout).get('nftables', []) if result.returncode == 0 else []
+        except Exception as e:
+            print(f"Error reading nftables counters: {e}")
+            return None
+        
+        counted = {'in': [], 'out': []}  # direction -> [(start, end, packets)]
+        for item in objects:
+            if 'set' not in item:
+                continue
+            for direction, set_name in NFT_SETS.items():
+                if item['set'].get('name') != set_name:
+                    continue
+                for element in item['set'].get('elem', []):
+                    interval = parse_set_element(element)
+                    if interval is not None and isinstance(element, dict):
+                        packets = (element['elem'].get('counter') or {}).get('packets', 0)
+                        counted[direction].append((interval[0], interval[1], packets))
+        
+        indexes = {direction: IntervalIndex(elements) for direction, elements in counted.items()}
+        counts = {}
+        for entry in entries:
+            counts[entry] = sum(sum(indexes[direction].find_overlapping(start, end))
+                                for direction in ['in', 'out'] for start, end in self.entries[direction].get(entry, []))
+        return counts
+    
+    def run_nft(self, statements, check_only=False):
+        """Runs statements as one nft transaction (or only checks them with -c), returns True on success"""
+        command = [self.nft_path, '-c', '-f', '-'] if check_only else [self.nft_path, '-f', '-']
+        try:
+            subprocess.run(command, input='\n'.join(statements) + '\n', text=True,
+                           check=True, capture_output=True, timeout=30)
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"Error applying nftables changes: {(e.stderr or '').strip() or e}")
+        except Exception as e:
+            print(f"Error running {self.nft_path}: {e}")
+        return False
+    
+    def check_ruleset(self):
+        """Validates the compiled ruleset with `nft -c` without changing anything"""
+        return self.run_nft(self.compile_ruleset(), check_only=True)
+
+
+def create_firewall_backend(settings_manager):
+    """Returns the firewall backend chosen in settings"""
+    if settings_manager.get_firewall_backend() == 'nftables':
+        backend = NftablesBackend(settings_manager.get_nft_path(), conntrack_path=settings_manager.get_conntrack_path(),
+                                  counters=settings_manager.get_nft_counters())
+    else:
+        backend = FirewallRuleManager()
+    backend.set_scope(*settings_manager.get_rule_scope())
+    return backend
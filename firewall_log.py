@@ -0,0 +1,209 @@
+"""
+Incremental tail parser for the Windows Firewall log (pfirewall.log)
+
+Only bytes appended since the last poll are read, in large chunks. Dropped
+packets are matched to blocklist entries through an IntervalIndex and
+counted per entry. The file offset and counters are kept in an INI file
+so they survive restarts. No Qt imports here.
+"""
+
+import os
+import time
+import configparser
+import threading
+
+from core import DEFAULT_FIREWALL_LOG, IntervalIndex, ip_to_int
+
+# Field order used by Windows when the log has no #Fields header yet
+DEFAULT_FIELDS = ['date', 'time', 'action', 'protocol', 'src-ip', 'dst-ip', 'src-port', 'dst-port',
+                  'size', 'tcpflags', 'tcpsyn', 'tcpack', 'tcpwin', 'icmptype', 'icmpcode', 'info', 'path']
+
+
+def parse_log_time(text):
+    """Converts a "YYYY-MM-DD HH:MM:SS" log time (local time) to a timestamp, None if invalid"""
+    try:
+        return time.mktime(time.strptime(text, '%Y-%m-%d %H:%M:%S'))
+    except (ValueError, OverflowError):
+        return None
+
+
+class FirewallLogTailer:
+    """Counts dropped packets per blocklist entry from new firewall log lines"""
+    
+    def __init__(self, log_path=DEFAULT_FIREWALL_LOG, state_file="firewall_log.ini"):
+        self.log_path = log_path
+        self.state_file = state_file
+        self.chunk_size = 1 << 20
+        self.offset = 0
+        self.file_id = ''
+        self.fields = list(DEFAULT_FIELDS)
+        self.hits = {}  # entry -> [count, last seen "YYYY-MM-DD HH:MM:SS"]
+        self.index = IntervalIndex()
+        self.lock = threading.Lock()
+        self.load_state()
+    
+    def set_entries(self, entry_intervals):
+        """Rebuilds the interval index from {entry: (start, end)}"""
+        index = IntervalIndex.from_entries(entry_intervals)
+        with self.lock:
+            self.index = index
+    
+    def load_state(self):
+        """Loads file offset and per-entry counters"""
+        if not os.path.exists(self.state_file):
+            return
+        config = configparser.ConfigParser()
+        try:
+            config.read(self.state_file, encoding='utf-8')
+            self.offset = config.getint('State', 'offset', fallback=0)
+            self.file_id = config.get('State', 'file_id', fallback='')
+            fields = config.get('State', 'fields', fallback='')
+            if fields:
+                self.fields = fields.split()
+            if config.has_section('Hits'):
+                for entry, value in config.items('Hits'):
+                    count, _, last_seen = value.partition(',')
+                    self.hits[entry] = [int(count), last_seen]
+        except Exception as e:
+            print(f"Error loading firewall log state: {e}")
+            self.offset = 0
+            self.hits = {}
+    
+    def save_state(self):
+        """Saves file offset and per-entry counters"""
+        config = configparser.ConfigParser()
+        config['State'] = {
+            'offset': str(self.offset),
+            'file_id': self.file_id,
+            'fields': ' '.join(self.fields),
+        }
+        config['Hits'] = {entry: f"{count},{last_seen}" for entry, (count, last_seen) in self.hits.items()}
+        try:
+            with open(self.state_file, 'w', encoding='utf-8') as state:
+                config.write(state)
+        except Exception as e:
+            print(f"Error saving firewall log state: {e}")
+    
+    def skip_to_end(self):
+        """Continues from the current end of the log, so only lines written from now on are counted"""
+        try:
+            stat_result = os.stat(self.log_path)
+        except OSError:
+            return
+        self.file_id = self._get_file_id(stat_result)
+        self.offset = stat_result.st_size
+    
+    def _get_file_id(self, stat_result):
+        """Identifies the log file so rotation can be detected"""
+        # Creation time where there is one: on Linux ctime changes with every append
+        created = getattr(stat_result, 'st_birthtime', stat_result.st_ctime if os.name == 'nt' else 0)
+        return f"{stat_result.st_ino}:{int(created)}"
+    
+    def poll(self):
+        """Parses bytes appended since last poll, returns {entry: (count, last_seen)} that changed"""
+        try:
+            stat_result = os.stat(self.log_path)
+        except OSError:
+            return {}
+        
+        # Start over when the log was rotated or truncated
+        file_id = self._get_file_id(stat_result)
+        if file_id != self.file_id or stat_result.st_size < self.offset:
+            self.file_id = file_id
+            self.offset = 0
+        
+        # Nothing to match against yet: leave new lines for later
+        if stat_result.st_size == self.offset or not len(self.index):
+            return {}
+        
+        changed = set()
+        with open(self.log_path, 'rb') as log_file:
+            log_file.seek(self.offset)
+            pending = b''  # Incomplete line, always starts at self.offset
+            while True:
+                chunk = log_file.read(self.chunk_size)
+                if not chunk:
+                    break
+                data = pending + chunk if pending else chunk
+                
+                # Only complete lines are consumed; the tail waits for the next read
+                last_newline = data.rfind(b'\n')
+                if last_newline < 0:
+                    pending = data
+                    continue
+                self._parse_lines(data[:last_newline], changed)
+                self.offset += last_newline + 1
+                pending = data[last_newline + 1:]
+        
+        self.save_state()
+        return {entry: tuple(self.hits[entry]) for entry in changed}
+    
+    def _resolve_fields(self):
+        """Returns column positions used for matching, None if the header is unusable"""
+        fields = self.fields
+        try:
+            return (fields.index('action'), fields.index('src-ip'), fields.index('dst-ip'),
+                    fields.index('date'), fields.index('time'),
+                    fields.index('path') if 'path' in fields else None)
+        except ValueError:
+            return None
+    
+    def _parse_lines(self, data, changed):
+        """Counts DROP lines in a block of complete lines"""
+        with self.lock:
+            index = self.index
+        columns = self._resolve_fields()
+        
+        hits = self.hits
+        for line in data.split(b'\n'):
+            if not line:
+                continue
+            if line[0] == 35:  # '#'
+                if line.startswith(b'#Fields:'):
+                    self.fields = line[8:].decode('ascii', 'replace').split()
+                    columns = self._resolve_fields()
+                continue
+            if columns is None or not len(index):
+                continue
+            
+            action_index, src_index, dst_index, date_index, time_index, path_index = columns
+            parts = line.split()
+            if len(parts) <= max(action_index, src_index, dst_index) or parts[action_index] != b'DROP':
+                continue
+            
+            # RECEIVE drops come from the remote source, SEND drops go to the remote destination
+            path = parts[path_index] if path_index is not None and len(parts) > path_index else b''
+            if path == b'RECEIVE':
+                candidates = (parts[src_index],)
+            elif path == b'SEND':
+                candidates = (parts[dst_index],)
+            else:
+                candidates = (parts[src_index], parts[dst_index])
+            
+            for candidate in candidates:
+                ip = ip_to_int(candidate.decode('ascii', 'replace'))
+                if ip is None:
+                    continue
+                entries = index.find(ip)
+                if not entries:
+                    continue
+                last_seen = f"{parts[date_index].decode('ascii', 'replace')} {parts[time_index].decode('ascii', 'replace')}"
+                for entry in entries:
+                    hit = hits.get(entry)
+                    if hit is None:
+                        hits[entry] = [1, last_seen]
+                    else:
+                        hit[0] += 1
+                        hit[1] = last_seen
+                    changed.add(entry)
+                break
+    
+    def get_hits(self, entry):
+        """Returns (count, last_seen) for entry"""
+        hit = self.hits.get(entry)
+        return (hit[0], hit[1]) if hit else (0, '')
+    
+    def reset(self):
+        """Clears all counters"""
+        self.hits = {}
+        self.save_state()
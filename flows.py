@@ -0,0 +1,172 @@
+"""
+Ending established flows of blocked entries, and timing the first drop
+
+A new block only affects traffic classified after the rule lands: a game
+session that is already tracked (a conntrack entry on a Linux gateway, an
+established TCP connection on Windows) can keep going. ConntrackFlows ends
+such flows with one `conntrack -L` listing and one `conntrack -D` per peer
+address found in it, so the cost does not grow with the number of blocked
+entries. DropTimer measures the time from a block to the first packet the
+firewall dropped for it. No Qt imports here.
+"""
+
+import re
+import time
+import subprocess
+from collections import deque
+
+from core import IntervalIndex, int_to_ip, ip_to_int
+
+CONNTRACK_DELETED = re.compile(r'(\d+) flow entries have been deleted')
+
+
+def parse_conntrack_line(line):
+    """Returns (protocol, source, destination) of a flow's original direction in `conntrack -L` output, None for other lines"""
+    parts = line.split()
+    if len(parts) < 3:
+        return None
+    source = destination = None
+    for part in parts[1:]:
+        # The first src=/dst= pair is the original direction, the second one the reply
+        if source is None and part.startswith('src='):
+            source = ip_to_int(part[4:])
+        elif destination is None and part.startswith('dst='):
+            destination = ip_to_int(part[4:])
+        if source is not None and destination is not None:
+            return parts[0], source, destination
+    return None
+
+
+class ConntrackFlows:
+    """Deletes conntrack entries of blocked addresses (Linux, conntrack-tools)"""
+    
+    def __init__(self, conntrack_path='conntrack', timeout=10):
+        self.conntrack_path = conntrack_path
+        self.timeout = timeout
+    
+    def _get_filter(self, protocol):
+        """Returns conntrack options that limit a command to IPv4 and the rule protocol"""
+        return ['-f', 'ipv4'] + (['-p', protocol] if protocol != 'any' else [])
+    
+    def list_flows(self, protocol='any'):
+        """Returns (protocol, source, destination) of all tracked flows"""
+        try:
+            result = subprocess.run([self.conntrack_path, '-L'] + self._get_filter(protocol),
+                                    capture_output=True, text=True, timeout=self.timeout)
+        except Exception as e:
+            print(f"Error running {self.conntrack_path}: {e}")
+            return []
+        if result.returncode != 0:
+            print(f"Error listing conntrack entries: {(result.stderr or '').strip()}")
+            return []
+        return [flow for flow in map(parse_conntrack_line, result.stdout.splitlines()) if flow is not None]
+    
+    def find_peers(self, flows, intervals):
+        """Returns sorted (option, address) pairs whose deletion ends the flows touching the intervals"""
+        index = IntervalIndex((start, end, True) for start, end in intervals)
+        peers = set()
+        for _, source, destination in flows:
+            # Either side can be the blocked one: a cheater connecting in, or a console behind NAT connecting out
+            if index.find_first(source) is not None:
+                peers.add(('-s', source))
+            if index.find_first(destination) is not None:
+                peers.add(('-d', destination))
+        return sorted(peers)
+    
+    def terminate(self, intervals, protocol='any'):
+        """Deletes flows from or to the (start, end) intervals, returns the number of deleted flows"""
+        if not intervals:
+            return 0
+        deleted = 0
+        for option, address in self.find_peers(self.list_flows(protocol), intervals):
+            try:
+                command = [self.conntrack_path, '-D', option, int_to_ip(address)] + self._get_filter(protocol)
+                result = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+            except Exception as e:
+                print(f"Error running {self.conntrack_path}: {e}")
+                continue
+            # conntrack exits with 1 if nothing matched anymore (the flow ended in the meantime)
+            match = CONNTRACK_DELETED.search(result.stderr or '')
+            if match:
+                deleted += int(match.group(1))
+            elif result.returncode != 0:
+                print(f"Error deleting conntrack entries of {int_to_ip(address)}: {(result.stderr or '').strip()}")
+        return deleted
+
+
+class DropTimer:
+    """Measures the time from a block to the first packet the firewall dropped for it"""
+    
+    def __init__(self, timeout=300.0, max_samples=200):
+        self.timeout = timeout  # Seconds after which a block without drops is no longer waited for
+        self.pending = {}  # entry -> time.time() of the block
+        self.latencies = deque(maxlen=max_samples)
+        self.missed = 0
+    
+    def start(self, entries, blocked_at=None):
+        """Starts timing entries that were just blocked"""
+        self.expire()
+        blocked_at = time.time() if blocked_at is None else blocked_at
+        for entry in entries:
+            self.pending[entry] = blocked_at
+    
+    def observe(self, entry, dropped_at=None, resolution=0.0):
+        """Records a drop, returns seconds since the block if it is the first one after it, else None.
+        
+        resolution is the granularity of the drop times (the firewall log has whole seconds)."""
+        blocked_at = self.pending.get(entry)
+        if blocked_at is None:
+            return None
+        dropped_at = time.time() if dropped_at is None else dropped_at
+        if dropped_at + resolution < blocked_at:
+            return None  # Dropped by an earlier block
+        del self.pending[entry]
+        latency = max(dropped_at - blocked_at, 0.0)
+        self.latencies.append(latency)
+        return latency
+    
+    def observe_counts(self, counts, now=None):
+        """Records drops from per-entry packet counters that start at zero with the block, returns {entry: latency}"""
+        now = time.time() if now is None else now
+        measured = {}
+        for entry, packets in counts.items():
+            if packets:
+                latency = self.observe(entry, now)
+                if latency is not None:
+                    measured[entry] = latency
+        return measured
+    
+    def expire(self, now=None):
+        """Stops waiting for blocks older than the timeout, returns their entries"""
+        now = time.time() if now is None else now
+        expired = [entry for entry, blocked_at in self.pending.items() if now - blocked_at > self.timeout]
+        for entry in expired:
+            del self.pending[entry]
+        self.missed += len(expired)
+        return expired
+    
+    def wait(self, entries, poll, timeout, poll_interval=0.05):
+        """Calls poll() until every entry saw its first drop or timeout seconds passed.
+        
+        poll() feeds observations into this timer and returns the {entry: latency} it
+        measured. Returns {entry: seconds, None if no drop was seen}."""
+        results = {entry: None for entry in entries}
+        deadline = time.monotonic() + timeout
+        while True:
+            for entry, latency in poll().items():
+                if entry in results:
+                    results[entry] = latency
+            if all(entry not in self.pending for entry in entries) or time.monotonic() >= deadline:
+                break
+            time.sleep(poll_interval)
+        return results
+    
+    def get_stats(self):
+        """Returns {'measured', 'pending', 'missed'} and mean/median/max seconds of measured blocks"""
+        stats = {'measured': len(self.latencies), 'pending': len(self.pending), 'missed': self.missed}
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            stats['mean'] = sum(ordered) / len(ordered)
+            stats['median'] = ordered[len(ordered) // 2]
+            stats['max'] = ordered[-1]
+        return stats
@@ -0,0 +1,214 @@
+"""
+Bounded block history with incrementally maintained per-entry statistics
+
+Every block/unblock of a direction is one fixed-size record (time, entry
+id, duration, direction, action) in a ring buffer file; once it is full the
+oldest record is overwritten. Entry texts get ids through an append-only
+names file. Statistics (counts, total blocked time, last use) are rebuilt
+with one pass over the ring at startup and then updated per record, so
+queries never scan the history. No Qt imports here.
+"""
+
+import os
+import time
+import struct
+
+HISTORY_MAGIC = b'CBHS'
+HISTORY_VERSION = 1
+HEADER = struct.Struct('<4sHHIQ')  # magic, version, record size, capacity, records ever written
+RECORD = struct.Struct('<IIIBB')  # time, entry id, duration (unblocks), direction, action
+DEFAULT_HISTORY_CAPACITY = 100000
+DIRECTIONS = ['in', 'out']
+ACTIONS = ['unblock', 'block']
+
+
+def format_duration(seconds):
+    """Formats seconds as "3d 04:05:06" or "04:05:06\""""
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    text = f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{days}d {text}" if days else text
+
+
+class BlockHistory:
+    """Ring buffer of block/unblock events with per-entry statistics"""
+    
+    def __init__(self, path="block_history.bin", capacity=DEFAULT_HISTORY_CAPACITY):
+        self.path = path
+        self.names_path = os.path.splitext(path)[0] + '.names'
+        self.capacity = max(int(capacity), 1)
+        self.ring = bytearray()  # Records in slot order, at most capacity of them
+        self.total = 0  # Records ever written; the next slot is total % capacity
+        self.names = []  # id -> entry
+        self.ids = {}  # entry -> id
+        self.saved_names = 0
+        self.dirty_slots = set()
+        self.rewrite = False  # Whole file is written on the next flush
+        self.stats = {}  # entry -> {'blocks', 'unblocks', 'blocked_seconds', 'last_blocked', 'last_unblocked'}
+        self.open_since = {}  # (entry, direction) -> time of the block still in effect
+        self.load()
+    
+    def load(self):
+        """Reads the ring and names, then rebuilds statistics in one pass"""
+        records = []
+        try:
+            if os.path.exists(self.names_path):
+                with open(self.names_path, 'r', encoding='utf-8') as names_file:
+                    self.names = [line.rstrip('\n') for line in names_file]
+            self.ids = {name: entry_id for entry_id, name in enumerate(self.names)}
+            self.saved_names = len(self.names)
+            
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as history_file:
+                    data = history_file.read()
+                magic, version, record_size, capacity, total = HEADER.unpack_from(data)
+                if magic != HISTORY_MAGIC or version != HISTORY_VERSION or record_size != RECORD.size:
+                    raise ValueError("unknown history format")
+                ring = data[HEADER.size:HEADER.size + min(total, capacity) * RECORD.size]
+                count = len(ring) // RECORD.size
+                # Oldest record first: after wrapping it sits at the next write slot
+                first = total % capacity if total > capacity else 0
+                records = [RECORD.unpack_from(ring, ((first + index) % count) * RECORD.size)
+                           for index in range(count)]
+                if capacity == self.capacity and count == min(total, capacity):
+                    self.ring = bytearray(ring[:count * RECORD.size])
+                    self.total = total
+                else:
+                    # Capacity changed (or the file was cut short): keep the newest records in order
+                    records = records[-self.capacity:]
+                    self.ring = bytearray(b''.join(RECORD.pack(*record) for record in records))
+                    self.total = len(records)
+                    self.rewrite = True
+        except Exception as e:
+            print(f"Error loading block history: {e}")
+            records = []
+            self.ring = bytearray()
+            self.total = 0
+            self.rewrite = True
+        
+        for record in records:
+            self._apply(record)
+    
+    def record(self, entry, direction, action, timestamp=None):
+        """Adds one event; it reaches the disk with the next flush()"""
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        entry_id = self.ids.get(entry)
+        if entry_id is None:
+            entry_id = self.ids[entry] = len(self.names)
+            self.names.append(entry)
+        
+        duration = 0
+        if action == 'unblock':
+            duration = max(timestamp - self.open_since.get((entry, direction), timestamp), 0)
+        record = (timestamp, entry_id, duration, DIRECTIONS.index(direction), ACTIONS.index(action))
+        
+        slot = self.total % self.capacity
+        offset = slot * RECORD.size
+        if offset < len(self.ring):
+            self._evict(RECORD.unpack_from(self.ring, offset))
+            self.ring[offset:offset + RECORD.size] = RECORD.pack(*record)
+        else:
+            self.ring += RECORD.pack(*record)
+        self.total += 1
+        self.dirty_slots.add(slot)
+        self._apply(record)
+    
+    def _apply(self, record):
+        """Adds a record to the statistics"""
+        timestamp, entry_id, duration, direction, action = record
+        entry = self.names[entry_id] if entry_id < len(self.names) else f"#{entry_id}"
+        stats = self.stats.setdefault(entry, {'blocks': 0, 'unblocks': 0, 'blocked_seconds': 0,
+                                              'last_blocked': 0, 'last_unblocked': 0})
+        key = (entry, DIRECTIONS[direction])
+        if ACTIONS[action] == 'block':
+            stats['blocks'] += 1
+            stats['last_blocked'] = max(stats['last_blocked'], timestamp)
+            self.open_since.setdefault(key, timestamp)
+        else:
+            stats['unblocks'] += 1
+            stats['blocked_seconds'] += duration
+            stats['last_unblocked'] = max(stats['last_unblocked'], timestamp)
+            self.open_since.pop(key, None)
+    
+    def _evict(self, record):
+        """Removes an overwritten record's counts; last-used times are kept"""
+        _, entry_id, duration, _, action = record
+        stats = self.stats.get(self.names[entry_id] if entry_id < len(self.names) else f"#{entry_id}")
+        if stats is None:
+            return
+        if ACTIONS[action] == 'block':
+            stats['blocks'] = max(stats['blocks'] - 1, 0)
+        else:
+            stats['unblocks'] = max(stats['unblocks'] - 1, 0)
+            stats['blocked_seconds'] = max(stats['blocked_seconds'] - duration, 0)
+    
+    def flush(self):
+        """Writes new names and changed ring slots"""
+        if not self.dirty_slots and not self.rewrite and self.saved_names == len(self.names):
+            return
+        try:
+            # Names first, so a record on disk never refers to an unknown id
+            if self.saved_names < len(self.names):
+                with open(self.names_path, 'a', encoding='utf-8') as names_file:
+                    names_file.write(''.join(f"{name}\n" for name in self.names[self.saved_names:]))
+                self.saved_names = len(self.names)
+            
+            header = HEADER.pack(HISTORY_MAGIC, HISTORY_VERSION, RECORD.size, self.capacity, self.total)
+            if self.rewrite or not os.path.exists(self.path):
+                with open(self.path, 'wb') as history_file:
+                    history_file.write(header + self.ring)
+                self.rewrite = False
+                self.dirty_slots = set()
+                return
+            
+            # Only the header and the slots written since the last flush
+            with open(self.path, 'r+b') as history_file:
+                history_file.write(header)
+                for slot in sorted(self.dirty_slots):
+                    offset = slot * RECORD.size
+                    history_file.seek(HEADER.size + offset)
+                    history_file.write(self.ring[offset:offset + RECORD.size])
+            self.dirty_slots = set()
+        except Exception as e:
+            print(f"Error saving block history: {e}")
+    
+    def get_stats(self, entry, now=None):
+        """Returns statistics of one entry (blocked time includes a block still in effect), None if unknown"""
+        stats = self.stats.get(entry)
+        if stats is None:
+            return None
+        stats = dict(stats)
+        now = int(time.time() if now is None else now)
+        for direction in DIRECTIONS:
+            since = self.open_since.get((entry, direction))
+            if since is not None:
+                stats['blocked_seconds'] += max(now - since, 0)
+        stats['blocked_now'] = any((entry, direction) in self.open_since for direction in DIRECTIONS)
+        return stats
+    
+    def get_all_stats(self, now=None):
+        """Returns {entry: statistics} for all entries in the history"""
+        return {entry: self.get_stats(entry, now) for entry in self.stats}
+    
+    def get_never_blocked(self, entries):
+        """Returns entries that were not blocked within the kept history"""
+        return [entry for entry in entries
+                if not self.stats.get(entry, {}).get('blocks') and (entry, 'in') not in self.open_since
+                and (entry, 'out') not in self.open_since]
+    
+    def get_events(self, entry=None):
+        """Yields (time, entry, direction, action, duration) oldest first (scans the ring)"""
+        count = len(self.ring) // RECORD.size
+        first = self.total % self.capacity if self.total > self.capacity else 0
+        for index in range(count):
+            timestamp, entry_id, duration, direction, action = RECORD.unpack_from(
+                self.ring, ((first + index) % count) * RECORD.size)
+            name = self.names[entry_id] if entry_id < len(self.names) else f"#{entry_id}"
+            if entry is None or name == entry:
+                yield timestamp, name, DIRECTIONS[direction], ACTIONS[action], duration
+    
+    def get_summary(self):
+        """Returns (records kept, capacity, time of the oldest kept record or 0)"""
+        count = len(self.ring) // RECORD.size
+        oldest = next(self.get_events(), (0,))[0] if count else 0
+        return count, self.capacity, oldest
@@ -0,0 +1,157 @@
+"""
+Crash-safe journal for bulk block/unblock operations
+
+Every bulk operation appends its intent (action, direction and the prior
+status of each entry it changes), then per-item completion records, then a
+commit. The file is a JSON-lines log that is truncated to a checkpoint
+whenever no operation is open. After a crash, unfinished operations are
+resumed or rolled back item by item instead of re-applying the whole list.
+No Qt imports here.
+"""
+
+import os
+import json
+import time
+
+RECOVERY_POLICIES = ['resume', 'rollback']
+CHUNK_SIZE = 500  # Entries per firewall submission, status write and 'done' record in bulk operations
+
+
+def iter_chunks(items, size=CHUNK_SIZE):
+    """Yields consecutive slices of a list with at most size items"""
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+class Transaction:
+    """One journaled bulk operation"""
+    
+    def __init__(self, journal, tx_id):
+        self.journal = journal
+        self.id = tx_id
+    
+    def mark_done(self, entries):
+        """Records that entries reached their new status (firewall and status file)"""
+        if entries:
+            self.journal._append({'op': 'done', 'id': self.id, 'entries': list(entries)})
+    
+    def commit(self):
+        """Records that the whole operation finished"""
+        self.journal._append({'op': 'commit', 'id': self.id}, sync=True)
+        self.journal.open_ids.discard(self.id)
+        if not self.journal.open_ids:
+            self.journal.checkpoint()
+
+
+class TransactionJournal:
+    """Append-only journal of bulk operations with checkpointing and crash recovery"""
+    
+    def __init__(self, path="transactions.journal"):
+        self.path = path
+        self.open_ids = set()  # Transactions begun by this process and not committed yet
+    
+    def exists(self):
+        """Checks if a journal was written before (False on first run)"""
+        return os.path.exists(self.path)
+    
+    def is_checkpointed(self):
+        """Checks if the journal holds only a checkpoint (no operation was cut short since)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as journal_file:
+                lines = [line for line in journal_file if line.strip()]
+            return len(lines) == 1 and json.loads(lines[0]).get('op') == 'checkpoint'
+        except (OSError, ValueError, AttributeError):
+            return False
+    
+    def begin(self, action, direction, before):
+        """Records intent for {entry: status before} and returns the Transaction"""
+        tx_id = f"{time.time_ns()}-{os.getpid()}"
+        self._append({
+            'op': 'begin',
+            'id': tx_id,
+            'time': int(time.time()),
+            'action': action,
+            'direction': direction,
+            'before': {entry: [bool(status['in']), bool(status['out'])] for entry, status in before.items()},
+        }, sync=True)
+        self.open_ids.add(tx_id)
+        return Transaction(self, tx_id)
+    
+    def _append(self, record, sync=False):
+        """Appends one record; intent and commit are forced to disk, item records only flushed"""
+        try:
+            with open(self.path, 'a', encoding='utf-8') as journal_file:
+                journal_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+                journal_file.flush()
+                if sync:
+                    os.fsync(journal_file.fileno())
+        except Exception as e:
+            print(f"Error writing transaction journal: {e}")
+    
+    def checkpoint(self):
+        """Truncates the journal to a marker meaning "firewall matches the saved status\""""
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as journal_file:
+                journal_file.write(json.dumps({'op': 'checkpoint', 'time': int(time.time())}) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Error writing journal checkpoint: {e}")
+    
+    def get_open_transactions(self):
+        """Returns begun but not committed transactions as dicts with 'done' sets, oldest first"""
+        transactions = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line from a crash mid-write
+                    op = record.get('op')
+                    if op == 'begin':
+                        record['done'] = set()
+                        transactions[record['id']] = record
+                    elif op == 'done' and record.get('id') in transactions:
+                        transactions[record['id']]['done'].update(record.get('entries', []))
+                    elif op == 'commit':
+                        transactions.pop(record.get('id'), None)
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            print(f"Error reading transaction journal: {e}")
+            return []
+        return list(transactions.values())
+    
+    def recover(self, block_status, firewall_manager, policy='resume'):
+        """Finishes (resume) or undoes (rollback) unfinished transactions.
+        
+        block_status is {entry: status} and is updated in place. Returns
+        (transactions, entries touched); the caller saves block_status."""
+        transactions = self.get_open_transactions()
+        touched = []
+        for transaction in transactions:
+            blocked = transaction['action'] == 'block'
+            directions = ['in', 'out'] if transaction['direction'] == 'both' else [transaction['direction']]
+            firewall_manager.begin_batch()
+            for entry, (was_in, was_out) in transaction['before'].items():
+                before = {'in': was_in, 'out': was_out}
+                changed = [direction for direction in directions if before[direction] != blocked]
+                done = entry in transaction['done']
+                if not changed or (done and policy == 'resume'):
+                    continue
+                status = block_status.setdefault(entry, {'in': False, 'out': False})
+                for direction in changed:
+                    # The item in flight may or may not have its rule yet: delete first so nothing is doubled
+                    firewall_manager.delete_rule(entry, direction)
+                    target = blocked if policy == 'resume' else before[direction]
+                    if target and not status.get('dormant'):
+                        firewall_manager.create_rule(entry, direction)
+                    status[direction] = target
+                touched.append(entry)
+            firewall_manager.submit_batch()
+        if transactions:
+            self.checkpoint()
+        return transactions, touched
@@ -0,0 +1,221 @@
+"""
+Versioned blocklist feed: compressed snapshot plus ordered delta patches
+
+A feed is a directory served over HTTP(S) (or file://):
+
+    index.json              version, list hash, snapshot and delta files
+    snapshot-<N>.txt.gz     full list of version N (one entry per line)
+    delta-<N>.json.gz       {"from": N, "to": N + 1, "add": [...], "remove": [...]}
+
+Clients keep the list and version they applied last and download only the
+deltas after it. If the chain is broken (deltas pruned, a hash mismatch or
+a chain larger than the snapshot), they download the snapshot instead.
+publish_feed() creates the next version from a new plain-text list. No Qt
+imports here.
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import urllib.parse
+import urllib.request
+
+FEED_FORMAT = 'cheatersblocker-feed'
+DEFAULT_MAX_DELTAS = 100
+
+
+def normalize_lines(text):
+    """Returns non-empty stripped lines without duplicates, in order"""
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        line = line.strip()
+        if line and line not in seen:
+            seen.add(line)
+            lines.append(line)
+    return lines
+
+
+def get_list_hash(lines):
+    """Returns the sha256 of a list as the client rebuilds it"""
+    return hashlib.sha256(''.join(f"{line}\n" for line in lines).encode('utf-8')).hexdigest()
+
+
+def diff_lists(old_lines, new_lines):
+    """Returns (added, removed) lines between two lists, in list order"""
+    old_set = set(old_lines)
+    new_set = set(new_lines)
+    return [line for line in new_lines if line not in old_set], [line for line in old_lines if line not in new_set]
+
+
+def apply_delta(lines, added, removed):
+    """Applies a delta: removed lines are dropped, added lines appended"""
+    removed = set(removed)
+    present = set(lines)
+    return [line for line in lines if line not in removed] + [line for line in added if line not in present]
+
+
+class ListFeedClient:
+    """Keeps a local copy of a feed's list up to date with as few bytes as possible"""
+    
+    def __init__(self, index_url, state_path="list_feed.json", timeout=10):
+        self.index_url = index_url
+        self.state_path = state_path
+        self.timeout = timeout
+        self.downloaded_bytes = 0
+    
+    def _download(self, url):
+        """Returns the body of a URL (relative names are resolved against the index)"""
+        url = urllib.parse.urljoin(self.index_url, url)
+        request = urllib.request.Request(url, headers={'User-Agent': 'CheatersBlocker'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = response.read()
+        self.downloaded_bytes += len(data)
+        return data
+    
+    def _download_file(self, info):
+        """Downloads a snapshot or delta file and checks its hash, returns the uncompressed bytes"""
+        data = self._download(info['file'])
+        if hashlib.sha256(data).hexdigest() != info['sha256']:
+            raise ValueError(f"hash mismatch for {info['file']}")
+        return gzip.decompress(data)
+    
+    def load_state(self):
+        """Returns the saved {'url', 'version', 'lines'} or None"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as state_file:
+                state = json.load(state_file)
+            if state.get('url') == self.index_url and get_list_hash(state['lines']) == state.get('sha256'):
+                return state
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading list feed state: {e}")
+        return None
+    
+    def save_state(self, version, lines):
+        """Saves the applied version and its list (temporary file, then replace)"""
+        temp_path = f"{self.state_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as state_file:
+                json.dump({'url': self.index_url, 'version': version, 'sha256': get_list_hash(lines),
+                           'lines': lines}, state_file, separators=(',', ':'))
+            os.replace(temp_path, self.state_path)
+        except Exception as e:
+            print(f"Error saving list feed state: {e}")
+    
+    def get_chain(self, index, version):
+        """Returns the delta infos from version to the current one, None if they do not connect"""
+        deltas = {delta['from']: delta for delta in index.get('deltas', [])}
+        chain = []
+        while version < index['version']:
+            delta = deltas.get(version)
+            if delta is None or delta['to'] != version + 1:
+                return None
+            chain.append(delta)
+            version += 1
+        # Past this size the snapshot is the cheaper download
+        if sum(delta['size'] for delta in chain) >= index['snapshot']['size']:
+            return None
+        return chain
+    
+    def fetch(self):
+        """Returns (list text, description of what was downloaded)"""
+        index = json.loads(self._download(self.index_url))
+        if index.get('format') != FEED_FORMAT:
+            raise ValueError("not a blocklist feed index")
+        version = index['version']
+        state = self.load_state()
+        
+        if state is not None and state['version'] == version:
+            return '\n'.join(state['lines']), f"feed version {version}, up to date"
+        
+        lines = None
+        if state is not None and state['version'] < version:
+            chain = self.get_chain(index, state['version'])
+            if chain is not None:
+                try:
+                    lines = state['lines']
+                    for delta_info in chain:
+                        delta = json.loads(self._download_file(delta_info))
+                        lines = apply_delta(lines, delta['add'], delta['remove'])
+                    if get_list_hash(lines) != index['sha256']:
+                        raise ValueError("list hash mismatch after patching")
+                    message = f"feed version {state['version']} -> {version}, {len(chain)} patches"
+                except Exception as e:
+                    print(f"Falling back to the full list snapshot: {e}")
+                    lines = None
+        
+        if lines is None:
+            lines = normalize_lines(self._download_file(index['snapshot']).decode('utf-8'))
+            if get_list_hash(lines) != index['sha256']:
+                raise ValueError("list hash mismatch in snapshot")
+            message = f"feed version {version}, full snapshot"
+        
+        self.save_state(version, lines)
+        return '\n'.join(lines), f"{message} ({self.downloaded_bytes} bytes)"
+
+
+def _write_gzip(path, data):
+    """Writes gzip-compressed data reproducibly, returns {'file', 'size', 'sha256'}"""
+    compressed = gzip.compress(data, mtime=0)
+    with open(path, 'wb') as output_file:
+        output_file.write(compressed)
+    return {'file': os.path.basename(path), 'size': len(compressed), 'sha256': hashlib.sha256(compressed).hexdigest()}
+
+
+def publish_feed(feed_dir, new_text, max_deltas=DEFAULT_MAX_DELTAS):
+    """Publishes new_text as the next feed version, returns (version, added, removed).
+    
+    The index is replaced last, so clients never see a version whose files
+    are not written yet."""
+    os.makedirs(feed_dir, exist_ok=True)
+    index_path = os.path.join(feed_dir, 'index.json')
+    new_lines = normalize_lines(new_text)
+    
+    index = None
+    old_lines = []
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            index = json.load(index_file)
+        with open(os.path.join(feed_dir, index['snapshot']['file']), 'rb') as snapshot_file:
+            old_lines = normalize_lines(gzip.decompress(snapshot_file.read()).decode('utf-8'))
+    
+    added, removed = diff_lists(old_lines, new_lines)
+    if index is not None and not added and not removed:
+        return index['version'], [], []
+    
+    deltas = []
+    version = 1
+    if index is not None:
+        version = index['version'] + 1
+        delta = {'from': index['version'], 'to': version, 'add': added, 'remove': removed}
+        delta_info = _write_gzip(os.path.join(feed_dir, f"delta-{index['version']}.json.gz"),
+                                 json.dumps(delta, separators=(',', ':')).encode('utf-8'))
+        delta_info.update({'from': index['version'], 'to': version})
+        deltas = (index.get('deltas', []) + [delta_info])[-max_deltas:] if max_deltas > 0 else []
+    
+    # The snapshot is stored in the order clients reach by patching, so one hash fits both
+    lines = apply_delta(old_lines, added, removed)
+    snapshot_info = _write_gzip(os.path.join(feed_dir, f"snapshot-{version}.txt.gz"),
+                                ''.join(f"{line}\n" for line in lines).encode('utf-8'))
+    new_index = {'format': FEED_FORMAT, 'version': version, 'sha256': get_list_hash(lines),
+                 'snapshot': snapshot_info, 'deltas': deltas}
+    temp_path = f"{index_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as index_file:
+        json.dump(new_index, index_file, indent=1)
+    os.replace(temp_path, index_path)
+    
+    # Older snapshots and pruned deltas are no longer referenced; the previous snapshot
+    # stays for clients that read the old index just before it was replaced
+    referenced = {snapshot_info['file']} | {delta['file'] for delta in deltas}
+    if index is not None:
+        referenced.add(index['snapshot']['file'])
+    for name in os.listdir(feed_dir):
+        if (name.startswith('snapshot-') or name.startswith('delta-')) and name not in referenced:
+            try:
+                os.remove(os.path.join(feed_dir, name))
+            except OSError as e:
+                print(f"Error removing {name}: {e}")
+    return version, added, removed
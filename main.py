@@ -1,18 +1,77 @@
+import time
+_START_TIME = time.perf_counter()
+
 import sys
 import os
-import configparser
 import math
-import requests
-import subprocess
 import ctypes
 import ipaddress
 import tempfile
 import atexit
+import queue
+import threading
 from ctypes import wintypes
-from PyQt6.QtWidgets import *
-from PyQt6.QtCore import *
-from PyQt6.QtGui import *
-from PyQt6.QtMultimedia import QSoundEffect
+from PyQt6.QtWidgets import (
+    QAbstractItemView,
+    QApplication,
+    QCheckBox,
+    QComboBox,
+    QDialog,
+    QFileDialog,
+    QGroupBox,
+    QHBoxLayout,
+    QHeaderView,
+    QInputDialog,
+    QLabel,
+    QLineEdit,
+    QListWidget,
+    QListWidgetItem,
+    QMainWindow,
+    QMenu,
+    QMessageBox,
+    QPushButton,
+    QStatusBar,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+from PyQt6.QtCore import (
+    QDateTime,
+    QItemSelection,
+    QItemSelectionModel,
+    QMetaObject,
+    QModelIndex,
+    QThread,
+    QTimer,
+    QUrl,
+    Q_ARG,
+    Qt,
+    pyqtSignal,
+    pyqtSlot,
+)
+from PyQt6.QtGui import QBrush, QColor, QDesktopServices, QIcon, QKeySequence, QShortcut
+# QtMultimedia is imported lazily by SoundManager after the window is shown; the firewall
+# backend and the other subsystems are imported by deferred_init() and the start_* methods
+from core import (
+    DEFAULT_LIST_URL,
+    IPAddressManager,
+    BlocklistSnapshot,
+    BlockStatusManager,
+    AllowlistManager,
+    ExpiryQueue,
+    ActionPlanner,
+    SettingsManager,
+    ProfilingManager,
+    EntrySearchIndex,
+    StartupTimer,
+    check_admin_privileges,
+    detect_game_executable,
+    parse_entry,
+)
+
+startup_timer = StartupTimer(_START_TIME)
+startup_timer.mark('imports')
 
 # Resource path function for PyInstaller compatibility
 def get_resource_path(relative_path):
@@ -83,10 +142,12 @@ class HotkeyManager(QThread):
         super().__init__()
         self.hook_id = None
         self.running = False
+        self.thread_ident = None
         
     def run(self):
         """Starts the hotkey processing loop"""
         self.running = True
+        self.thread_ident = threading.get_ident()
         
         # Set low-level keyboard hook
         self.hook_proc = HOOKPROC(self.keyboard_hook)
@@ -136,255 +197,394 @@ class HotkeyManager(QThread):
             pass
 
 
-class FirewallRuleManager:
-    """Manager for working with Windows Firewall rules"""
+class BlocklistLoader(QThread):
+    """Downloads the blocklist off the GUI thread"""
     
-    def __init__(self):
-        pass  # No rules tracking needed as we use INI file
-    
-    def create_rule(self, ip_range, direction='both'):
-        """Creates a firewall rule for IP or IP range"""
-        # Check if it's a range
-        if '-' in ip_range:
-            start_ip, end_ip = ip_range.split('-')
-            start_ip = start_ip.strip()
-            end_ip = end_ip.strip()
-            
-            # Create rule name for range
-            rule_base_name = f"IPBlocker_RANGE_{start_ip.replace('.', '_')}_to_{end_ip.replace('.', '_')}"
-            
-            if direction in ['in', 'both']:
-                rule_name = f"{rule_base_name}_IN"
-                self._execute_rule_command_range('add', rule_name, start_ip, end_ip, 'in')
-            
-            if direction in ['out', 'both']:
-                rule_name = f"{rule_base_name}_OUT"
-                self._execute_rule_command_range('add', rule_name, start_ip, end_ip, 'out')
-        else:
-            # Single IP
-            rule_base_name = f"IPBlocker_{ip_range.replace('.', '_')}"
-            
-            if direction in ['in', 'both']:
-                rule_name = f"{rule_base_name}_IN"
-                self._execute_rule_command('add', rule_name, ip_range, 'in')
-            
-            if direction in ['out', 'both']:
-                rule_name = f"{rule_base_name}_OUT"
-                self._execute_rule_command('add', rule_name, ip_range, 'out')
-    
-    def delete_rule(self, ip_range, direction='both'):
-        """Deletes a firewall rule for IP or IP range"""
-        # Check if it's a range
-        if '-' in ip_range:
-            start_ip, end_ip = ip_range.split('-')
-            start_ip = start_ip.strip()
-            end_ip = end_ip.strip()
-            
-            # Create rule name for range
-            rule_base_name = f"IPBlocker_RANGE_{start_ip.replace('.', '_')}_to_{end_ip.replace('.', '_')}"
-            
-            if direction in ['in', 'both']:
-                rule_name = f"{rule_base_name}_IN"
-                self._execute_rule_command_range('delete', rule_name, start_ip, end_ip, 'in')
-            
-            if direction in ['out', 'both']:
-                rule_name = f"{rule_base_name}_OUT"
-                self._execute_rule_command_range('delete', rule_name, start_ip, end_ip, 'out')
-        else:
-            # Single IP
-            rule_base_name = f"IPBlocker_{ip_range.replace('.', '_')}"
-            
-            if direction in ['in', 'both']:
-                rule_name = f"{rule_base_name}_IN"
-                self._execute_rule_command('delete', rule_name, ip_range, 'in')
-            
-            if direction in ['out', 'both']:
-                rule_name = f"{rule_base_name}_OUT"
-                self._execute_rule_command('delete', rule_name, ip_range, 'out')
+    loaded_signal = pyqtSignal(bool, object)
     
-    def _execute_rule_command(self, action, rule_name, ip_address, direction):
-        """Executes netsh command for single IP rule operations"""
-        dir_param = 'in' if direction == 'in' else 'out'
-        
-        try:
-            if action == 'add':
-                # Use CREATE_ALWAYS flag to avoid duplicates
-                subprocess.run([
-                    'netsh', 'advfirewall', 'firewall', 'add', 'rule',
-                    f'name={rule_name}',
-                    f'dir={dir_param}',
-                    'action=block',
-                    f'remoteip={ip_address}',
-                    'protocol=any'
-                ], shell=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            elif action == 'delete':
-                # Use timeout to prevent hanging
-                subprocess.run([
-                    'netsh', 'advfirewall', 'firewall', 'delete', 'rule',
-                    f'name={rule_name}'
-                ], shell=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW, timeout=2)
-        except subprocess.CalledProcessError as e:
-            # Don't print error for missing rules
-            if action == 'delete' and 'No rules match the specified criteria' not in str(e):
-                print(f"Error executing {action} command for {rule_name}: {e}")
-        except subprocess.TimeoutExpired:
-            # Force terminate if hanging
-            print(f"Timeout executing {action} command for {rule_name}")
-        except Exception as e:
-            # Silent fail for other exceptions
-            pass
+    def __init__(self, url):
+        super().__init__()
+        self.ip_manager = IPAddressManager()  # Swapped into the app when loading succeeds
+        self.url = url
     
-    def _execute_rule_command_range(self, action, rule_name, start_ip, end_ip, direction):
-        """Executes netsh command for IP range rule operations"""
-        dir_param = 'in' if direction == 'in' else 'out'
-        
+    def run(self):
+        """Loads the list and reports the result to the GUI thread"""
+        success, result = self.ip_manager.load_from_url(self.url)
+        self.loaded_signal.emit(success, result)
+
+
+class PeerCaptureThread(QThread):
+    """Runs live or .pcap file peer discovery off the GUI thread"""
+    
+    finished_signal = pyqtSignal(str)
+    
+    def __init__(self, engine, pcap_path=None):
+        super().__init__()
+        self.engine = engine
+        self.pcap_path = pcap_path
+        self.stop_event = threading.Event()
+    
+    def run(self):
+        """Feeds packets into the engine until finished or stopped"""
         try:
-            if action == 'add':
-                subprocess.run([
-                    'netsh', 'advfirewall', 'firewall', 'add', 'rule',
-                    f'name={rule_name}',
-                    f'dir={dir_param}',
-                    'action=block',
-                    f'remoteip={start_ip}-{end_ip}',
-                    'protocol=any'
-                ], shell=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            elif action == 'delete':
-                subprocess.run([
-                    'netsh', 'advfirewall', 'firewall', 'delete', 'rule',
-                    f'name={rule_name}'
-                ], shell=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW, timeout=2)
-        except subprocess.CalledProcessError as e:
-            # Don't print error for missing rules
-            if action == 'delete' and 'No rules match the specified criteria' not in str(e):
-                print(f"Error executing {action} command for {rule_name}: {e}")
-        except subprocess.TimeoutExpired:
-            # Force terminate if hanging
-            print(f"Timeout executing {action} command for {rule_name}")
+            if self.pcap_path:
+                packets = self.engine.read_pcap(self.pcap_path, self.stop_event)
+                message = f'Read {packets} packets from {os.path.basename(self.pcap_path)}'
+            else:
+                self.engine.capture_live(self.stop_event)
+                message = 'Live capture stopped'
         except Exception as e:
-            # Silent fail for other exceptions
-            pass
+            message = f'Capture error: {e}'
+        self.finished_signal.emit(message)
+    
+    def stop(self):
+        """Asks the capture loop to exit"""
+        self.stop_event.set()
+
+
+class FirewallLogThread(QThread):
+    """Polls the firewall log for dropped packets in background"""
+    
+    hits_signal = pyqtSignal(object)
     
-    def delete_specific_rule(self, rule_name):
-        """Deletes a specific firewall rule by name"""
+    def __init__(self, tailer, interval=5.0):
+        super().__init__()
+        self.tailer = tailer
+        self.interval = interval
+        self.stop_event = threading.Event()
+    
+    def run(self):
+        """Reports changed per-entry counters until stopped"""
+        while not self.stop_event.is_set():
+            try:
+                changed = self.tailer.poll()
+            except Exception as e:
+                print(f"Error reading firewall log: {e}")
+                changed = {}
+            if changed:
+                self.hits_signal.emit(changed)
+            self.stop_event.wait(self.interval)
+    
+    def stop(self):
+        """Asks the polling loop to exit"""
+        self.stop_event.set()
+
+
+class PrefixImportThread(QThread):
+    """Imports a prefix/ASN dataset off the GUI thread"""
+    
+    finished_signal = pyqtSignal(bool, str)
+    
+    def __init__(self, source_path, db_path):
+        super().__init__()
+        self.source_path = source_path
+        self.db_path = db_path
+    
+    def run(self):
+        """Compiles the dataset into the binary index"""
+        from prefix_db import PrefixDatabase
+        prefix_db = PrefixDatabase(self.db_path)
         try:
-            subprocess.run([
-                'netsh', 'advfirewall', 'firewall', 'delete', 'rule',
-                f'name={rule_name}'
-            ], shell=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW, timeout=2)
-        except subprocess.CalledProcessError as e:
-            # Don't print error for missing rules
-            if 'No rules match the specified criteria' not in str(e):
-                print(f"Error deleting rule {rule_name}: {e}")
-        except subprocess.TimeoutExpired:
-            print(f"Timeout deleting rule {rule_name}")
+            count = prefix_db.import_file(self.source_path)
+            self.finished_signal.emit(True, f'Imported {count} provider prefixes')
         except Exception as e:
-            pass
+            self.finished_signal.emit(False, f'Prefix import failed: {e}')
+        finally:
+            prefix_db.close()
 
 
-class IPAddressManager:
-    """Manager for loading and managing IP addresses"""
+class AnnotationThread(QThread):
+    """Annotates batches of table entries off the GUI thread"""
     
-    def __init__(self):
-        self.ip_addresses = []
-        self.ip_ranges = []
+    annotated_signal = pyqtSignal(object)
     
-    def load_from_url(self, url):
-        """Loads IP addresses and ranges from specified URL"""
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            # Extract IP addresses and ranges
-            lines = response.text.strip().split('\n')
-            self.ip_addresses = []
-            self.ip_ranges = []
+    def __init__(self, annotator, chunk_size=256):
+        super().__init__()
+        self.annotator = annotator
+        self.chunk_size = chunk_size
+        self.requests = queue.Queue()
+        self.stop_event = threading.Event()
+    
+    def request(self, items):
+        """Queues [(entry, (start, end), manual)] for annotation"""
+        self.requests.put(items)
+    
+    def run(self):
+        """Annotates queued requests in chunks until stopped"""
+        while not self.stop_event.is_set():
+            try:
+                items = self.requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
             
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Check if it's a range
-                if '-' in line:
-                    if self._is_valid_ip_range(line):
-                        self.ip_ranges.append(line)
-                    else:
-                        print(f"Invalid IP range format: {line}")
-                # Check if it's a single IP
-                elif self._is_valid_ip(line):
-                    self.ip_addresses.append(line)
-                else:
-                    print(f"Invalid IP format: {line}")
+            # Only the newest request matters while the user keeps scrolling
+            while True:
+                try:
+                    items = self.requests.get_nowait()
+                except queue.Empty:
+                    break
             
-            return True, self.ip_addresses + self.ip_ranges
-        except requests.RequestException as e:
-            return False, f"Loading error: {e}"
-        except Exception as e:
-            return False, f"Unexpected error: {e}"
+            for index in range(0, len(items), self.chunk_size):
+                if self.stop_event.is_set() or not self.requests.empty():
+                    break
+                try:
+                    results = self.annotator.annotate_batch(items[index:index + self.chunk_size])
+                except Exception as e:
+                    print(f"Error annotating entries: {e}")
+                    break
+                self.annotated_signal.emit(results)
     
-    def _is_valid_ip(self, ip):
-        """Validates single IP address"""
-        try:
-            ipaddress.IPv4Address(ip)
-            return True
-        except ipaddress.AddressValueError:
-            return False
+    def stop(self):
+        """Asks the annotation loop to exit"""
+        self.stop_event.set()
+
+
+class EnforcementThread(QThread):
+    """Feeds sighted peers into the policy engine off the GUI thread"""
+    
+    enforced_signal = pyqtSignal(str, str, str, float)
+    apply_signal = pyqtSignal(object)
     
-    def _is_valid_ip_range(self, ip_range):
-        """Validates IP range format XXX.XXX.XXX.XXX-XXX.XXX.XXX.XXX"""
+    def __init__(self, feed, engine):
+        super().__init__()
+        self.feed = feed
+        self.engine = engine
+        self.engine.apply_callback = self.apply_on_gui_thread
+        self.engine.report_callback = self.enforced_signal.emit
+        self.stop_event = threading.Event()
+    
+    def apply_on_gui_thread(self, entry, direction):
+        """Blocks a match on the GUI thread (blocking queued signal), returns False if nothing changed"""
+        request = (entry, direction, [])
+        self.apply_signal.emit(request)
+        return bool(request[2]) and request[2][0]
+    
+    def run(self):
+        """Runs the feed until stopped"""
         try:
-            if '-' not in ip_range:
-                return False
-            
-            start_ip, end_ip = ip_range.split('-')
-            start_ip = start_ip.strip()
-            end_ip = end_ip.strip()
-            
-            # Validate both IPs
-            if not self._is_valid_ip(start_ip) or not self._is_valid_ip(end_ip):
-                return False
-            
-            # Check if start IP is less than or equal to end IP
-            start = ipaddress.IPv4Address(start_ip)
-            end = ipaddress.IPv4Address(end_ip)
-            
-            if start > end:
-                return False
+            self.feed.run(self.engine.on_sighting, self.stop_event)
+        except Exception as e:
+            print(f"Peer feed error: {e}")
+    
+    def stop(self):
+        """Asks the feed loop to exit"""
+        self.stop_event.set()
+
+
+class DriftWatchThread(QThread):
+    """Periodically fingerprints (or repairs) the firewall rules within a CPU and process budget"""
+    
+    rules_signal = pyqtSignal(object)
+    
+    def __init__(self, detector, interval=60.0, cpu_percent=1.0, max_per_hour=60):
+        super().__init__()
+        self.detector = detector
+        self.interval = interval
+        self.cpu_fraction = max(cpu_percent, 0.01) / 100
+        self.min_interval = 3600 / max(max_per_hour, 1)  # One netsh process per check or repair
+        self.stop_event = threading.Event()
+    
+    def run(self):
+        """Reports the rule list whenever its fingerprint changes"""
+        delay = self.interval
+        while not self.stop_event.wait(delay):
+            try:
+                snapshot = self.detector.check()
+                if snapshot is not None:
+                    self.rules_signal.emit(snapshot)
+            except Exception as e:
+                print(f"Error checking firewall rules: {e}")
             
-            return True
-        except:
-            return False
+            # Slow down when listing or repairing is expensive, so it stays within the CPU budget
+            delay = max(self.interval, self.min_interval, self.detector.last_duration / self.cpu_fraction)
     
-    def get_ips(self):
-        """Returns list of all loaded IP addresses and ranges"""
-        return self.ip_addresses + self.ip_ranges
+    def stop(self):
+        """Asks the watch loop to exit"""
+        self.stop_event.set()
+
+
+class ControlServerThread(QThread):
+    """Serves the local control socket and runs commands on the GUI thread"""
     
-    def is_range(self, ip_entry):
-        """Checks if entry is an IP range"""
-        return '-' in ip_entry
+    command_signal = pyqtSignal(object)
     
-    def get_range_ips(self, ip_range):
-        """Returns list of all IPs in a range (for display purposes)"""
-        if not self.is_range(ip_range):
-            return [ip_range]
-        
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+        self.stop_event = threading.Event()
+    
+    def run(self):
+        """Accepts clients until stopped"""
         try:
-            start_ip, end_ip = ip_range.split('-')
-            start = ipaddress.IPv4Address(start_ip.strip())
-            end = ipaddress.IPv4Address(end_ip.strip())
-            
-            ips = []
-            # Limit to reasonable number for display
-            total_ips = int(end) - int(start) + 1
-            if total_ips <= 100:  # Only generate if range is small
-                current = start
-                while current <= end:
-                    ips.append(str(current))
-                    current += 1
-            
-            return ips
-        except:
-            return [ip_range]
+            self.server.run(self.stop_event, self.invoke)
+        except Exception as e:
+            print(f"Control socket error: {e}")
+    
+    def invoke(self, dispatch_batch, lines):
+        """Runs a batch of commands on the GUI thread (blocking queued signal) and returns the replies"""
+        request = (dispatch_batch, lines, [])
+        self.command_signal.emit(request)
+        return request[2]
+    
+    def stop(self):
+        """Asks the server loop to exit"""
+        self.stop_event.set()
+
+
+class ReportUploadThread(QThread):
+    """Uploads queued cheater reports in the background"""
+    
+    sent_signal = pyqtSignal(int)
+    
+    def __init__(self, report_queue):
+        super().__init__()
+        self.report_queue = report_queue
+        self.stop_event = threading.Event()
+    
+    def run(self):
+        """Sends batches until stopped"""
+        try:
+            self.report_queue.run(self.stop_event, self.sent_signal.emit)
+        except Exception as e:
+            print(f"Report upload error: {e}")
+    
+    def stop(self):
+        """Asks the upload loop to exit"""
+        self.stop_event.set()
+        self.report_queue.wake()
+
+
+class AllowlistDialog(QDialog):
+    """Dialog for editing IPs and ranges that are never blocked"""
+    
+    def __init__(self, allowlist_manager, on_changed, parent=None):
+        super().__init__(parent)
+        self.allowlist_manager = allowlist_manager
+        self.on_changed = on_changed  # Called with (start, end) of each changed entry
+        
+        self.setWindowTitle('Allowlist')
+        self.resize(420, 360)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel('These addresses stay reachable even inside blocked ranges:'))
+        
+        self.entry_list = QListWidget()
+        layout.addWidget(self.entry_list)
+        
+        input_layout = QHBoxLayout()
+        self.entry_edit = QLineEdit()
+        self.entry_edit.setPlaceholderText('IP, range or CIDR')
+        input_layout.addWidget(self.entry_edit)
+        self.note_edit = QLineEdit()
+        self.note_edit.setPlaceholderText('Note (e.g. friend name)')
+        input_layout.addWidget(self.note_edit)
+        layout.addLayout(input_layout)
+        
+        buttons_layout = QHBoxLayout()
+        add_button = QPushButton('Add')
+        add_button.clicked.connect(self.add_entry)
+        buttons_layout.addWidget(add_button)
+        remove_button = QPushButton('Remove selected')
+        remove_button.clicked.connect(self.remove_entry)
+        buttons_layout.addWidget(remove_button)
+        layout.addLayout(buttons_layout)
+        
+        self.refresh_list()
+    
+    def refresh_list(self):
+        """Shows current allowlist entries"""
+        self.entry_list.clear()
+        for entry, note in self.allowlist_manager.get_entries():
+            item = QListWidgetItem(f'{entry}  ({note})' if note else entry)
+            item.setData(Qt.ItemDataRole.UserRole, entry)
+            self.entry_list.addItem(item)
+    
+    def add_entry(self):
+        """Adds the typed entry to the allowlist"""
+        parsed = self.allowlist_manager.add(self.entry_edit.text(), self.note_edit.text().strip())
+        if parsed is None:
+            QMessageBox.warning(self, 'Allowlist', 'Enter a valid IP address, range (a.b.c.d-e.f.g.h) or CIDR')
+            return
+        self.entry_edit.clear()
+        self.note_edit.clear()
+        self.refresh_list()
+        self.on_changed(parsed[1], parsed[2])
+    
+    def remove_entry(self):
+        """Removes the selected entry from the allowlist"""
+        item = self.entry_list.currentItem()
+        if item is None:
+            return
+        parsed = self.allowlist_manager.remove(item.data(Qt.ItemDataRole.UserRole))
+        self.refresh_list()
+        if parsed is not None:
+            self.on_changed(parsed[1], parsed[2])
+
+
+class StatsItem(QTableWidgetItem):
+    """Table item that sorts by a number instead of its text"""
+    
+    def __init__(self, text, key):
+        super().__init__(text)
+        self.key = key
+        self.setFlags(self.flags() & ~Qt.ItemFlag.ItemIsEditable)
+    
+    def __lt__(self, other):
+        return self.key < getattr(other, 'key', 0)
+
+
+class BlockHistoryDialog(QDialog):
+    """Dialog showing per-entry block statistics from the block history"""
+    
+    def __init__(self, block_history, entries, parent=None):
+        super().__init__(parent)
+        self.block_history = block_history
+        self.entries = entries  # Table entries, for "never blocked"
+        
+        self.setWindowTitle('Block history')
+        self.resize(720, 480)
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel('')
+        layout.addWidget(self.summary_label)
+        
+        self.stats_table = QTableWidget()
+        self.stats_table.setColumnCount(5)
+        self.stats_table.setHorizontalHeaderLabels(['IP Address/Range', 'Times blocked', 'Total blocked',
+                                                    'Last blocked', 'Blocked now'])
+        self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.stats_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        layout.addWidget(self.stats_table)
+        
+        self.never_checkbox = QCheckBox('Show only entries never blocked')
+        self.never_checkbox.stateChanged.connect(self.refresh_table)
+        layout.addWidget(self.never_checkbox)
+        
+        self.refresh_table()
+    
+    def refresh_table(self):
+        """Fills the table from the precomputed statistics (no history scan)"""
+        from history import format_duration
+        if self.never_checkbox.isChecked():
+            rows = [(entry, None) for entry in self.block_history.get_never_blocked(self.entries)]
+        else:
+            rows = list(self.block_history.get_all_stats().items())
+        
+        self.stats_table.setSortingEnabled(False)
+        self.stats_table.setRowCount(len(rows))
+        for row, (entry, stats) in enumerate(rows):
+            stats = stats or {'blocks': 0, 'blocked_seconds': 0, 'last_blocked': 0, 'blocked_now': False}
+            last_blocked = stats['last_blocked']
+            last_text = time.strftime('%Y-%m-%d %H:%M', time.localtime(last_blocked)) if last_blocked else '-'
+            self.stats_table.setItem(row, 0, StatsItem(entry, entry))
+            self.stats_table.setItem(row, 1, StatsItem(str(stats['blocks']), stats['blocks']))
+            self.stats_table.setItem(row, 2, StatsItem(format_duration(stats['blocked_seconds']), stats['blocked_seconds']))
+            self.stats_table.setItem(row, 3, StatsItem(last_text, last_blocked))
+            self.stats_table.setItem(row, 4, StatsItem('Yes' if stats['blocked_now'] else '', int(stats['blocked_now'])))
+        self.stats_table.setSortingEnabled(True)
+        self.stats_table.sortItems(1, Qt.SortOrder.DescendingOrder)
+        
+        count, capacity, oldest = self.block_history.get_summary()
+        since_text = f" since {time.strftime('%Y-%m-%d %H:%M', time.localtime(oldest))}" if oldest else ''
+        self.summary_label.setText(f'{len(rows)} entries, {count}/{capacity} events kept{since_text}')
 
 
 class ToggleButton(QPushButton):
@@ -434,6 +634,13 @@ class SoundManager:
         """Enables or disables sounds"""
         self.sounds_enabled = enabled
     
+    def preload(self):
+        """Loads the multimedia backend ahead of the first sound"""
+        try:
+            from PyQt6.QtMultimedia import QSoundEffect
+        except Exception as e:
+            print(f"Error loading audio backend: {e}")
+    
     def play_sound(self, sound_file, is_global_action=False):
         """Plays sound file with optional global action rate limiting"""
         if not self.sounds_enabled:
@@ -454,6 +661,7 @@ class SoundManager:
         if os.path.exists(sound_path):
             try:
                 # Use QSoundEffect for playback
+                from PyQt6.QtMultimedia import QSoundEffect
                 sound_effect = QSoundEffect()
                 sound_effect.setSource(QUrl.fromLocalFile(os.path.abspath(sound_path)))
                 sound_effect.setVolume(1.0)
@@ -546,183 +754,62 @@ class SoundManager:
             print(f"Error creating file {filename}: {e}")
 
 
-class BlockStatusManager:
-    """Manager for handling block status persistence in INI file"""
-    
-    def __init__(self):
-        self.ini_file = "block_status.ini"
-        self.config = configparser.ConfigParser()
-        self.block_status = {}
-        self.load_status()
-    
-    def load_status(self):
-        """Loads block status from INI file"""
-        if os.path.exists(self.ini_file):
-            try:
-                self.config.read(self.ini_file, encoding='utf-8')
-                
-                # Load all IPs and their statuses from INI
-                for section in self.config.sections():
-                    if section.startswith('IP_'):
-                        ip = section[3:]  # Remove 'IP_' prefix
-                        in_blocked = self.config.getboolean(section, 'in_blocked', fallback=False)
-                        out_blocked = self.config.getboolean(section, 'out_blocked', fallback=False)
-                        self.block_status[ip] = {'in': in_blocked, 'out': out_blocked}
-            except Exception as e:
-                print(f"Error loading INI file: {e}")
-                # Create new file if corrupted
-                self.block_status = {}
-                self.save_status()
-        else:
-            # Create new INI file
-            self.save_status()
-    
-    def save_status(self):
-        """Saves block status to INI file"""
-        try:
-            # Clear existing config
-            self.config.clear()
-            
-            # Add settings section
-            if not self.config.has_section('Settings'):
-                self.config.add_section('Settings')
-            
-            # Add each IP with its status
-            for ip, status in self.block_status.items():
-                section_name = f'IP_{ip}'
-                if not self.config.has_section(section_name):
-                    self.config.add_section(section_name)
-                self.config.set(section_name, 'in_blocked', str(status['in']).lower())
-                self.config.set(section_name, 'out_blocked', str(status['out']).lower())
-            
-            # Write to file
-            with open(self.ini_file, 'w', encoding='utf-8') as configfile:
-                self.config.write(configfile)
-        except Exception as e:
-            print(f"Error saving INI file: {e}")
-    
-    def update_status(self, ip, status):
-        """Updates status for specific IP"""
-        self.block_status[ip] = status
-        self.save_status()
-    
-    def remove_ip(self, ip):
-        """Removes IP from INI file"""
-        if ip in self.block_status:
-            del self.block_status[ip]
-            
-            # Also remove from config
-            section_name = f'IP_{ip}'
-            if self.config.has_section(section_name):
-                self.config.remove_section(section_name)
-            
-            self.save_status()
-            return True
-        return False
-    
-    def cleanup_orphaned_ips(self, current_ips):
-        """Removes IPs that are in INI but not in current list"""
-        ips_to_remove = []
-        for ip in self.block_status.keys():
-            if ip not in current_ips:
-                ips_to_remove.append(ip)
-        
-        for ip in ips_to_remove:
-            self.remove_ip(ip)
-        
-        return ips_to_remove
-    
-    def get_status(self, ip):
-        """Gets status for specific IP"""
-        return self.block_status.get(ip, {'in': False, 'out': False})
-    
-    def get_all_blocked_ips(self):
-        """Returns all IPs with any blocking"""
-        blocked_ips = []
-        for ip, status in self.block_status.items():
-            if status['in'] or status['out']:
-                blocked_ips.append(ip)
-        return blocked_ips
-
-
-class SettingsManager:
-    """Manager for handling settings"""
-    
-    def __init__(self):
-        self.config_file = "settings.ini"
-        self.config = configparser.ConfigParser()
-        self.load_settings()
-    
-    def load_settings(self):
-        """Loads settings from file"""
-        if os.path.exists(self.config_file):
-            try:
-                self.config.read(self.config_file, encoding='utf-8')
-            except:
-                # Create default settings if file is corrupted
-                self.config['Settings'] = {
-                    'sounds_enabled': 'true',
-                    'global_block_enabled': 'true'
-                }
-                self.save_settings()
-        else:
-            # Create default settings
-            self.config['Settings'] = {
-                'sounds_enabled': 'true',
-                'global_block_enabled': 'true'
-            }
-            self.save_settings()
-    
-    def save_settings(self):
-        """Saves settings to file"""
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as configfile:
-                self.config.write(configfile)
-        except Exception as e:
-            print(f"Error saving settings: {e}")
-    
-    def get_sounds_enabled(self):
-        """Returns sound status"""
-        return self.config.getboolean('Settings', 'sounds_enabled', fallback=True)
-    
-    def set_sounds_enabled(self, enabled):
-        """Sets sound status"""
-        self.config.set('Settings', 'sounds_enabled', str(enabled).lower())
-        self.save_settings()
-    
-    def get_global_block_enabled(self):
-        """Returns global block checkbox status"""
-        return self.config.getboolean('Settings', 'global_block_enabled', fallback=True)
-    
-    def set_global_block_enabled(self, enabled):
-        """Sets global block checkbox status"""
-        self.config.set('Settings', 'global_block_enabled', str(enabled).lower())
-        self.save_settings()
-
-
 class IPBlockerApp(QMainWindow):
     """Main application window"""
     
     def __init__(self):
         super().__init__()
         
-        self.firewall_manager = FirewallRuleManager()
+        self.settings_manager = SettingsManager()
+        self.firewall_manager = None  # Created with the other managers below by init_managers()
         self.ip_manager = IPAddressManager()
         self.sound_manager = SoundManager()
-        self.settings_manager = SettingsManager()
         self.block_status_manager = BlockStatusManager()
+        self.transaction_journal = None
         self.hotkey_manager = HotkeyManager()
+        self.allowlist_manager = AllowlistManager()
+        self.profiling_manager = ProfilingManager(
+            os.path.dirname(os.path.abspath(self.settings_manager.config_file)))
+        
+        self.blocklist_snapshot = BlocklistSnapshot()
+        self.blocklist_loader = None
+        self.table_entries = []
+        self.deferred_init_done = False
+        self.peer_engine = None
+        self.peer_capture_thread = None
+        self.peer_capture_live = False
+        self.table_rows = {}  # entry -> row in ip_table
+        self.search_index = EntrySearchIndex()
+        self.hidden_rows = set()  # Rows hidden by the search box
+        self.firewall_log_tailer = None
+        self.firewall_log_thread = None
+        self.drop_timer = None  # Block to first logged drop
+        self.prefix_db = None
+        self.prefix_import_thread = None
+        self.annotator = None
+        self.annotation_thread = None
+        self.annotation_prefetch = 200  # Rows annotated above and below the visible ones
+        self.policy_engine = None
+        self.enforcement_feed = None
+        self.rule_budget = self.settings_manager.get_rule_budget()
+        self.action_planner = None
+        self.enforcement_thread = None
         
         self.current_selected_ip = None
         self.ip_block_status = {}  # Stores blocking status for each IP or range
+        self.expiry_queue = ExpiryQueue(self.ip_block_status)  # Timed blocks, filled as rows are added
+        self.drift_detector = None  # Created by start_drift_watcher()
+        self.drift_thread = None
+        self.control_thread = None
+        self.report_queue = None  # Set when a report collector URL is configured
+        self.report_thread = None
+        self.drifted_entries = set()  # Entries whose rules are missing or changed
         self.global_block_enabled = True  # Default enabled as requested
         
         # Set window icon using resource path
         self.set_window_icon(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "logo.ico"))
         
         self.init_ui()
-        self.load_ip_addresses()
-        self.sync_block_status_with_firewall()
         
         # Load settings
         sounds_enabled = self.settings_manager.get_sounds_enabled()
@@ -730,10 +817,75 @@ class IPBlockerApp(QMainWindow):
         self.sound_manager.set_enabled(sounds_enabled)
         self.sound_checkbox.setChecked(sounds_enabled)
         self.global_block_checkbox.setChecked(self.global_block_enabled)
+        self.auto_block_checkbox.setChecked(self.settings_manager.get_auto_block_enabled())
+        self.auto_block_checkbox.stateChanged.connect(self.on_auto_block_checkbox_changed)
+        rule_program, rule_protocol = self.settings_manager.get_rule_scope_setting()
+        self.game_only_checkbox.setChecked(bool(rule_program))
+        self.udp_only_checkbox.setChecked(rule_protocol == 'udp')
+        self.game_only_checkbox.stateChanged.connect(self.on_rule_scope_changed)
+        self.udp_only_checkbox.stateChanged.connect(self.on_rule_scope_changed)
+        self.terminate_flows_checkbox.setChecked(self.settings_manager.get_terminate_flows())
+        self.terminate_flows_checkbox.stateChanged.connect(self.on_terminate_flows_checkbox_changed)
+        
+        # Hotkeys, audio, list download and firewall sync start after the first paint
+        startup_timer.mark('window_constructed')
+    
+    def showEvent(self, event):
+        """Schedules deferred initialization once the window is shown"""
+        super().showEvent(event)
+        if not self.deferred_init_done:
+            self.deferred_init_done = True
+            QTimer.singleShot(0, self.deferred_init)
+    
+    def deferred_init(self):
+        """Starts subsystems that are not needed for the first frame"""
+        startup_timer.mark('first_paint')
+        
+        # Firewall backend and the managers the table columns need
+        self.init_managers()
+        startup_timer.mark('managers_ready')
         
         # Setup hotkeys
         self.setup_hotkeys()
-
+        
+        # Show last compiled list right away, then refresh it in background
+        self.load_snapshot()
+        self.load_ip_addresses()
+        
+        # Map provider prefix index (if imported earlier) and start annotating rows
+        self.prefix_db.load()
+        self.start_annotation_thread()
+        
+        # Block list entries as soon as they show up in the peer feed
+        if self.auto_block_checkbox.isChecked():
+            self.start_auto_enforcement()
+        
+        # Warm up audio backend while the list is downloading
+        self.sound_manager.preload()
+        startup_timer.mark('audio_ready')
+    
+    def init_managers(self):
+        """Imports and creates the firewall backend, journal, history and hit/annotation sources"""
+        from firewall_backends import create_firewall_backend
+        from journal import TransactionJournal
+        from history import BlockHistory
+        from firewall_log import FirewallLogTailer
+        from flows import DropTimer
+        from prefix_db import PrefixDatabase
+        from enrichment import AnnotationCache, EntryAnnotator
+        
+        self.firewall_manager = create_firewall_backend(self.settings_manager)
+        self.firewall_manager.set_allowlist(self.allowlist_manager)
+        self.firewall_manager.load_status(self.block_status_manager.block_status, self.ip_manager.get_interval)
+        self.firewall_manager.set_call_time_estimates(*self.settings_manager.get_call_time_estimates())
+        self.action_planner = ActionPlanner(self.firewall_manager, self.rule_budget)
+        self.block_status_manager.history = BlockHistory(capacity=self.settings_manager.get_history_capacity())
+        self.transaction_journal = TransactionJournal()
+        self.firewall_log_tailer = FirewallLogTailer(self.settings_manager.get_firewall_log_path())
+        self.drop_timer = DropTimer()
+        self.prefix_db = PrefixDatabase()
+        self.annotator = EntryAnnotator(self.prefix_db, AnnotationCache())
+    
     def set_window_icon(self, icon_path):
         """Set window icon from resource path"""
         if os.path.exists(icon_path):
@@ -741,11 +893,11 @@ class IPBlockerApp(QMainWindow):
             self.setWindowIcon(icon)
         else:
             print(f"Icon not found at: {icon_path}")
-
+    
     def init_ui(self):
         """Initializes user interface"""
         self.setWindowTitle('CheatersBlocker by Victorch4')
-        self.setGeometry(100, 100, 950, 650)
+        self.setGeometry(100, 100, 1150, 650)
         
         # Central widget
         central_widget = QWidget()
@@ -755,19 +907,80 @@ class IPBlockerApp(QMainWindow):
         main_layout = QVBoxLayout(central_widget)
         main_layout.setSpacing(10)
         
-        # Table for IP addresses and ranges
-        main_layout.addWidget(QLabel('Loaded IP addresses and ranges:'))
+        # Table for IP addresses and ranges, with a search box that hides non-matching rows
+        table_header_layout = QHBoxLayout()
+        table_header_layout.addWidget(QLabel('Loaded IP addresses and ranges:'))
+        table_header_layout.addStretch()
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText('Search IP, range or prefix (Ctrl+F)')
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.setMinimumWidth(260)
+        self.search_box.textChanged.connect(self.apply_search)
+        self.search_box.returnPressed.connect(self.focus_search_result)
+        table_header_layout.addWidget(self.search_box)
+        self.search_result_label = QLabel('')
+        table_header_layout.addWidget(self.search_result_label)
+        main_layout.addLayout(table_header_layout)
+        
+        search_shortcut = QShortcut(QKeySequence(QKeySequence.StandardKey.Find), self)
+        search_shortcut.activated.connect(self.focus_search_box)
+        clear_search_shortcut = QShortcut(QKeySequence('Escape'), self.search_box)
+        clear_search_shortcut.setContext(Qt.ShortcutContext.WidgetShortcut)
+        clear_search_shortcut.activated.connect(self.search_box.clear)
         
         self.ip_table = QTableWidget()
-        self.ip_table.setColumnCount(5)
-        self.ip_table.setHorizontalHeaderLabels(['IP Address/Range', 'Type', 'Status', 'IN Traffic', 'OUT Traffic'])
+        self.ip_table.setColumnCount(10)
+        self.ip_table.setHorizontalHeaderLabels(['IP Address/Range', 'Type', 'Status', 'IN Traffic', 'OUT Traffic',
+                                                 'Hits', 'Last hit', 'Provider', 'Country', 'Source'])
         self.ip_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.ip_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
-        self.ip_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        # Several rows (Ctrl/Shift-click, Ctrl+A or the context menu) are handled as one batch
+        self.ip_table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.ip_table.itemSelectionChanged.connect(self.on_ip_selected)
+        self.ip_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.ip_table.customContextMenuRequested.connect(self.show_table_context_menu)
+        
+        # Provider/Country/Source columns are filled for visible rows only, after scrolling settles
+        self.annotation_timer = QTimer(self)
+        self.annotation_timer.setSingleShot(True)
+        self.annotation_timer.setInterval(50)
+        self.annotation_timer.timeout.connect(self.request_visible_annotations)
+        self.ip_table.verticalScrollBar().valueChanged.connect(self.annotation_timer.start)
         
         main_layout.addWidget(self.ip_table)
         
+        # Session peers discovered from captured game traffic
+        peers_frame = QGroupBox('Session peers')
+        peers_layout = QVBoxLayout()
+        
+        self.peer_table = QTableWidget()
+        self.peer_table.setColumnCount(6)
+        self.peer_table.setHorizontalHeaderLabels(['Peer IP', 'Packets', 'Packets/s', 'KB/s', 'Last seen', 'Status'])
+        self.peer_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.peer_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.peer_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.peer_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.peer_table.setMaximumHeight(140)
+        self.peer_table.itemSelectionChanged.connect(self.on_peer_selected)
+        peers_layout.addWidget(self.peer_table)
+        
+        peer_buttons_layout = QHBoxLayout()
+        self.live_capture_button = QPushButton('Start live capture')
+        self.live_capture_button.clicked.connect(self.toggle_live_capture)
+        peer_buttons_layout.addWidget(self.live_capture_button)
+        
+        self.open_pcap_button = QPushButton('Open .pcap file...')
+        self.open_pcap_button.clicked.connect(self.open_pcap_file)
+        peer_buttons_layout.addWidget(self.open_pcap_button)
+        peers_layout.addLayout(peer_buttons_layout)
+        
+        peers_frame.setLayout(peers_layout)
+        main_layout.addWidget(peers_frame)
+        
+        self.peer_refresh_timer = QTimer(self)
+        self.peer_refresh_timer.setInterval(1000)
+        self.peer_refresh_timer.timeout.connect(self.refresh_peer_table)
+        
         # Control buttons frame
         control_frame = QGroupBox('Traffic Blocking Control')
         control_layout = QVBoxLayout()
@@ -796,6 +1009,44 @@ class IPBlockerApp(QMainWindow):
         control_layout.addWidget(self.both_toggle)
         control_layout.addWidget(self.in_toggle)
         control_layout.addWidget(self.out_toggle)
+        
+        # Optional block duration; expired blocks are removed automatically
+        ttl_layout = QHBoxLayout()
+        ttl_layout.addWidget(QLabel('Block for:'))
+        self.block_ttl_combo = QComboBox()
+        for label, seconds in [('Permanently', 0), ('5 minutes', 300), ('30 minutes', 1800),
+                               ('2 hours', 7200), ('1 day', 86400), ('1 week', 604800)]:
+            self.block_ttl_combo.addItem(label, seconds)
+        ttl_layout.addWidget(self.block_ttl_combo)
+        ttl_layout.addStretch()
+        control_layout.addLayout(ttl_layout)
+        
+        # One timer for all timed blocks, always set to the earliest expiry
+        self.expiry_timer = QTimer(self)
+        self.expiry_timer.setSingleShot(True)
+        self.expiry_timer.timeout.connect(self.expire_timed_blocks)
+        
+        # Provider range expansion for single IPs
+        provider_layout = QHBoxLayout()
+        self.expand_range_button = QPushButton('Block provider range of selected IP')
+        self.expand_range_button.clicked.connect(self.expand_to_provider_range)
+        provider_layout.addWidget(self.expand_range_button)
+        
+        self.import_prefixes_button = QPushButton('Import prefix/ASN data...')
+        self.import_prefixes_button.clicked.connect(self.import_prefix_database)
+        provider_layout.addWidget(self.import_prefixes_button)
+        
+        self.allowlist_button = QPushButton('Allowlist...')
+        self.allowlist_button.setToolTip('IPs and ranges that stay reachable even inside blocked ranges')
+        self.allowlist_button.clicked.connect(self.show_allowlist_dialog)
+        provider_layout.addWidget(self.allowlist_button)
+        
+        self.history_button = QPushButton('Block history...')
+        self.history_button.setToolTip('How often and how long each entry was blocked, and entries never blocked')
+        self.history_button.clicked.connect(self.show_block_history_dialog)
+        provider_layout.addWidget(self.history_button)
+        control_layout.addLayout(provider_layout)
+        
         control_frame.setLayout(control_layout)
         
         main_layout.addWidget(control_frame)
@@ -822,6 +1073,37 @@ class IPBlockerApp(QMainWindow):
         self.global_block_checkbox.stateChanged.connect(self.on_global_block_checkbox_changed)
         settings_layout.addWidget(self.global_block_checkbox)
         
+        # Checkbox for automatic blocking of list entries seen in the peer feed
+        self.auto_block_checkbox = QCheckBox('Auto-block known cheaters')
+        self.auto_block_checkbox.setToolTip('Block list entries as soon as they appear among session peers')
+        settings_layout.addWidget(self.auto_block_checkbox)
+        
+        # Rule scope: firewall rules only apply to the game and/or UDP, so other traffic skips them
+        self.game_only_checkbox = QCheckBox('Game traffic only')
+        self.game_only_checkbox.setToolTip('Limit block rules to the game executable (detected or chosen)')
+        settings_layout.addWidget(self.game_only_checkbox)
+        
+        self.udp_only_checkbox = QCheckBox('UDP only')
+        self.udp_only_checkbox.setToolTip('Limit block rules to UDP, which carries the game sessions')
+        settings_layout.addWidget(self.udp_only_checkbox)
+        
+        # Checkbox for ending established sessions with blocked entries
+        self.terminate_flows_checkbox = QCheckBox('End open connections')
+        self.terminate_flows_checkbox.setToolTip('After a block, end connections that are already established '
+                                                 '(TCP on Windows, conntrack entries on Linux gateways)')
+        settings_layout.addWidget(self.terminate_flows_checkbox)
+        
+        # Checkbox for plan mode - runtime only, not persisted
+        self.plan_checkbox = QCheckBox('Plan only (dry run)')
+        self.plan_checkbox.setToolTip('Show the firewall operations and estimated time of F1/F2/F3 before running them')
+        settings_layout.addWidget(self.plan_checkbox)
+        
+        # Checkbox for profiling - runtime only, not persisted
+        self.profiling_checkbox = QCheckBox('Profile actions')
+        self.profiling_checkbox.setToolTip('Record a profile of each F1/F2/F3 action to a file next to settings.ini')
+        self.profiling_checkbox.stateChanged.connect(self.on_profiling_checkbox_changed)
+        settings_layout.addWidget(self.profiling_checkbox)
+        
         # Add stretch to align checkboxes
         settings_layout.addStretch()
         
@@ -876,8 +1158,8 @@ class IPBlockerApp(QMainWindow):
                                Q_ARG(int, key_id))
     
     @pyqtSlot(int)
-    def _process_hotkey(self, key_id):
-        """Processes hotkey in main thread"""
+    def _process_hotkey(self, key_id, confirm=True):
+        """Processes hotkey in main thread, returns the reply of perform_action()"""
         if not self.current_selected_ip:
             # Just show message in status bar
             self.status_bar.showMessage("Select an IP address or range in the table", 3000)
@@ -890,43 +1172,215 @@ class IPBlockerApp(QMainWindow):
         if key_id == 1:  # F1 - IN and OUT
             # If both are blocked, unblock both. Otherwise, block both.
             if current_status['in'] and current_status['out']:
-                self.perform_action('both', 'unblock')
+                return self.perform_action('both', 'unblock', confirm)
             else:
-                self.perform_action('both', 'block')
+                return self.perform_action('both', 'block', confirm)
                 
         elif key_id == 2:  # F2 - IN
             # Toggle IN state
             if current_status['in']:
-                self.perform_action('in', 'unblock')
+                return self.perform_action('in', 'unblock', confirm)
             else:
-                self.perform_action('in', 'block')
+                return self.perform_action('in', 'block', confirm)
                 
         elif key_id == 3:  # F3 - OUT
             # Toggle OUT state
             if current_status['out']:
-                self.perform_action('out', 'unblock')
+                return self.perform_action('out', 'unblock', confirm)
             else:
-                self.perform_action('out', 'block')
+                return self.perform_action('out', 'block', confirm)
     
-    def perform_action(self, direction, action):
-        """Performs block or unblock action for IP or IP range"""
+    def perform_action(self, direction, action, confirm=True):
+        """Performs block or unblock action, profiling it if enabled. Returns the reply of _perform_action()"""
+        if not self.profiling_manager.enabled:
+            return self._perform_action(direction, action, confirm)
+        
+        scope = 'global' if self.global_block_enabled else 'single'
+        label = f"{scope}_{action}_{direction}"
+        watch_threads = {self.hotkey_manager.thread_ident: 'hotkey'}
+        try:
+            reply, report_path, summary = self.profiling_manager.capture(
+                label, self._perform_action, direction, action, confirm, watch_threads=watch_threads)
+        except Exception as e:
+            self.status_bar.showMessage(f'Profiling failed: {e}')
+            return None
+        
+        if report_path:
+            self.status_bar.showMessage(f'{summary} (saved to {os.path.basename(report_path)})')
+        else:
+            self.status_bar.showMessage(summary)
+        return reply
+    
+    def _perform_action(self, direction, action, confirm=True):
+        """Performs block or unblock action for IP or IP range.
+        
+        confirm=False skips the plan dialog (control commands cannot answer it).
+        Returns a control reply (the entry status, or counts for several entries),
+        None if the plan was not confirmed."""
+        # In plan mode nothing runs until the plan is confirmed
+        if confirm and self.plan_checkbox.isChecked() and not self.confirm_action_plan(direction, action):
+            return None
+        
+        # Several selected rows take precedence over the global checkbox
+        selected_entries = self.get_selected_entries()
+        if len(selected_entries) > 1:
+            changed = len(self.perform_batch_action(selected_entries, direction, action))
+            return f"changed={changed} unchanged={len(selected_entries) - changed}"
+        
         # If global block is enabled, apply action to ALL loaded IPs
-        if self.global_block_enabled:
-            self.perform_global_action(direction, action)
-            return
+        # (session peers outside the list are always handled on their own)
+        if self.global_block_enabled and not self.is_manual_entry(self.current_selected_ip):
+            changed, unchanged, errors = self.perform_global_action(direction, action)
+            return f"global changed={changed} unchanged={unchanged} errors={errors}"
         
         # Original behavior - apply action only to selected IP
         ip_entry = self.current_selected_ip
         self.perform_single_action(ip_entry, direction, action)
+        
+        if self.is_manual_entry(ip_entry):
+            self.ensure_table_row(ip_entry)
+            self.refresh_peer_table()
+        from control import format_status
+        return format_status(self.ip_block_status[ip_entry])
+    
+    def build_action_plan(self, direction, action):
+        """Returns the RulePlan of an F1/F2/F3 action without touching the firewall"""
+        selected_entries = self.get_selected_entries()
+        if len(selected_entries) > 1:
+            entries = selected_entries
+            forced = tuple(entries) if action == 'block' else ()
+        elif self.global_block_enabled and not self.is_manual_entry(self.current_selected_ip):
+            entries = self.ip_manager.get_ips()
+            forced = ()
+        else:
+            entries = [self.current_selected_ip]
+            forced = tuple(entries) if action == 'block' else ()
+        return self.action_planner.plan(entries, direction, action, self.ip_block_status,
+                                        self.ip_manager.get_interval, self.firewall_log_tailer.hits, forced)
+    
+    def confirm_action_plan(self, direction, action):
+        """Shows the plan of an action, returns True if it should run"""
+        plan = self.build_action_plan(direction, action)
+        if plan.is_empty():
+            self.status_bar.showMessage(f'Plan: nothing to do ({plan.skipped} entries unchanged)')
+            return False
+        
+        direction_text = self._get_direction_text(direction)
+        box = QMessageBox(self)
+        box.setWindowTitle('Action plan')
+        box.setIcon(QMessageBox.Icon.Information)
+        box.setText(f"{'Block' if action == 'block' else 'Unblock'} {direction_text} traffic\n\n"
+                    f"Firewall calls: {len(plan.commands)} ({plan.count('add')} add, {plan.count('delete')} delete)\n"
+                    f"Rules touched: {len(plan.get_rule_names())}\n"
+                    f"Entries made dormant (rule budget): {len(plan.dormant)}\n"
+                    f"Entries unchanged: {plan.skipped}\n"
+                    f"Estimated time: {plan.estimated_seconds:.1f} s")
+        box.setDetailedText('\n'.join(f"{command_action} {rule_name}"
+                                       for command_action, rule_name, _ in plan.commands[:1000]))
+        run_button = box.addButton('Run', QMessageBox.ButtonRole.AcceptRole)
+        export_button = box.addButton('Export script...', QMessageBox.ButtonRole.ActionRole)
+        box.addButton(QMessageBox.StandardButton.Cancel)
+        box.exec()
+        
+        if box.clickedButton() == export_button:
+            path, _ = QFileDialog.getSaveFileName(self, 'Export plan', 'cheatersblocker_plan.cmd',
+                                                  'Batch script (*.cmd *.bat);;All files (*)')
+            if path:
+                try:
+                    plan.export_script(path)
+                    self.status_bar.showMessage(f'Plan exported to {path} ({len(plan.commands)} commands)')
+                except Exception as e:
+                    self.status_bar.showMessage(f'Failed to export plan: {e}')
+            return False
+        return box.clickedButton() == run_button
+    
+    def get_selected_entries(self):
+        """Returns entries of all selected table rows in table order"""
+        rows = sorted(index.row() for index in self.ip_table.selectionModel().selectedRows())
+        # Ctrl+A while searching selects hidden rows too; only the matches count
+        return [self.ip_table.item(row, 0).text() for row in rows if row not in self.hidden_rows]
+    
+    def perform_batch_action(self, entries, direction, action):
+        """Performs block or unblock for several entries with one firewall submission
+        and status write per chunk and one table refresh. Returns the changed entries"""
+        changed = []
+        started = time.time()
+        submitted = 0
+        changes = {entry: dict(self.ip_block_status[entry]) for entry in entries
+                   if self.action_planner.get_pending_directions(self.ip_block_status[entry], direction, action)}
+        transaction = self.transaction_journal.begin(action, direction, changes)
+        
+        # Each chunk is journaled as done once its rules and status are saved,
+        # so recovery after a crash only redoes the chunk in flight
+        from journal import iter_chunks
+        for chunk in iter_chunks(list(changes)):
+            chunk_changed = []
+            self.firewall_manager.begin_batch()
+            try:
+                for entry in chunk:
+                    status = self.ip_block_status[entry]
+                    pending = self.action_planner.get_pending_directions(status, direction, action)
+                    entry_direction = direction if len(pending) == 2 else pending[0]
+                    
+                    if action == 'block':
+                        self.wake_dormant_entry(entry, entry_direction)
+                        self.rule_budget.create_rule(entry, status, entry_direction, self.firewall_manager)
+                    else:
+                        self.firewall_manager.delete_rule(entry, entry_direction)
+                    for pending_direction in pending:
+                        status[pending_direction] = action == 'block'
+                    if action == 'block':
+                        self._apply_block_ttl(entry)
+                    self.block_status_manager.block_status[entry] = status
+                    chunk_changed.append(entry)
+            finally:
+                submitted += self.firewall_manager.submit_batch()
+            self.block_status_manager.save_status()
+            transaction.mark_done(chunk_changed)
+            changed.extend(chunk_changed)
+        
+        # Rule budget changes settle in one more submission
+        self.firewall_manager.begin_batch()
+        try:
+            self.enforce_rule_budget(forced=tuple(changed) if action == 'block' else (), save=False)
+        finally:
+            submitted += self.firewall_manager.submit_batch()
+        self.block_status_manager.save_status()
+        transaction.commit()
+        self.schedule_expiry_timer()
+        
+        # Repaint once after all rows changed
+        self.ip_table.setUpdatesEnabled(False)
+        for entry in changed:
+            self.update_table_status(entry, self.ip_block_status[entry])
+        self.ip_table.setUpdatesEnabled(True)
+        self.update_button_states()
+        
+        if changed:
+            self.play_sound_for_action(action, direction, is_global_action=True)
+        if changed and action == 'block':
+            self.after_block(changed, started)
+        self.block_status_manager.flush_history()
+        direction_text = self._get_direction_text(direction)
+        action_text = 'Blocked' if action == 'block' else 'Unblocked'
+        self.status_bar.showMessage(f'{action_text} {direction_text} traffic for {len(changed)} of {len(entries)} '
+                                    f'selected entries ({submitted} firewall commands)')
+        return changed
+    
+    def is_manual_entry(self, ip_entry):
+        """Checks if entry was added outside the loaded list (session peer)"""
+        return bool(ip_entry) and self.ip_block_status.get(ip_entry, {}).get('manual', False)
     
     def perform_single_action(self, ip_entry, direction, action):
         """Performs action for a single IP entry"""
         is_range = self.ip_manager.is_range(ip_entry)
+        started = time.time()
         
         try:
             if action == 'block':
-                # Blocking
-                self.firewall_manager.create_rule(ip_entry, direction)
+                # Blocking (over the rule budget the entry may only be marked dormant)
+                self.wake_dormant_entry(ip_entry, direction)
+                self.rule_budget.create_rule(ip_entry, self.ip_block_status[ip_entry], direction, self.firewall_manager)
                 
                 # Update local status
                 if direction == 'both':
@@ -936,6 +1390,7 @@ class IPBlockerApp(QMainWindow):
                     self.ip_block_status[ip_entry]['in'] = True
                 elif direction == 'out':
                     self.ip_block_status[ip_entry]['out'] = True
+                self._apply_block_ttl(ip_entry)
                 
                 # Update INI file
                 self.block_status_manager.update_status(ip_entry, self.ip_block_status[ip_entry])
@@ -950,6 +1405,10 @@ class IPBlockerApp(QMainWindow):
                 # Play appropriate sound (not a global action)
                 self.play_sound_for_action('block', direction, is_global_action=False)
                 
+                # Evidence for the list curators (memory only here, uploaded by a background thread)
+                self.report_manual_block(ip_entry, direction)
+                self.after_block([ip_entry], started)
+                
             else:  # unblock
                 # Unblocking
                 self.firewall_manager.delete_rule(ip_entry, direction)
@@ -976,6 +1435,10 @@ class IPBlockerApp(QMainWindow):
                 # Play appropriate sound (not a global action)
                 self.play_sound_for_action('unblock', direction, is_global_action=False)
             
+            # Keep active rules within the budget (the acted-on entry always gets its rules)
+            self.enforce_rule_budget(forced=(ip_entry,) if action == 'block' else ())
+            self.schedule_expiry_timer()
+            
             # Update display in table
             self.update_table_status(ip_entry, self.ip_block_status[ip_entry])
             
@@ -985,13 +1448,16 @@ class IPBlockerApp(QMainWindow):
         except Exception as e:
             error_msg = f'Failed to change blocking state: {str(e)}'
             self.status_bar.showMessage(error_msg)
+        self.block_status_manager.flush_history()
     
     def perform_global_action(self, direction, action):
-        """Performs block or unblock action for ALL loaded IPs and ranges"""
+        """Performs block or unblock action for ALL loaded IPs and ranges, returns (changed, unchanged, errors)"""
         all_entries = self.ip_manager.get_ips()
         total_entries = len(all_entries)
         processed = 0
+        changed = 0
         errors = 0
+        started = time.time()
         
         # Show processing message
         processing_msg = f"{'Blocking' if action == 'block' else 'Unblocking'} {direction} traffic for ALL {total_entries} IPs/ranges..."
@@ -1000,15 +1466,40 @@ class IPBlockerApp(QMainWindow):
         # Play sound ONCE for the entire global action
         self.play_sound_for_action(action, direction, is_global_action=True)
         
-        # Process each entry WITHOUT playing individual sounds
-        for ip_entry in all_entries:
-            try:
-                self.perform_single_action_silent(ip_entry, direction, action)
-                processed += 1
-                
-            except Exception as e:
-                errors += 1
-                print(f"Error processing {ip_entry}: {e}")
+        # Journal the intent so a crash mid-way is resumed item by item on the next start
+        changes = {entry: dict(self.ip_block_status[entry]) for entry in all_entries
+                   if self.action_planner.get_pending_directions(self.ip_block_status[entry], direction, action)}
+        transaction = self.transaction_journal.begin(action, direction, changes)
+        
+        # Process each entry WITHOUT playing individual sounds; status is written
+        # and journaled once per chunk instead of once per entry
+        from journal import iter_chunks
+        for chunk in iter_chunks(all_entries):
+            chunk_done = []
+            for ip_entry in chunk:
+                try:
+                    # Skip no-ops and only touch the directions that change
+                    pending = self.action_planner.get_pending_directions(self.ip_block_status[ip_entry], direction, action)
+                    if pending:
+                        self.perform_single_action_silent(ip_entry, direction if len(pending) == 2 else pending[0], action)
+                        chunk_done.append(ip_entry)
+                    processed += 1
+                    
+                except Exception as e:
+                    errors += 1
+                    print(f"Error processing {ip_entry}: {e}")
+            if chunk_done:
+                self.block_status_manager.save_status()
+                transaction.mark_done(chunk_done)
+                changed += len(chunk_done)
+        
+        # Over the rule budget only the entries picked by the eviction policy keep rules
+        self.enforce_rule_budget()
+        self.schedule_expiry_timer()
+        transaction.commit()
+        if action == 'block':
+            self.after_block(list(changes), started)
+        self.block_status_manager.flush_history()
         
         # Show completion message
         direction_text = self._get_direction_text(direction)
@@ -1017,13 +1508,15 @@ class IPBlockerApp(QMainWindow):
         if errors > 0:
             result_msg += f" ({errors} errors)"
         self.status_bar.showMessage(result_msg)
+        return changed, total_entries - changed - errors, errors
     
     def perform_single_action_silent(self, ip_entry, direction, action):
-        """Performs action for a single IP entry without playing sound"""
+        """Performs action for a single IP entry without playing sound (the caller saves the INI file)"""
         try:
             if action == 'block':
-                # Blocking
-                self.firewall_manager.create_rule(ip_entry, direction)
+                # Blocking (over the rule budget the entry may only be marked dormant)
+                self.wake_dormant_entry(ip_entry, direction)
+                self.rule_budget.create_rule(ip_entry, self.ip_block_status[ip_entry], direction, self.firewall_manager)
                 
                 # Update local status
                 if direction == 'both':
@@ -1033,9 +1526,10 @@ class IPBlockerApp(QMainWindow):
                     self.ip_block_status[ip_entry]['in'] = True
                 elif direction == 'out':
                     self.ip_block_status[ip_entry]['out'] = True
+                self._apply_block_ttl(ip_entry)
                 
-                # Update INI file
-                self.block_status_manager.update_status(ip_entry, self.ip_block_status[ip_entry])
+                # Saved by the caller with the rest of the chunk
+                self.block_status_manager.block_status[ip_entry] = self.ip_block_status[ip_entry]
                 
             else:  # unblock
                 # Unblocking
@@ -1050,8 +1544,8 @@ class IPBlockerApp(QMainWindow):
                 elif direction == 'out':
                     self.ip_block_status[ip_entry]['out'] = False
                 
-                # Update INI file
-                self.block_status_manager.update_status(ip_entry, self.ip_block_status[ip_entry])
+                # Saved by the caller with the rest of the chunk
+                self.block_status_manager.block_status[ip_entry] = self.ip_block_status[ip_entry]
             
             # Update display in table
             self.update_table_status(ip_entry, self.ip_block_status[ip_entry])
@@ -1070,10 +1564,37 @@ class IPBlockerApp(QMainWindow):
         if orphaned_ips:
             QTimer.singleShot(100, lambda: self._remove_orphaned_rules(orphaned_ips))
         
+        # Bulk operations cut short by a crash are finished or undone item by item.
+        # With a clean, checkpointed journal the persistent rules already match, so nothing is
+        # re-applied; drift checks must be on to catch rules changed outside the app meanwhile.
+        drift_checks = self.settings_manager.get_drift_settings()[0] > 0
+        reapply = not (self.firewall_manager.persistent and drift_checks and self.transaction_journal.is_checkpointed())
+        policy = self.settings_manager.get_journal_recovery()
+        transactions, recovered = self.transaction_journal.recover(
+            self.block_status_manager.block_status, self.firewall_manager, policy)
+        if transactions:
+            self.block_status_manager.save_status()
+            self.block_status_manager.flush_history()
+            self.status_bar.showMessage(f'Recovered {len(transactions)} interrupted operations '
+                                        f'({len(recovered)} entries, {policy})')
+        
+        # Settle which blocked entries fit the rule budget before rules are applied
+        for ip in current_ips:
+            self.ip_block_status[ip] = self.block_status_manager.get_status(ip)
+        self.expire_timed_blocks()  # Blocks that ran out while the app was closed
+        activated = set(self.enforce_rule_budget())
+        
+        # Rules created with another program/protocol scope are rewritten in one batch
+        rewritten = self.apply_rule_scope()
+        
         # Apply blocking from INI file to current IPs
         for ip in current_ips:
-            status = self.block_status_manager.get_status(ip)
-            self.ip_block_status[ip] = status
+            status = self.ip_block_status[ip]
+            
+            # Dormant entries have no rules; activated ones got theirs from the budget
+            if status.get('dormant') or ip in activated or not reapply or rewritten:
+                self.update_table_status(ip, status)
+                continue
             
             # Apply firewall rules based on status (asynchronously to avoid UI freeze)
             if status['in']:
@@ -1084,6 +1605,9 @@ class IPBlockerApp(QMainWindow):
             
             # Update table display
             self.update_table_status(ip, status)
+        
+        if reapply:
+            self.transaction_journal.checkpoint()
     
     def _remove_orphaned_rules(self, orphaned_ips):
         """Asynchronously removes firewall rules for orphaned IPs"""
@@ -1117,94 +1641,352 @@ class IPBlockerApp(QMainWindow):
             self.in_toggle.set_state(status['in'])
             self.out_toggle.set_state(status['out'])
     
+    def load_snapshot(self):
+        """Fills the table from the binary snapshot before the download finishes"""
+        if not self.blocklist_snapshot.load():
+            return False
+        
+        try:
+            self.ip_manager.load_from_snapshot(self.blocklist_snapshot)
+        finally:
+            self.blocklist_snapshot.close()
+        
+        all_entries = self.ip_manager.get_ips()
+        self.populate_table(all_entries)
+        startup_timer.mark('snapshot_loaded')
+        self.status_bar.showMessage(f'Loaded {len(all_entries)} entries from snapshot, updating list...')
+        return True
+    
     def load_ip_addresses(self):
-        """Loads IP addresses and ranges from URL on startup"""
-        self.status_bar.showMessage('Loading IP addresses and ranges...')
+        """Starts loading IP addresses and ranges from URL in background"""
+        if not self.table_entries:
+            self.status_bar.showMessage('Loading IP addresses and ranges...')
         
-        url = "https://pastebin.com/raw/5M4Ciz6m"
-        success, result = self.ip_manager.load_from_url(url)
+        self.blocklist_loader = BlocklistLoader(DEFAULT_LIST_URL)
+        self.blocklist_loader.loaded_signal.connect(self.on_ip_addresses_loaded)
+        self.blocklist_loader.start()
+    
+    def on_ip_addresses_loaded(self, success, result):
+        """Fills the table with loaded entries and syncs the firewall"""
+        startup_timer.mark('list_loaded')
         
         if success:
-            all_entries = result
-            self.ip_table.setRowCount(len(all_entries))
+            self.ip_manager = self.blocklist_loader.ip_manager
+            self.blocklist_snapshot.save(self.ip_manager)
             
-            for i, entry in enumerate(all_entries):
-                # Get status from block status manager (loaded from INI)
-                status = self.block_status_manager.get_status(entry)
-                self.ip_block_status[entry] = status
-                
-                # Entry cell
-                entry_item = QTableWidgetItem(entry)
-                entry_item.setFlags(entry_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                self.ip_table.setItem(i, 0, entry_item)
-                
-                # Type cell (IP or Range)
-                if self.ip_manager.is_range(entry):
-                    type_item = QTableWidgetItem('Range')
-                    type_item.setForeground(QBrush(QColor(255, 140, 0)))  # Orange for range
-                else:
-                    type_item = QTableWidgetItem('Single IP')
-                    type_item.setForeground(QBrush(QColor(0, 128, 0)))  # Green for single IP
-                type_item.setFlags(type_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                self.ip_table.setItem(i, 1, type_item)
-                
-                # Status cell (will be updated by update_table_status)
-                status_item = QTableWidgetItem('Not blocked')
-                status_item.setFlags(status_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                self.ip_table.setItem(i, 2, status_item)
-                
-                # IN/OUT status cells
-                in_text = 'Blocked' if status['in'] else 'Unblocked'
-                out_text = 'Blocked' if status['out'] else 'Unblocked'
-                
-                in_status = QTableWidgetItem(in_text)
-                in_status.setFlags(in_status.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                self.ip_table.setItem(i, 3, in_status)
-                
-                out_status = QTableWidgetItem(out_text)
-                out_status.setFlags(out_status.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                self.ip_table.setItem(i, 4, out_status)
-                
-                # Update overall status
-                self.update_table_status(entry, status)
+            all_entries = result
+            if all_entries != self.table_entries:
+                self.populate_table(all_entries)
             
-            self.status_bar.showMessage(f'Loaded {len(all_entries)} entries ({len(self.ip_manager.ip_addresses)} IPs, {len(self.ip_manager.ip_ranges)} ranges)')
+            loaded_msg = f'Loaded {len(all_entries)} entries ({len(self.ip_manager.ip_addresses)} IPs, {len(self.ip_manager.ip_ranges)} ranges)'
+            if self.ip_manager.invalid_lines:
+                loaded_msg += f', skipped {len(self.ip_manager.invalid_lines)} invalid lines'
+            if self.ip_manager.load_message:
+                loaded_msg += f' - {self.ip_manager.load_message}'
+            self.status_bar.showMessage(loaded_msg)
             
-            if self.ip_table.rowCount() > 0:
-                self.ip_table.selectRow(0)
+        elif self.table_entries:
+            # Keep working with the snapshot when the list can't be downloaded
+            self.status_bar.showMessage(f'Using saved snapshot ({len(self.table_entries)} entries). {result}')
             
         else:
             error_msg = result
             QMessageBox.critical(self, 'Loading Error', 
                                 f'Failed to load IP addresses and ranges:\n{error_msg}')
             self.status_bar.showMessage('Loading error')
+        
+        self.sync_block_status_with_firewall()
+        startup_timer.mark('firewall_sync')
+        
+        self.start_firewall_log_tailer()
+        self.start_drift_watcher()
+        self.start_control_server()
+        self.start_report_uploader()
+        startup_timer.report()
+    
+    def populate_table(self, all_entries):
+        """Rebuilds table rows for all entries, keeping the selection if possible"""
+        previous_selection = self.current_selected_ip
+        self.table_entries = list(all_entries)
+        
+        # Session peers blocked earlier are shown after the list entries
+        list_entries = set(self.table_entries)
+        manual_entries = [ip for ip in self.block_status_manager.get_manual_ips() if ip not in list_entries]
+        rows = self.table_entries + manual_entries
+        
+        self.table_rows = {}
+        self.show_hidden_rows()
+        self.ip_table.setRowCount(len(rows))
+        
+        for row, entry in enumerate(rows):
+            self._fill_table_row(row, entry)
+        self.search_index.build(rows, self.ip_manager.get_interval)
+        self.annotation_timer.start()
+        self.update_enforcement_entries()
+        if self.search_box.text().strip():
+            self.apply_search(self.search_box.text())
+        
+        if previous_selection in rows:
+            self.ip_table.selectRow(rows.index(previous_selection))
+        elif self.ip_table.rowCount() > 0:
+            self.ip_table.selectRow(0)
+    
+    def ensure_table_row(self, entry):
+        """Appends a row for entry if it is not in the table yet"""
+        if entry in self.table_rows:
+            return
+        row = self.ip_table.rowCount()
+        self.ip_table.setRowCount(row + 1)
+        self._fill_table_row(row, entry)
+        self.search_index.add(entry, self.ip_manager.get_interval(entry))
+        if self.search_box.text().strip():
+            self.apply_search(self.search_box.text())
+        self.update_firewall_log_entries()
+        self.annotation_timer.start()
+        self.update_enforcement_entries()
+    
+    def _fill_table_row(self, row, entry):
+        """Creates cells of one table row"""
+        # Get status from block status manager (loaded from INI)
+        status = self.block_status_manager.get_status(entry)
+        self.ip_block_status[entry] = status
+        self.table_rows[entry] = row
+        self.expiry_queue.schedule(entry)
+        
+        # Entry cell
+        entry_item = QTableWidgetItem(entry)
+        entry_item.setFlags(entry_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.ip_table.setItem(row, 0, entry_item)
+        
+        # Type cell (IP, Range or Session peer)
+        if status.get('manual'):
+            type_item = QTableWidgetItem('Session peer')
+            type_item.setForeground(QBrush(QColor(0, 120, 215)))  # Blue for session peer
+        elif self.ip_manager.is_range(entry):
+            type_item = QTableWidgetItem('Range')
+            type_item.setForeground(QBrush(QColor(255, 140, 0)))  # Orange for range
+        else:
+            type_item = QTableWidgetItem('Single IP')
+            type_item.setForeground(QBrush(QColor(0, 128, 0)))  # Green for single IP
+        type_item.setFlags(type_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.ip_table.setItem(row, 1, type_item)
+        
+        # Status cell
+        status_item = QTableWidgetItem(self._get_block_text(status, entry))
+        status_item.setFlags(status_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.ip_table.setItem(row, 2, status_item)
+        
+        # IN/OUT status cells
+        in_text = 'Blocked' if status['in'] else 'Unblocked'
+        out_text = 'Blocked' if status['out'] else 'Unblocked'
+        
+        in_status = QTableWidgetItem(in_text)
+        in_status.setFlags(in_status.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.ip_table.setItem(row, 3, in_status)
+        
+        out_status = QTableWidgetItem(out_text)
+        out_status.setFlags(out_status.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.ip_table.setItem(row, 4, out_status)
+        
+        # Dropped packet counters from the firewall log
+        hit_count, last_hit = self.firewall_log_tailer.get_hits(entry)
+        for column, value in ((5, str(hit_count)), (6, last_hit)):
+            hit_item = QTableWidgetItem(value)
+            hit_item.setFlags(hit_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.ip_table.setItem(row, column, hit_item)
+        
+        # Provider/Country/Source: cached values now, the rest once the row becomes visible
+        interval = self.ip_manager.get_interval(entry)
+        annotation = self.annotator.get_cached(interval, status.get('manual')) if interval else None
+        for column, value in zip((7, 8, 9), annotation or ('', '', '')):
+            annotation_item = QTableWidgetItem(value)
+            annotation_item.setFlags(annotation_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.ip_table.setItem(row, column, annotation_item)
+    
+    def _get_block_text(self, status, entry=None):
+        """Returns Status column text (dormant entries are blocked but have no rules)"""
+        if status['in'] and status['out']:
+            block_text = 'Fully blocked'
+        elif status['in'] or status['out']:
+            block_text = 'Partially blocked'
+        else:
+            return 'Not blocked'
+        if status.get('dormant'):
+            block_text += ' (dormant)'
+        elif entry in self.drifted_entries:
+            block_text += ' (rule missing)'
+        if status.get('expires_at'):
+            expires_at = status['expires_at']
+            time_format = '%H:%M' if expires_at - time.time() < 86400 else '%Y-%m-%d %H:%M'
+            block_text += f" (until {time.strftime(time_format, time.localtime(expires_at))})"
+        return block_text
     
     def update_table_status(self, entry, status):
         """Updates status in table for specific IP or range"""
+        row = self.table_rows.get(entry)
+        if row is None:
+            return
+        
+        # Update overall status
+        self.ip_table.item(row, 2).setText(self._get_block_text(status, entry))
+        
+        # Update IN/OUT statuses
+        in_text = 'Blocked' if status['in'] else 'Unblocked'
+        out_text = 'Blocked' if status['out'] else 'Unblocked'
+        
+        self.ip_table.item(row, 3).setText(in_text)
+        self.ip_table.item(row, 4).setText(out_text)
+        
+        # Saved status changed: next drift check compares even if the rules look the same
+        if self.drift_detector is not None:
+            self.drift_detector.reset()
+        
+        # Manually unblocked entries can be enforced again after the debounce
+        if self.policy_engine is not None:
+            self.policy_engine.set_blocked(entry, self._is_enforced(status))
+    
+    def start_firewall_log_tailer(self):
+        """Starts counting dropped packets per entry from the firewall log"""
+        if not self.settings_manager.get_firewall_log_enabled():
+            return
+        
+        # Windows does not log dropped packets by default
+        if not os.path.exists(self.firewall_log_tailer.log_path):
+            self.firewall_manager.enable_drop_logging()
+        
+        self.update_firewall_log_entries()
+        
+        if self.firewall_log_thread is None:
+            self.firewall_log_thread = FirewallLogThread(self.firewall_log_tailer)
+            self.firewall_log_thread.hits_signal.connect(self.on_firewall_hits)
+            self.firewall_log_thread.start()
+    
+    def update_firewall_log_entries(self):
+        """Gives the log tailer the intervals of all table entries"""
+        entry_intervals = {}
+        for entry in self.table_rows:
+            interval = self.ip_manager.get_interval(entry)
+            if interval is not None:
+                entry_intervals[entry] = interval
+        self.firewall_log_tailer.set_entries(entry_intervals)
+    
+    def on_firewall_hits(self, changed):
+        """Updates Hits/Last hit columns for entries with new drops"""
+        from firewall_log import parse_log_time
+        for entry, (hit_count, last_hit) in changed.items():
+            row = self.table_rows.get(entry)
+            if row is None:
+                continue
+            self.ip_table.item(row, 5).setText(str(hit_count))
+            self.ip_table.item(row, 6).setText(last_hit)
+            
+            latency = self.drop_timer.observe(entry, parse_log_time(last_hit), resolution=1.0)
+            if latency is not None:
+                stats = self.drop_timer.get_stats()
+                self.status_bar.showMessage(f'First drop for {entry} {latency:.0f}s after the block '
+                                            f'(median {stats["median"]:.0f}s over {stats["measured"]} blocks)', 5000)
+    
+    def after_block(self, entries, started):
+        """Times the first drop of just blocked entries and, if enabled, ends their open connections"""
+        # Dormant entries (over the rule budget) have no rules yet
+        entries = [entry for entry in entries if not self.ip_block_status.get(entry, {}).get('dormant')]
+        if not entries:
+            return
+        self.drop_timer.start(entries, started)
+        if self.settings_manager.get_terminate_flows():
+            # After the sound and status message, so the hotkey path does not wait for the connection table
+            QTimer.singleShot(0, lambda: self.terminate_flows(entries))
+    
+    def terminate_flows(self, entries):
+        """Ends established connections of just blocked entries"""
+        started = time.perf_counter()
+        try:
+            closed = self.firewall_manager.terminate_flows(entries)
+        except Exception as e:
+            print(f"Error ending connections: {e}")
+            return
+        if closed:
+            self.status_bar.showMessage(f'Ended {closed} open connections of blocked entries '
+                                        f'in {(time.perf_counter() - started) * 1000:.0f} ms', 5000)
+    
+    def start_annotation_thread(self):
+        """Starts the background worker for Provider/Country/Source columns"""
+        if self.annotation_thread is None:
+            self.annotation_thread = AnnotationThread(self.annotator)
+            self.annotation_thread.annotated_signal.connect(self.on_annotations_ready)
+            self.annotation_thread.start()
+        self.annotation_timer.start()
+    
+    def request_visible_annotations(self):
+        """Queues visible rows plus a prefetch window that are not annotated yet"""
+        row_count = self.ip_table.rowCount()
+        if self.annotation_thread is None or not row_count:
+            return
+        
+        first_row = self.ip_table.rowAt(0)
+        last_row = self.ip_table.rowAt(self.ip_table.viewport().height() - 1)
+        first_row = max(first_row if first_row >= 0 else 0, 0)
+        last_row = last_row if last_row >= 0 else row_count - 1
+        
+        items = []
+        for row in range(max(first_row - self.annotation_prefetch, 0),
+                         min(last_row + self.annotation_prefetch, row_count - 1) + 1):
+            entry_item = self.ip_table.item(row, 0)
+            source_item = self.ip_table.item(row, 9)
+            if entry_item is None or source_item is None or source_item.text():
+                continue
+            
+            entry = entry_item.text()
+            interval = self.ip_manager.get_interval(entry)
+            if interval is None:
+                continue
+            manual = self.ip_block_status.get(entry, {}).get('manual', False)
+            
+            # Entries already in the cache are filled right away
+            annotation = self.annotator.get_cached(interval, manual)
+            if annotation is not None:
+                self._set_annotation_cells(row, annotation)
+            else:
+                items.append((entry, interval, manual))
+        
+        if items:
+            self.annotation_thread.request(items)
+    
+    def on_annotations_ready(self, results):
+        """Fills Provider/Country/Source cells for an annotated chunk"""
+        for entry, annotation in results.items():
+            row = self.table_rows.get(entry)
+            if row is not None:
+                self._set_annotation_cells(row, annotation)
+    
+    def _set_annotation_cells(self, row, annotation):
+        """Writes (provider, country, source) into a table row"""
+        for column, value in zip((7, 8, 9), annotation):
+            item = self.ip_table.item(row, column)
+            if item is not None:
+                item.setText(value)
+    
+    def clear_annotations(self):
+        """Forgets cached annotations and re-annotates visible rows"""
+        self.annotator.cache.clear()
         for row in range(self.ip_table.rowCount()):
-            if self.ip_table.item(row, 0).text() == entry:
-                # Update overall status
-                if status['in'] or status['out']:
-                    block_text = 'Partially blocked'
-                    if status['in'] and status['out']:
-                        block_text = 'Fully blocked'
-                    self.ip_table.item(row, 2).setText(block_text)
-                else:
-                    self.ip_table.item(row, 2).setText('Not blocked')
-                
-                # Update IN/OUT statuses
-                in_text = 'Blocked' if status['in'] else 'Unblocked'
-                out_text = 'Blocked' if status['out'] else 'Unblocked'
-                
-                self.ip_table.item(row, 3).setText(in_text)
-                self.ip_table.item(row, 4).setText(out_text)
-                break
+            self._set_annotation_cells(row, ('', '', ''))
+        self.annotation_timer.start()
     
     def on_ip_selected(self):
         """Handler for IP address or range selection in table"""
-        selected_items = self.ip_table.selectedItems()
-        if selected_items:
-            self.current_selected_ip = selected_items[0].text()
+        selected_rows = self.ip_table.selectionModel().selectedRows()
+        if selected_rows:
+            # The current row drives the buttons, the whole selection is acted on
+            row = self.ip_table.currentRow()
+            if not self.ip_table.selectionModel().isRowSelected(row, QModelIndex()):
+                row = selected_rows[0].row()
+            self.current_selected_ip = self.ip_table.item(row, 0).text()
+            
+            # Only one table drives the selection
+            self.peer_table.blockSignals(True)
+            self.peer_table.clearSelection()
+            self.peer_table.blockSignals(False)
             
             # Show range info if it's a range
             if self.ip_manager.is_range(self.current_selected_ip):
@@ -1222,18 +2004,683 @@ class IPBlockerApp(QMainWindow):
             # Update button states based on current entry status
             self.update_button_states()
             
-            if self.ip_manager.is_range(self.current_selected_ip):
-                self.status_bar.showMessage(f'Selected IP range: {self.current_selected_ip}')
+            # Block statistics are kept up to date per event, so this is a dictionary lookup
+            from history import format_duration
+            stats = self.block_status_manager.history.get_stats(self.current_selected_ip)
+            history_text = f" (blocked {stats['blocks']}x, {format_duration(stats['blocked_seconds'])} total)" if stats else ''
+            if len(selected_rows) > 1:
+                self.status_bar.showMessage(f'Selected {len(selected_rows)} entries')
+            elif self.ip_manager.is_range(self.current_selected_ip):
+                self.status_bar.showMessage(f'Selected IP range: {self.current_selected_ip}{history_text}')
             else:
-                self.status_bar.showMessage(f'Selected IP: {self.current_selected_ip}')
+                self.status_bar.showMessage(f'Selected IP: {self.current_selected_ip}{history_text}')
         else:
             self.current_selected_ip = None
         
         self.update_buttons_state()
     
+    def on_peer_selected(self):
+        """Handler for session peer selection"""
+        selected_items = self.peer_table.selectedItems()
+        if not selected_items:
+            return
+        
+        peer_ip = selected_items[0].text()
+        
+        self.ip_table.blockSignals(True)
+        self.ip_table.clearSelection()
+        self.ip_table.blockSignals(False)
+        
+        # Peers outside the list get their own (manual) status entry
+        if peer_ip not in self.ip_block_status:
+            status = dict(self.block_status_manager.get_status(peer_ip))
+            status['manual'] = True
+            self.ip_block_status[peer_ip] = status
+        
+        self.current_selected_ip = peer_ip
+        self.update_button_states()
+        self.update_buttons_state()
+        self.status_bar.showMessage(f'Selected session peer: {peer_ip}')
+    
+    def toggle_live_capture(self):
+        """Starts or stops live capture of game traffic"""
+        if self.peer_capture_thread and self.peer_capture_thread.isRunning():
+            self.peer_capture_thread.stop()
+            return
+        
+        self.start_peer_capture(None)
+    
+    def open_pcap_file(self):
+        """Reads session peers from a saved .pcap file"""
+        path, _ = QFileDialog.getOpenFileName(self, 'Open packet capture', '',
+                                              'Packet captures (*.pcap *.cap);;All files (*)')
+        if not path:
+            return
+        
+        if self.peer_capture_thread and self.peer_capture_thread.isRunning():
+            self.peer_capture_thread.stop()
+            self.peer_capture_thread.wait(1000)
+        
+        self.start_peer_capture(path)
+    
+    def start_peer_capture(self, pcap_path):
+        """Starts peer discovery from a file or live traffic"""
+        from peer_discovery import PeerDiscoveryEngine
+        from enforcement import QueuePeerFeed
+        on_new_peer = self.enforcement_feed.put if isinstance(self.enforcement_feed, QueuePeerFeed) else None
+        self.peer_engine = PeerDiscoveryEngine(ports=self.settings_manager.get_peer_ports(), on_new_peer=on_new_peer)
+        self.peer_capture_live = pcap_path is None
+        
+        self.peer_capture_thread = PeerCaptureThread(self.peer_engine, pcap_path)
+        self.peer_capture_thread.finished_signal.connect(self.on_peer_capture_finished)
+        self.peer_capture_thread.start()
+        self.peer_refresh_timer.start()
+        
+        if self.peer_capture_live:
+            self.live_capture_button.setText('Stop live capture')
+            self.status_bar.showMessage('Live capture started')
+        else:
+            self.status_bar.showMessage(f'Reading {os.path.basename(pcap_path)}...')
+    
+    def on_peer_capture_finished(self, message):
+        """Handler for capture thread exit"""
+        self.live_capture_button.setText('Start live capture')
+        self.refresh_peer_table()
+        self.status_bar.showMessage(message)
+    
+    def refresh_peer_table(self):
+        """Shows the most active session peers"""
+        if not self.peer_engine:
+            return
+        
+        now = time.time() if self.peer_capture_live else None
+        peers = self.peer_engine.tracker.get_active_peers(now=now, limit=50)
+        
+        self.peer_table.blockSignals(True)
+        self.peer_table.setRowCount(len(peers))
+        selected_row = None
+        for row, (address, packets, size, packet_rate, byte_rate, last_seen) in enumerate(peers):
+            status = self.ip_block_status.get(address, self.block_status_manager.get_status(address))
+            if status['in'] and status['out']:
+                status_text = 'Fully blocked'
+            elif status['in'] or status['out']:
+                status_text = 'Partially blocked'
+            else:
+                status_text = 'Not blocked'
+            
+            values = [address, str(packets), f'{packet_rate:.1f}', f'{byte_rate / 1024:.1f}',
+                      time.strftime('%H:%M:%S', time.localtime(last_seen)), status_text]
+            for column, value in enumerate(values):
+                self.peer_table.setItem(row, column, QTableWidgetItem(value))
+            
+            if address == self.current_selected_ip:
+                selected_row = row
+        
+        if selected_row is not None:
+            self.peer_table.selectRow(selected_row)
+        self.peer_table.blockSignals(False)
+    
+    def expand_to_provider_range(self):
+        """Proposes blocking the provider prefix that contains the selected single IP"""
+        ip_entry = self.current_selected_ip
+        if not ip_entry or self.ip_manager.is_range(ip_entry):
+            self.status_bar.showMessage('Select a single IP to expand it to its provider range', 3000)
+            return
+        if not self.prefix_db.is_loaded():
+            QMessageBox.information(self, 'Provider range', 'Import a prefix/ASN dataset first.')
+            return
+        
+        provider = self.ip_manager.get_provider_range(ip_entry, self.prefix_db)
+        if provider is None:
+            self.status_bar.showMessage(f'No provider prefix found for {ip_entry}')
+            return
+        
+        range_entry = provider['entry']
+        total_ips = provider['end'] - provider['start'] + 1
+        answer = QMessageBox.question(
+            self, 'Provider range',
+            f"{ip_entry} belongs to AS{provider['asn']} {provider['name']} ({provider['country'] or '??'}).\n\n"
+            f"Block the whole range {range_entry} ({total_ips} addresses)?")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        
+        # The provider range is tracked like a session peer: outside the list, kept across restarts
+        if range_entry not in self.ip_block_status:
+            status = dict(self.block_status_manager.get_status(range_entry))
+            status['manual'] = True
+            self.ip_block_status[range_entry] = status
+        
+        self.perform_single_action(range_entry, 'both', 'block')
+        self.ensure_table_row(range_entry)
+        self.ip_table.selectRow(self.table_rows[range_entry])
+    
+    def import_prefix_database(self):
+        """Imports a TSV/CSV IP-to-prefix/ASN dataset"""
+        path, _ = QFileDialog.getOpenFileName(self, 'Import prefix/ASN data', '',
+                                              'Prefix datasets (*.tsv *.csv *.txt);;All files (*)')
+        if not path:
+            return
+        
+        # The index file is replaced, so unmap it until the import is done
+        self.prefix_db.close()
+        self.import_prefixes_button.setEnabled(False)
+        self.status_bar.showMessage(f'Importing {os.path.basename(path)}...')
+        self.prefix_import_thread = PrefixImportThread(path, self.prefix_db.path)
+        self.prefix_import_thread.finished_signal.connect(self.on_prefix_import_finished)
+        self.prefix_import_thread.start()
+    
+    def on_prefix_import_finished(self, success, message):
+        """Handler for prefix import completion"""
+        self.import_prefixes_button.setEnabled(True)
+        self.prefix_db.load()
+        if success:
+            self.clear_annotations()
+        self.status_bar.showMessage(message)
+        self.update_buttons_state()
+    
+    def start_auto_enforcement(self):
+        """Starts matching the peer feed against the loaded list"""
+        if self.enforcement_thread is not None:
+            return
+        from enforcement import EnforcementPolicy, PolicyEngine, QueuePeerFeed, create_peer_feed
+        
+        debounce, max_per_minute = self.settings_manager.get_auto_block_limits()
+        policy = EnforcementPolicy(self.settings_manager.get_auto_block_direction(), debounce, max_per_minute, 60.0)
+        # Rules are created by the GUI thread, which owns the firewall backend (see EnforcementThread)
+        self.policy_engine = PolicyEngine(policy, None)
+        self.update_enforcement_entries()
+        
+        # Session peers from the capture panel are the default feed
+        self.enforcement_feed = create_peer_feed(self.settings_manager.get_auto_block_feed())
+        if self.peer_engine is not None and isinstance(self.enforcement_feed, QueuePeerFeed):
+            self.peer_engine.tracker.on_new_peer = self.enforcement_feed.put
+        
+        self.enforcement_thread = EnforcementThread(self.enforcement_feed, self.policy_engine)
+        self.enforcement_thread.enforced_signal.connect(self.on_auto_enforced)
+        # The feed thread waits for each action, so sighting-to-rule latency includes it
+        self.enforcement_thread.apply_signal.connect(self.apply_auto_block, Qt.ConnectionType.BlockingQueuedConnection)
+        self.enforcement_thread.start()
+    
+    def stop_auto_enforcement(self):
+        """Stops automatic blocking"""
+        if self.enforcement_thread is not None:
+            self.enforcement_thread.stop()
+            self.enforcement_thread.wait(1000)
+        if self.peer_engine is not None:
+            self.peer_engine.tracker.on_new_peer = None
+        self.enforcement_thread = None
+        self.enforcement_feed = None
+        self.policy_engine = None
+    
+    def _is_enforced(self, status):
+        """Checks if status already covers the automatic block direction"""
+        from enforcement import covers_direction
+        return covers_direction(status, self.policy_engine.policy.direction) and not status.get('dormant')
+    
+    def update_enforcement_entries(self):
+        """Gives the policy engine the intervals of all table entries"""
+        if self.policy_engine is None:
+            return
+        entry_intervals = {}
+        blocked = []
+        for entry in self.table_rows:
+            interval = self.ip_manager.get_interval(entry)
+            if interval is not None:
+                entry_intervals[entry] = interval
+            if entry in self.ip_block_status and self._is_enforced(self.ip_block_status[entry]):
+                blocked.append(entry)
+        self.policy_engine.set_entries(entry_intervals, blocked)
+    
+    def apply_auto_block(self, request):
+        """Blocks an entry matched by the policy engine, like a batch of one entry"""
+        entry, direction, result = request
+        status = self.ip_block_status.get(entry)
+        if status is None:
+            result.append(False)
+            return
+        
+        if status.get('dormant') and not self.action_planner.get_pending_directions(status, direction, 'block'):
+            # A sighted dormant entry is needed again: only its rules are missing
+            self.wake_dormant_entry(entry, None)
+            self.enforce_rule_budget(forced=(entry,))
+            self.update_table_status(entry, status)
+            self.after_block([entry], time.time())
+            result.append(True)
+            return
+        result.append(bool(self.perform_batch_action([entry], direction, 'block')))
+    
+    def on_auto_enforced(self, entry, direction, ip, latency_ms):
+        """Shows a block applied by the policy engine"""
+        source = f' (seen as {ip})' if ip != entry else ''
+        self.status_bar.showMessage(f'Auto-blocked {entry}{source} in {latency_ms:.0f} ms')
+    
+    def on_terminate_flows_checkbox_changed(self, state):
+        """Handler for ending open connections after blocks"""
+        enabled = state == Qt.CheckState.Checked.value
+        self.settings_manager.set_terminate_flows(enabled)
+        if enabled:
+            self.status_bar.showMessage('Open connections of blocked entries are ended after each block.')
+        else:
+            self.status_bar.showMessage('Open connections are left to the firewall rules.')
+    
+    def on_auto_block_checkbox_changed(self, state):
+        """Handler for automatic blocking checkbox change"""
+        enabled = state == Qt.CheckState.Checked.value
+        self.settings_manager.set_auto_block_enabled(enabled)
+        
+        if enabled:
+            self.start_auto_enforcement()
+            self.status_bar.showMessage('Auto-block ENABLED. List entries seen in the peer feed are blocked automatically.')
+        else:
+            stats = self.policy_engine.get_stats() if self.policy_engine else {}
+            self.stop_auto_enforcement()
+            message = 'Auto-block disabled'
+            if stats.get('actions'):
+                message += (f". {stats['actions']} blocks, sighting to rule "
+                            f"avg {stats['latency_mean_ms']:.0f} ms, p95 {stats['latency_p95_ms']:.0f} ms")
+            self.status_bar.showMessage(message)
+    
+    def start_drift_watcher(self):
+        """Starts background checks that the firewall still matches the saved status"""
+        interval, cpu_percent, max_per_hour, _ = self.settings_manager.get_drift_settings()
+        # Drift checks list netsh rules
+        if interval <= 0 or self.drift_thread is not None or self.firewall_manager.name != 'netsh':
+            return
+        from drift import DriftDetector
+        self.drift_detector = DriftDetector()
+        self.drift_thread = DriftWatchThread(self.drift_detector, interval, cpu_percent, max_per_hour)
+        self.drift_thread.rules_signal.connect(self.on_firewall_rules_changed)
+        self.drift_thread.start()
+    
+    def start_control_server(self):
+        """Starts the local control socket if a port is configured"""
+        port = self.settings_manager.get_control_port()
+        if port <= 0 or self.control_thread is not None:
+            return
+        from control import ControlDispatcher, ControlServer, get_transport
+        
+        dispatcher = ControlDispatcher()
+        dispatcher.register('block', lambda args: self.control_action(args, 'block'))
+        dispatcher.register('unblock', lambda args: self.control_action(args, 'unblock'))
+        dispatcher.register('batch', self.control_batch)
+        dispatcher.register('key', self.control_key)
+        dispatcher.register('status', self.control_status)
+        
+        # Clients on TCP (Windows) must send the per-install token from settings.ini first
+        transport = get_transport(port, self.settings_manager.get_control_socket(),
+                                  self.settings_manager.get_control_token())
+        self.control_thread = ControlServerThread(ControlServer(dispatcher, **transport))
+        # Server thread waits for each batch, so replies always reflect the applied state
+        self.control_thread.command_signal.connect(self.on_control_batch, Qt.ConnectionType.BlockingQueuedConnection)
+        self.control_thread.start()
+    
+    def start_report_uploader(self):
+        """Starts uploading cheater reports if a collector URL is configured (opt-in)"""
+        url, batch_size, dedupe_hours = self.settings_manager.get_report_settings()
+        if not url or self.report_thread is not None:
+            return
+        from reports import ReportQueue
+        
+        self.report_queue = ReportQueue(url, batch_size=batch_size, dedupe_seconds=dedupe_hours * 3600)
+        self.report_thread = ReportUploadThread(self.report_queue)
+        self.report_thread.sent_signal.connect(self.on_reports_sent)
+        self.report_thread.start()
+    
+    def on_reports_sent(self, count):
+        """Shows that queued reports reached the collector"""
+        self.status_bar.showMessage(f'Sent {count} cheater reports to the list collector', 5000)
+    
+    def report_manual_block(self, ip_entry, direction):
+        """Queues a report for a blocked session peer (not on the list, single address)"""
+        if self.report_queue is None or self.ip_manager.is_range(ip_entry):
+            return
+        if not self.ip_block_status.get(ip_entry, {}).get('manual'):
+            return
+        self.report_queue.add(ip_entry, direction)
+    
+    def on_control_batch(self, request):
+        """Runs pipelined control commands on the GUI thread"""
+        dispatch_batch, lines, replies = request
+        replies.extend(dispatch_batch(lines))
+    
+    def _get_control_entry(self, text):
+        """Returns a table entry for a control command argument"""
+        parsed = parse_entry(text)
+        if parsed is None or parsed[0] not in self.ip_block_status:
+            raise ValueError(f"unknown entry {text}")
+        return parsed[0]
+    
+    def control_action(self, args, action):
+        """BLOCK/UNBLOCK [direction] [entry ...]: without entries acts like the hotkeys, minus the plan dialog"""
+        from control import format_status, split_direction
+        direction, entries = split_direction(args)
+        if not entries:
+            # Global mode acts on all entries, so it does not need a selected row
+            if not self.current_selected_ip and not self.global_block_enabled:
+                raise ValueError("no entry selected")
+            return self.perform_action(direction, action, confirm=False) or ''
+        
+        entries = [self._get_control_entry(entry) for entry in entries]
+        if len(entries) > 1:
+            return self.apply_control_batch(entries, direction, action)
+        self.perform_single_action(entries[0], direction, action)
+        return format_status(self.ip_block_status[entries[0]])
+    
+    def control_batch(self, args):
+        """BATCH block|unblock direction entry ..."""
+        from control import DIRECTIONS
+        if len(args) < 3 or args[0].lower() not in ['block', 'unblock'] or args[1].lower() not in DIRECTIONS:
+            raise ValueError("usage: BATCH block|unblock both|in|out ENTRY [ENTRY ...]")
+        entries = [self._get_control_entry(entry) for entry in args[2:]]
+        return self.apply_control_batch(entries, args[1].lower(), args[0].lower())
+    
+    def apply_control_batch(self, entries, direction, action):
+        """Applies an action to several entries as one batch"""
+        changed = len(self.perform_batch_action(entries, direction, action))
+        return f"changed={changed} unchanged={len(entries) - changed}"
+    
+    def control_key(self, args):
+        """KEY 1|2|3: same as pressing F1/F2/F3, minus the plan dialog"""
+        if len(args) != 1 or args[0] not in ['1', '2', '3']:
+            raise ValueError("usage: KEY 1|2|3")
+        # The selected row decides whether the key blocks or unblocks, also in global mode
+        if not self.current_selected_ip:
+            raise ValueError("no entry selected")
+        return self._process_hotkey(int(args[0]), confirm=False) or ''
+    
+    def control_status(self, args):
+        """STATUS [entry]: status of one entry or table totals"""
+        from control import format_status
+        if args:
+            return format_status(self.ip_block_status[self._get_control_entry(args[0])])
+        blocked = sum(1 for status in self.ip_block_status.values() if status['in'] or status['out'])
+        dormant = sum(1 for status in self.ip_block_status.values() if status.get('dormant'))
+        return (f"entries={len(self.ip_block_status)} blocked={blocked} dormant={dormant} "
+                f"selected={self.current_selected_ip or '-'}")
+    
+    def on_firewall_rules_changed(self, snapshot):
+        """Diffs changed firewall rules against the saved status and repairs or flags drift"""
+        rules, generation = snapshot
+        # A block or unblock since the listing would look like drift (and be "repaired" twice);
+        # the detector was reset by it, so the next poll lists the rules again
+        if not self.drift_detector.is_current(generation):
+            return
+        from drift import get_expected_rules, record_repair
+        
+        expected = get_expected_rules(self.ip_block_status, self.ip_manager.get_interval, self.allowlist_manager)
+        report = self.drift_detector.diff(rules, expected)
+        previously_drifted = self.drifted_entries
+        self.drifted_entries = set()
+        repair = None
+        
+        if report.has_drift():
+            if self.settings_manager.get_drift_settings()[3]:
+                # Recorded here, submitted as one netsh script by the watch thread in its next check slot
+                repair = self.firewall_manager.create_recorder()
+                record_repair(report, repair)
+                self.status_bar.showMessage(f'Firewall drift found, repairing: {report}')
+            else:
+                self.drifted_entries = report.get_entries()
+                self.status_bar.showMessage(f'Firewall drift detected: {report}')
+        
+        # Only labels change here, so the fingerprint of this check stays valid
+        fingerprint = self.drift_detector.get_last_fingerprint()
+        for entry in previously_drifted | self.drifted_entries:
+            if entry in self.ip_block_status:
+                self.update_table_status(entry, self.ip_block_status[entry])
+        self.drift_detector.set_last_fingerprint(fingerprint)
+        
+        # Queued last: the repair clears the fingerprint once submitted, so the check after it diffs again
+        if repair is not None:
+            self.drift_detector.queue_repair(repair, generation)
+    
+    def _apply_block_ttl(self, entry):
+        """Sets or clears the expiry time of a block from the 'Block for' choice"""
+        status = self.ip_block_status[entry]
+        ttl = self.block_ttl_combo.currentData()
+        if ttl:
+            status['expires_at'] = int(time.time()) + ttl
+            self.expiry_queue.schedule(entry)
+        else:
+            status.pop('expires_at', None)
+    
+    def schedule_expiry_timer(self):
+        """Points the expiry timer at the earliest timed block"""
+        next_expiry = self.expiry_queue.next_expiry()
+        if next_expiry is None:
+            self.expiry_timer.stop()
+            return
+        
+        # Capped so long waits re-check the clock (sleep, clock changes)
+        delay = min(max(next_expiry - time.time(), 0), 3600)
+        self.expiry_timer.start(int(delay * 1000))
+    
+    def expire_timed_blocks(self):
+        """Removes all expired timed blocks in one batch"""
+        expired = self.expiry_queue.expire(self.firewall_manager)
+        if expired:
+            # Single INI write for the whole batch
+            for entry in expired:
+                self.block_status_manager.block_status[entry] = self.ip_block_status[entry]
+            self.block_status_manager.save_status()
+            
+            for entry in expired:
+                self.update_table_status(entry, self.ip_block_status[entry])
+            self.enforce_rule_budget()  # Freed room re-activates dormant entries
+            self.update_button_states()
+            self.refresh_peer_table()
+            self.status_bar.showMessage(f'{len(expired)} timed blocks expired' if len(expired) > 1
+                                        else f'Timed block of {expired[0]} expired')
+            self.block_status_manager.flush_history()
+        self.schedule_expiry_timer()
+    
+    def wake_dormant_entry(self, entry, skip_direction):
+        """Creates missing rules of a dormant entry, except for a direction the caller creates"""
+        status = self.ip_block_status.get(entry)
+        if not status or not status.get('dormant'):
+            return
+        del status['dormant']
+        for direction in ['in', 'out']:
+            if status[direction] and skip_direction not in [direction, 'both']:
+                self.firewall_manager.create_rule(entry, direction)
+    
+    def enforce_rule_budget(self, forced=(), save=True):
+        """Makes entries over the rule budget dormant and re-activates others when room frees up.
+        
+        Returns entries whose rules were created. With save=False the caller writes the INI file."""
+        has_dormant = any(status.get('dormant') for status in self.ip_block_status.values())
+        if not self.rule_budget.is_limited() and not has_dormant:
+            return []
+        
+        activated, deactivated = self.rule_budget.reconcile(
+            self.ip_block_status, self.ip_manager.get_interval, self.firewall_log_tailer.hits,
+            self.firewall_manager, forced)
+        
+        # Single INI write for all changed entries
+        for entry, status in self.ip_block_status.items():
+            if status['in'] or status['out'] or entry in self.block_status_manager.block_status:
+                self.block_status_manager.block_status[entry] = status
+        if save:
+            self.block_status_manager.save_status()
+        
+        for entry in activated + deactivated:
+            self.update_table_status(entry, self.ip_block_status[entry])
+        if deactivated:
+            self.status_bar.showMessage(f'Rule budget: {len(deactivated)} entries made dormant, '
+                                        f'{len(activated)} re-activated')
+        return activated
+    
+    def show_table_context_menu(self, position):
+        """Shows per-entry actions for the table"""
+        item = self.ip_table.itemAt(position)
+        if item is None:
+            return
+        entry = self.ip_table.item(item.row(), 0).text()
+        
+        menu = QMenu(self)
+        priority_action = menu.addAction('Set priority...')
+        
+        # Select rows by type column, state or a filter for batched F1/F2/F3
+        select_menu = menu.addMenu('Select')
+        row_type = self.ip_table.item(item.row(), 1).text()
+        select_actions = {
+            select_menu.addAction(f'All of type "{row_type}"'): lambda row, status: self.ip_table.item(row, 1).text() == row_type,
+            select_menu.addAction('Blocked'): lambda row, status: status['in'] or status['out'],
+            select_menu.addAction('Unblocked'): lambda row, status: not (status['in'] or status['out']),
+            select_menu.addAction('Dormant'): lambda row, status: bool(status.get('dormant')),
+        }
+        filter_action = select_menu.addAction('Matching filter...')
+        
+        chosen = menu.exec(self.ip_table.viewport().mapToGlobal(position))
+        if chosen == priority_action:
+            self.set_entry_priority(entry)
+        elif chosen == filter_action:
+            self.select_rows_by_filter()
+        elif chosen in select_actions:
+            self.select_rows(select_actions[chosen])
+    
+    def focus_search_box(self):
+        """Focuses the search box and selects its text (Ctrl+F)"""
+        self.search_box.setFocus()
+        self.search_box.selectAll()
+    
+    def apply_search(self, text):
+        """Shows only rows matching the search text and jumps to the best match"""
+        started = time.perf_counter()
+        text = text.strip()
+        if not text:
+            self.show_hidden_rows()
+            self.search_result_label.setText('')
+            return
+        
+        matches = [entry for entry in self.search_index.search(text) if entry in self.table_rows]
+        visible = {self.table_rows[entry] for entry in matches}
+        hidden = set(range(self.ip_table.rowCount())) - visible
+        
+        # Only rows whose visibility changed are touched; the rows themselves are not rebuilt
+        self.ip_table.setUpdatesEnabled(False)
+        for row in hidden - self.hidden_rows:
+            self.ip_table.setRowHidden(row, True)
+        for row in self.hidden_rows - hidden:
+            self.ip_table.setRowHidden(row, False)
+        self.hidden_rows = hidden
+        self.ip_table.setUpdatesEnabled(True)
+        
+        # Containing ranges come first, then prefix matches
+        if matches:
+            row = self.table_rows[matches[0]]
+            self.ip_table.selectRow(row)
+            self.ip_table.scrollToItem(self.ip_table.item(row, 0), QAbstractItemView.ScrollHint.PositionAtCenter)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.search_result_label.setText(f'{len(matches)} matches ({elapsed_ms:.1f} ms)')
+        self.annotation_timer.start()
+    
+    def show_hidden_rows(self):
+        """Shows all rows hidden by the search box"""
+        if not self.hidden_rows:
+            return
+        self.ip_table.setUpdatesEnabled(False)
+        for row in self.hidden_rows:
+            self.ip_table.setRowHidden(row, False)
+        self.hidden_rows = set()
+        self.ip_table.setUpdatesEnabled(True)
+    
+    def focus_search_result(self):
+        """Moves focus from the search box to the selected match (Enter)"""
+        if self.ip_table.currentRow() >= 0 and self.ip_table.currentRow() not in self.hidden_rows:
+            self.ip_table.setFocus()
+    
+    def select_rows(self, predicate):
+        """Selects all rows for which predicate(row, status) is true, returns their number"""
+        rows = [row for entry, row in self.table_rows.items()
+                if predicate(row, self.ip_block_status.get(entry, {'in': False, 'out': False}))]
+        
+        # Contiguous rows become one selection range so large selections stay cheap
+        selection = QItemSelection()
+        model = self.ip_table.model()
+        last_column = self.ip_table.columnCount() - 1
+        run_start = None
+        for row in sorted(rows):
+            if run_start is None:
+                run_start = previous = row
+            elif row != previous + 1:
+                selection.select(model.index(run_start, 0), model.index(previous, last_column))
+                run_start = row
+            previous = row
+        if run_start is not None:
+            selection.select(model.index(run_start, 0), model.index(previous, last_column))
+        self.ip_table.selectionModel().select(selection, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        
+        self.status_bar.showMessage(f'Selected {len(rows)} entries')
+        return len(rows)
+    
+    def select_rows_by_filter(self):
+        """Selects rows overlapping an IP/range/CIDR or containing text in any column"""
+        text, accepted = QInputDialog.getText(self, 'Select matching',
+                                              'IP, range or CIDR to overlap, or text to find (provider, country...):')
+        text = text.strip()
+        if not accepted or not text:
+            return
+        
+        parsed = parse_entry(text)
+        if parsed is not None:
+            _, start, end = parsed
+            def matches(row, status):
+                interval = self.ip_manager.get_interval(self.ip_table.item(row, 0).text())
+                return interval is not None and interval[0] <= end and start <= interval[1]
+        else:
+            needle = text.lower()
+            def matches(row, status):
+                for column in range(self.ip_table.columnCount()):
+                    cell = self.ip_table.item(row, column)
+                    if cell is not None and needle in cell.text().lower():
+                        return True
+                return False
+        self.select_rows(matches)
+    
+    def set_entry_priority(self, entry):
+        """Sets the priority tag used by the 'priority' eviction policy"""
+        status = self.ip_block_status.setdefault(entry, dict(self.block_status_manager.get_status(entry)))
+        priority, accepted = QInputDialog.getInt(
+            self, 'Priority', f'Priority for {entry} (higher keeps its rules longer):',
+            status.get('priority', 0), -1000, 1000)
+        if not accepted:
+            return
+        status['priority'] = priority
+        self.block_status_manager.update_status(entry, status)
+        self.enforce_rule_budget()
+    
+    def show_block_history_dialog(self):
+        """Shows block statistics for all entries"""
+        BlockHistoryDialog(self.block_status_manager.history, list(self.table_rows), self).exec()
+    
+    def show_allowlist_dialog(self):
+        """Opens the allowlist editor"""
+        AllowlistDialog(self.allowlist_manager, self.on_allowlist_changed, self).exec()
+    
+    def on_allowlist_changed(self, start, end):
+        """Re-creates only the blocked rules that overlap a changed allowlist entry"""
+        blocked_intervals = {}
+        for entry, status in self.ip_block_status.items():
+            # Dormant entries have no rules to re-create
+            if (status['in'] or status['out']) and not status.get('dormant'):
+                interval = self.ip_manager.get_interval(entry)
+                if interval is not None:
+                    blocked_intervals[entry] = interval
+        
+        affected = self.allowlist_manager.get_affected_entries(blocked_intervals, start, end)
+        self.firewall_manager.begin_batch()
+        try:
+            for entry in affected:
+                self.firewall_manager.update_rule(entry, self.ip_block_status[entry])
+        finally:
+            self.firewall_manager.submit_batch()
+        self.status_bar.showMessage(f'Allowlist updated, {len(affected)} blocked entries re-applied')
+    
     def update_buttons_state(self):
         """Updates button states based on selection"""
         has_selection = self.current_selected_ip is not None
+        self.expand_range_button.setEnabled(has_selection and not self.ip_manager.is_range(self.current_selected_ip))
         
         self.both_toggle.setEnabled(has_selection)
         self.in_toggle.setEnabled(has_selection)
@@ -1316,8 +2763,86 @@ class IPBlockerApp(QMainWindow):
         else:
             self.status_bar.showMessage('Global block is DISABLED. F1/F2/F3 will apply only to selected IP/range.')
     
+    def on_rule_scope_changed(self, state):
+        """Handler for the rule scope checkboxes: stores the scope and rewrites existing rules"""
+        program_setting = ''
+        if self.game_only_checkbox.isChecked():
+            program_setting = 'auto'
+            if not detect_game_executable():
+                path, _ = QFileDialog.getOpenFileName(self, 'Select the game executable', '',
+                                                      'Programs (*.exe);;All files (*)')
+                if not path:
+                    self.game_only_checkbox.blockSignals(True)
+                    self.game_only_checkbox.setChecked(False)
+                    self.game_only_checkbox.blockSignals(False)
+                    return
+                program_setting = os.path.normpath(path)
+        protocol = 'udp' if self.udp_only_checkbox.isChecked() else 'any'
+        
+        self.settings_manager.set_rule_scope(program_setting, protocol)
+        self.firewall_manager.set_scope(*self.settings_manager.get_rule_scope())
+        self.apply_rule_scope()
+    
+    def apply_rule_scope(self):
+        """Rewrites all enforced rules in one batch if they were created with another scope"""
+        scope = self.firewall_manager.get_scope()
+        if self.settings_manager.get_applied_rule_scope() == scope:
+            return False
+        
+        started = time.perf_counter()
+        commands = self.firewall_manager.rewrite_rules(self.block_status_manager.block_status)
+        self.settings_manager.set_applied_rule_scope(scope)
+        program, protocol = scope
+        scope_text = f"{os.path.basename(program) if program else 'all programs'}, {protocol.upper()}"
+        self.status_bar.showMessage(f'Rules now apply to {scope_text} '
+                                    f'({commands} firewall calls in {time.perf_counter() - started:.1f}s)')
+        return True
+    
+    def on_profiling_checkbox_changed(self, state):
+        """Handler for profiling checkbox change"""
+        enabled = state == Qt.CheckState.Checked.value
+        self.profiling_manager.set_enabled(enabled)
+        
+        if enabled:
+            self.status_bar.showMessage(f'Profiling ENABLED. Each action is saved to {self.profiling_manager.output_dir}')
+        else:
+            self.status_bar.showMessage('Profiling disabled')
+    
     def closeEvent(self, event):
         """Window close handler - fast exit without cleaning rules"""
+        # Keep measured netsh latency for plan estimates
+        if self.firewall_manager is not None:
+            self.settings_manager.set_call_time_estimates(self.firewall_manager)
+        
+        # Stop background pollers
+        if self.firewall_log_thread and self.firewall_log_thread.isRunning():
+            self.firewall_log_thread.stop()
+        
+        # Stop drift checks
+        if self.drift_thread and self.drift_thread.isRunning():
+            self.drift_thread.stop()
+        
+        # Stop control socket
+        if self.control_thread and self.control_thread.isRunning():
+            self.control_thread.stop()
+        
+        # Stop report uploads; reports not sent yet are kept on disk for the next start
+        if self.report_thread and self.report_thread.isRunning():
+            self.report_thread.stop()
+            self.report_thread.wait(1000)
+        
+        # Stop automatic blocking
+        if self.enforcement_thread and self.enforcement_thread.isRunning():
+            self.enforcement_thread.stop()
+        
+        # Stop annotation worker
+        if self.annotation_thread and self.annotation_thread.isRunning():
+            self.annotation_thread.stop()
+        
+        # Stop packet capture
+        if self.peer_capture_thread and self.peer_capture_thread.isRunning():
+            self.peer_capture_thread.stop()
+        
         # Stop hotkey handler first (non-blocking)
         if self.hotkey_manager.isRunning():
             self.hotkey_manager.stop()
@@ -1328,15 +2853,6 @@ class IPBlockerApp(QMainWindow):
         event.accept()
 
 
-def check_admin_privileges():
-    """Check if program is running with administrator privileges"""
-    try:
-        is_admin = ctypes.windll.shell32.IsUserAnAdmin()
-        return is_admin
-    except:
-        return False
-
-
 def show_admin_required_dialog():
     """Show dialog when administrator privileges are required"""
     app = QApplication.instance()
@@ -1383,6 +2899,7 @@ def main():
         return
     
     app = QApplication(sys.argv)
+    startup_timer.mark('qapplication')
     
     window = IPBlockerApp()
     window.show()
@@ -0,0 +1,299 @@
+"""
+Streaming peer discovery from packet captures (live or .pcap files)
+
+Packets are parsed in place through memoryview/struct.unpack_from, and
+per-remote-IP packet and byte rates are kept in a bounded LRU structure.
+No Qt imports here so it can be used headless.
+"""
+
+import sys
+import math
+import time
+import socket
+import struct
+import threading
+from collections import OrderedDict
+
+from core import ip_to_int, int_to_ip
+
+# Link-layer types from the pcap specification
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+IPPROTO_UDP = 17
+
+PCAP_GLOBAL_HEADER = struct.Struct('<IHHiIII')
+PCAP_RECORD_HEADER_LE = struct.Struct('<IIII')
+PCAP_RECORD_HEADER_BE = struct.Struct('>IIII')
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+
+# Address blocks that are never game peers (private, loopback, link-local, CGNAT, multicast, reserved)
+NON_PEER_BLOCKS = [
+    (ip_to_int('0.0.0.0'), ip_to_int('0.255.255.255')),
+    (ip_to_int('10.0.0.0'), ip_to_int('10.255.255.255')),
+    (ip_to_int('100.64.0.0'), ip_to_int('100.127.255.255')),
+    (ip_to_int('127.0.0.0'), ip_to_int('127.255.255.255')),
+    (ip_to_int('169.254.0.0'), ip_to_int('169.254.255.255')),
+    (ip_to_int('172.16.0.0'), ip_to_int('172.31.255.255')),
+    (ip_to_int('192.168.0.0'), ip_to_int('192.168.255.255')),
+    (ip_to_int('224.0.0.0'), ip_to_int('255.255.255.255')),
+]
+
+
+def is_peer_address(ip):
+    """Checks that integer IP can be a remote game peer"""
+    for start, end in NON_PEER_BLOCKS:
+        if start <= ip <= end:
+            return False
+    return True
+
+
+class PeerStats:
+    """Packet and byte counters with decaying rates for one remote IP"""
+    
+    __slots__ = ('ip', 'packets', 'bytes', 'first_seen', 'last_seen', 'packet_rate', 'byte_rate')
+    
+    def __init__(self, ip, timestamp):
+        self.ip = ip
+        self.packets = 0
+        self.bytes = 0
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.packet_rate = 0.0
+        self.byte_rate = 0.0
+    
+    def get_address(self):
+        """Returns dotted IP text"""
+        return int_to_ip(self.ip)
+
+
+class PeerTracker:
+    """Bounded LRU of PeerStats keyed by integer IP"""
+    
+    def __init__(self, max_peers=256, rate_window=5.0, on_new_peer=None):
+        self.max_peers = max_peers
+        self.rate_window = rate_window  # EWMA time constant in seconds
+        self.on_new_peer = on_new_peer  # Called with dotted IP when a peer is first seen
+        self.peers = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def add(self, ip, size, timestamp):
+        """Accounts one packet of size bytes from/to ip"""
+        with self.lock:
+            stats = self.peers.get(ip)
+            if stats is None:
+                stats = PeerStats(ip, timestamp)
+                self.peers[ip] = stats
+                if len(self.peers) > self.max_peers:
+                    self.peers.popitem(last=False)  # Evict least recently seen
+                if self.on_new_peer is not None:
+                    self.on_new_peer(int_to_ip(ip))
+            else:
+                self.peers.move_to_end(ip)
+            
+            # Exponentially decaying rate: converges to events per second
+            decay = math.exp(-max(timestamp - stats.last_seen, 0.0) / self.rate_window)
+            stats.packet_rate = stats.packet_rate * decay + 1.0 / self.rate_window
+            stats.byte_rate = stats.byte_rate * decay + size / self.rate_window
+            stats.packets += 1
+            stats.bytes += size
+            stats.last_seen = timestamp
+    
+    def get_active_peers(self, now=None, idle_timeout=15.0, limit=None):
+        """Returns [(address, packets, bytes, packet_rate, byte_rate, last_seen)] by packet rate"""
+        with self.lock:
+            peers = list(self.peers.values())
+        if now is None:
+            now = max((stats.last_seen for stats in peers), default=0.0)
+        
+        active = []
+        for stats in peers:
+            idle = now - stats.last_seen
+            if idle > idle_timeout:
+                continue
+            decay = math.exp(-max(idle, 0.0) / self.rate_window)
+            active.append((stats.get_address(), stats.packets, stats.bytes,
+                           stats.packet_rate * decay, stats.byte_rate * decay, stats.last_seen))
+        
+        active.sort(key=lambda peer: peer[3], reverse=True)
+        return active[:limit] if limit else active
+    
+    def clear(self):
+        """Forgets all peers"""
+        with self.lock:
+            self.peers.clear()
+
+
+class PeerDiscoveryEngine:
+    """Parses captured packets and feeds remote UDP peers into a PeerTracker"""
+    
+    def __init__(self, ports=None, local_ips=None, max_peers=256, on_new_peer=None):
+        self.ports = set(ports or [])  # Empty means all UDP ports
+        self.local_ips = {ip_to_int(ip) for ip in (local_ips or []) if ip_to_int(ip) is not None}
+        self.tracker = PeerTracker(max_peers, on_new_peer=on_new_peer)
+        self.packets_seen = 0
+        self.packets_matched = 0
+        self.chunk_size = 1 << 20
+    
+    def process_packet(self, data, timestamp, linktype):
+        """Parses one link-layer frame (memoryview) and updates the tracker"""
+        self.packets_seen += 1
+        
+        # Find IPv4 header offset for the link type
+        if linktype == LINKTYPE_ETHERNET:
+            if len(data) < 14:
+                return False
+            offset = 14
+            ethertype = (data[12] << 8) | data[13]
+            while ethertype in (0x8100, 0x88a8) and len(data) >= offset + 4:  # VLAN tags
+                ethertype = (data[offset + 2] << 8) | data[offset + 3]
+                offset += 4
+            if ethertype != 0x0800:
+                return False
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+            offset = 0
+        elif linktype == LINKTYPE_NULL:
+            if len(data) < 4:
+                return False
+            family = struct.unpack_from('<I', data, 0)[0]
+            if family != 2 and struct.unpack_from('>I', data, 0)[0] != 2:
+                return False
+            offset = 4
+        elif linktype == LINKTYPE_LINUX_SLL:
+            if len(data) < 16 or ((data[14] << 8) | data[15]) != 0x0800:
+                return False
+            offset = 16
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            if len(data) < 20 or ((data[0] << 8) | data[1]) != 0x0800:
+                return False
+            offset = 20
+        else:
+            return False
+        
+        if len(data) < offset + 20 or (data[offset] >> 4) != 4:
+            return False
+        
+        header_length = (data[offset] & 0x0F) * 4
+        if data[offset + 9] != IPPROTO_UDP:
+            return False
+        total_length, = struct.unpack_from('>H', data, offset + 2)
+        src, dst = struct.unpack_from('>II', data, offset + 12)
+        
+        # Port filter only possible on the first fragment
+        if self.ports:
+            fragment_offset = struct.unpack_from('>H', data, offset + 6)[0] & 0x1FFF
+            if fragment_offset or len(data) < offset + header_length + 4:
+                return False
+            src_port, dst_port = struct.unpack_from('>HH', data, offset + header_length)
+            if src_port not in self.ports and dst_port not in self.ports:
+                return False
+        
+        if src in self.local_ips or not is_peer_address(src):
+            remote = dst
+        else:
+            remote = src
+        if remote in self.local_ips or not is_peer_address(remote):
+            return False
+        
+        self.tracker.add(remote, total_length, timestamp)
+        self.packets_matched += 1
+        return True
+    
+    def read_pcap(self, path, stop_event=None):
+        """Streams a classic .pcap file through the engine, returns packets read"""
+        with open(path, 'rb') as pcap_file:
+            header = pcap_file.read(PCAP_GLOBAL_HEADER.size)
+            if len(header) < PCAP_GLOBAL_HEADER.size:
+                raise ValueError("Not a pcap file")
+            
+            magic = struct.unpack_from('<I', header, 0)[0]
+            if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+                byte_order = '<'
+            else:
+                magic = struct.unpack_from('>I', header, 0)[0]
+                if magic not in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+                    raise ValueError("Unsupported capture format (only classic pcap is supported)")
+                byte_order = '>'
+            
+            fraction = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+            linktype = struct.unpack_from(f'{byte_order}I', header, 20)[0] & 0xFFFF
+            record_header = PCAP_RECORD_HEADER_LE if byte_order == '<' else PCAP_RECORD_HEADER_BE
+            
+            packets = 0
+            pending = b''
+            while stop_event is None or not stop_event.is_set():
+                chunk = pcap_file.read(self.chunk_size)
+                if not chunk:
+                    break
+                buffer = pending + chunk if pending else chunk
+                view = memoryview(buffer)
+                offset = 0
+                end = len(buffer)
+                
+                # Parse all complete records in the chunk without copying
+                while offset + 16 <= end:
+                    ts_sec, ts_frac, incl_len, _ = record_header.unpack_from(view, offset)
+                    if offset + 16 + incl_len > end:
+                        break
+                    packet = view[offset + 16:offset + 16 + incl_len]
+                    self.process_packet(packet, ts_sec + ts_frac * fraction, linktype)
+                    offset += 16 + incl_len
+                    packets += 1
+                
+                pending = bytes(view[offset:])  # Only the partial tail is copied
+                view.release()
+            
+            return packets
+    
+    def capture_live(self, stop_event, local_ip=None):
+        """Captures packets from the network until stop_event is set"""
+        if sys.platform == 'win32':
+            # Raw socket in promiscuous mode delivers IPv4 packets (needs administrator)
+            local_ip = local_ip or get_default_local_ip()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_IP)
+            sock.bind((local_ip, 0))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 1)
+            sock.ioctl(socket.SIO_RCVALL, socket.RCVALL_ON)
+            linktype = LINKTYPE_RAW
+            self.local_ips.add(ip_to_int(local_ip))
+        else:
+            # Packet socket delivers Ethernet frames (needs root)
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0003))
+            linktype = LINKTYPE_ETHERNET
+            if local_ip:
+                self.local_ips.add(ip_to_int(local_ip))
+        
+        sock.settimeout(0.5)
+        buffer = bytearray(65536)
+        view = memoryview(buffer)
+        try:
+            while not stop_event.is_set():
+                try:
+                    size = sock.recv_into(buffer)
+                except socket.timeout:
+                    continue
+                self.process_packet(view[:size], time.time(), linktype)
+        finally:
+            if sys.platform == 'win32':
+                try:
+                    sock.ioctl(socket.SIO_RCVALL, socket.RCVALL_OFF)
+                except OSError:
+                    pass
+            sock.close()
+
+
+def get_default_local_ip():
+    """Returns the local address used for internet traffic"""
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect(('8.8.8.8', 53))  # No packets are sent for UDP connect
+        return probe.getsockname()[0]
+    except OSError:
+        return '0.0.0.0'
+    finally:
+        probe.close()
@@ -0,0 +1,263 @@
+"""
+Local IP-to-prefix/ASN database
+
+Imports TSV/CSV datasets (e.g. ip2asn "start<TAB>end<TAB>asn<TAB>country<TAB>name"
+or "prefix,asn,country,name" with CIDR prefixes) into a sorted, memory-mapped
+binary index. Nested prefixes are flattened at import time so every lookup is
+a single binary search. No Qt imports here.
+"""
+
+import os
+import sys
+import mmap
+import array
+import bisect
+import struct
+import time
+import threading
+
+from core import parse_entry, int_to_ip
+
+
+class PrefixDatabase:
+    """Memory-mapped interval index of provider prefixes.
+    
+    Layout (little-endian): 32-byte header, then uint32 sections of length
+    count: lookup_starts, lookup_ends, prefix_starts, prefix_ends, asns,
+    name_ids; 2-byte country codes padded to 4 bytes; uint32
+    name_offsets[name_count + 1] and the UTF-8 name blob."""
+    
+    MAGIC = b'CBPX'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHIIIQ4x')  # magic, version, reserved, count, name count, names size, created
+    
+    def __init__(self, path="prefix_db.bin"):
+        self.path = path
+        self.count = 0
+        self.created = 0
+        self._file = None
+        self._mmap = None
+        self._view = None
+        self._sections = {}
+        self.lock = threading.RLock()  # Lookups may run on a worker thread
+    
+    def import_file(self, source_path):
+        """Parses TSV/CSV dataset, writes the binary index and maps it. Returns record count"""
+        records = []
+        with open(source_path, 'r', encoding='utf-8', errors='replace') as source:
+            for line in source:
+                line = line.strip()
+                if not line or line[0] == '#':
+                    continue
+                record = self._parse_line(line)
+                # ip2asn marks unannounced space as "Not routed"
+                if record is not None and record[4] != 'Not routed':
+                    records.append(record)
+        
+        self.write(self._flatten(records))
+        self.load()
+        return len(records)
+    
+    def _parse_line(self, line):
+        """Parses one dataset line into (start, end, asn, country, name)"""
+        separator = '\t' if '\t' in line else ','
+        fields = [field.strip().strip('"') for field in line.split(separator)]
+        
+        # First column is either a CIDR prefix / a-b range, or start and end columns
+        parsed = None
+        if '/' in fields[0] or '-' in fields[0]:
+            parsed = parse_entry(fields[0])
+        if parsed is not None:
+            rest = fields[1:]
+        elif len(fields) >= 2:
+            parsed = parse_entry(f"{fields[0]}-{fields[1]}")
+            rest = fields[2:]
+        if parsed is None:
+            return None  # Header line or unsupported row
+        
+        _, start, end = parsed
+        asn_text = rest[0].upper().removeprefix('AS') if rest else '0'
+        asn = int(asn_text) if asn_text.isdigit() else 0
+        country = rest[1][:2].upper() if len(rest) > 1 else ''
+        name = rest[2] if len(rest) > 2 else ''
+        return start, end, asn, country, name
+    
+    def _flatten(self, records):
+        """Splits nested prefixes so the most specific one owns each address.
+        
+        Returns sorted, non-overlapping (lookup_start, lookup_end, record)."""
+        records.sort(key=lambda record: (record[0], -record[1]))
+        pieces = []
+        stack = []
+        cursor = 0
+        
+        def emit(start, end, record):
+            if start <= end:
+                pieces.append((start, end, record))
+        
+        for record in records:
+            # Close prefixes that end before this one starts
+            while stack and stack[-1][1] < record[0]:
+                top = stack.pop()
+                emit(cursor, top[1], top)
+                cursor = max(cursor, top[1] + 1)
+            if stack:
+                emit(cursor, record[0] - 1, stack[-1])
+            stack.append(record)
+            cursor = max(cursor, record[0])
+        
+        while stack:
+            top = stack.pop()
+            emit(cursor, top[1], top)
+            cursor = max(cursor, top[1] + 1)
+        
+        return pieces
+    
+    def write(self, pieces):
+        """Writes flattened pieces to the binary index file"""
+        names = {}
+        sections = {name: array.array('I') for name in
+                    ('lookup_starts', 'lookup_ends', 'prefix_starts', 'prefix_ends', 'asns', 'name_ids')}
+        countries = bytearray()
+        
+        for lookup_start, lookup_end, (start, end, asn, country, name) in pieces:
+            sections['lookup_starts'].append(lookup_start)
+            sections['lookup_ends'].append(lookup_end)
+            sections['prefix_starts'].append(start)
+            sections['prefix_ends'].append(end)
+            sections['asns'].append(asn)
+            sections['name_ids'].append(names.setdefault(name, len(names)))
+            countries += country.encode('ascii', 'replace')[:2].ljust(2, b' ')
+        countries += b'\0' * (-len(countries) % 4)
+        
+        encoded_names = [name.encode('utf-8') for name in names]
+        name_offsets = array.array('I', [0])
+        for data in encoded_names:
+            name_offsets.append(name_offsets[-1] + len(data))
+        name_blob = b''.join(encoded_names)
+        
+        for values in list(sections.values()) + [name_offsets]:
+            if sys.byteorder != 'little':
+                values.byteswap()
+        
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, 0, len(pieces), len(names),
+                                  len(name_blob), int(time.time()))
+        temp_path = f"{self.path}.tmp"
+        self.close()
+        with open(temp_path, 'wb') as index_file:
+            index_file.write(header)
+            for values in sections.values():
+                index_file.write(values)
+            index_file.write(countries)
+            index_file.write(name_offsets)
+            index_file.write(name_blob)
+        os.replace(temp_path, self.path)
+    
+    def load(self):
+        """Maps the index file, returns True on success"""
+        with self.lock:
+            return self._load()
+    
+    def _load(self):
+        """Maps the index file while holding the lock"""
+        self.close()
+        if not os.path.exists(self.path):
+            return False
+        
+        try:
+            self._file = open(self.path, 'rb')
+            size = os.fstat(self._file.fileno()).st_size
+            if size < self.HEADER.size:
+                raise ValueError("file too small")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+            
+            magic, version, _, count, name_count, names_size, created = self.HEADER.unpack_from(self._view, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError(f"unsupported prefix database format {magic!r} v{version}")
+            
+            countries_size = 2 * count + (-(2 * count) % 4)
+            expected = self.HEADER.size + 24 * count + countries_size + 4 * (name_count + 1) + names_size
+            if size != expected:
+                raise ValueError(f"size mismatch ({size} != {expected})")
+            
+            offset = self.HEADER.size
+            for name in ('lookup_starts', 'lookup_ends', 'prefix_starts', 'prefix_ends', 'asns', 'name_ids'):
+                self._sections[name] = self._section(offset, count)
+                offset += 4 * count
+            self._sections['countries'] = self._view[offset:offset + 2 * count]
+            offset += countries_size
+            self._sections['name_offsets'] = self._section(offset, name_count + 1)
+            offset += 4 * (name_count + 1)
+            self._sections['names'] = self._view[offset:offset + names_size]
+            
+            self.count = count
+            self.created = created
+            return True
+        except Exception as e:
+            print(f"Error loading prefix database: {e}")
+            self.close()
+            return False
+    
+    def _section(self, offset, count):
+        """Returns uint32 view of a section without copying on little-endian"""
+        view = self._view[offset:offset + 4 * count]
+        if sys.byteorder == 'little':
+            return view.cast('I')
+        values = array.array('I', view)
+        values.byteswap()
+        return values
+    
+    def is_loaded(self):
+        """Checks if an index is mapped"""
+        return self._view is not None
+    
+    def lookup(self, ip):
+        """Returns provider info dict for integer ip, or None (one binary search)"""
+        with self.lock:
+            return self._lookup(ip)
+    
+    def _lookup(self, ip):
+        """Binary search over the mapped sections while holding the lock"""
+        if not self.count:
+            return None
+        sections = self._sections
+        position = bisect.bisect_right(sections['lookup_starts'], ip) - 1
+        if position < 0 or sections['lookup_ends'][position] < ip:
+            return None
+        
+        name_id = sections['name_ids'][position]
+        name_start = sections['name_offsets'][name_id]
+        name_end = sections['name_offsets'][name_id + 1]
+        start = sections['prefix_starts'][position]
+        end = sections['prefix_ends'][position]
+        return {
+            'start': start,
+            'end': end,
+            'entry': f"{int_to_ip(start)}-{int_to_ip(end)}" if start != end else int_to_ip(start),
+            'asn': sections['asns'][position],
+            'country': bytes(sections['countries'][2 * position:2 * position + 2]).decode('ascii').strip(),
+            'name': str(sections['names'][name_start:name_end], 'utf-8'),
+        }
+    
+    def close(self):
+        """Releases the memory map"""
+        with self.lock:
+            self._close()
+    
+    def _close(self):
+        """Releases the views and the mapping while holding the lock"""
+        for view in self._sections.values():
+            if isinstance(view, memoryview):
+                view.release()
+        self._sections = {}
+        self.count = 0
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,196 @@
+"""
+Opt-in upload queue for cheater reports to a list curator's collector
+
+Manual blocks of addresses outside the list (session peers) are queued as
+reports of peer IP, direction and time. add() only appends to memory and
+wakes the uploader, so the hotkey path never waits on disk or network. The
+uploader thread keeps pending reports in a JSON file (replaced atomically),
+sends them as gzip-compressed JSON batches with one POST each, backs off
+exponentially on failure and drops reports of an IP already reported
+within the dedupe window. No Qt imports here.
+"""
+
+import os
+import gzip
+import json
+import time
+import random
+import threading
+import urllib.error
+import urllib.request
+
+REPORT_FORMAT_VERSION = 1
+
+
+class ReportQueue:
+    """Durable, deduplicated, batched report queue with exponential backoff"""
+    
+    def __init__(self, url, path="report_queue.json", batch_size=100, batch_delay=5.0,
+                 dedupe_seconds=86400, backoff_base=5.0, backoff_max=3600.0, timeout=10.0):
+        self.url = url
+        self.path = path
+        self.batch_size = max(batch_size, 1)
+        self.batch_delay = batch_delay  # Seconds to wait for more reports before sending a batch
+        self.dedupe_seconds = dedupe_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.incoming = []  # Reports added since the uploader last looked, not on disk yet
+        self.pending = []  # Reports on disk waiting to be sent, oldest first
+        self.reported = {}  # ip -> time it was last queued, for deduplication
+        self.failures = 0
+        self.retry_at = 0.0
+        self.sent = 0
+        self.last_error = ''
+        self.load()
+    
+    def load(self):
+        """Reads pending reports and dedupe times left by an earlier run"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as queue_file:
+                state = json.load(queue_file)
+            self.pending = list(state.get('pending', []))
+            self.reported = {ip: float(reported_at) for ip, reported_at in state.get('reported', {}).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading report queue: {e}")
+    
+    def save(self):
+        """Writes pending reports and dedupe times (temporary file, then replace)"""
+        cutoff = time.time() - self.dedupe_seconds
+        self.reported = {ip: reported_at for ip, reported_at in self.reported.items() if reported_at >= cutoff}
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as queue_file:
+                json.dump({'pending': self.pending, 'reported': self.reported}, queue_file, separators=(',', ':'))
+                queue_file.flush()
+                os.fsync(queue_file.fileno())
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Error saving report queue: {e}")
+    
+    def add(self, ip, direction, timestamp=None, **context):
+        """Queues a report without touching disk or network (safe on the hotkey path)"""
+        report = {'ip': ip, 'direction': direction, 'time': int(time.time() if timestamp is None else timestamp)}
+        report.update(context)
+        with self.lock:
+            self.incoming.append(report)
+        self.wake_event.set()
+    
+    def get_pending_count(self):
+        """Returns the number of reports not sent yet"""
+        with self.lock:
+            return len(self.pending) + len(self.incoming)
+    
+    def take_incoming(self):
+        """Moves new reports to the durable queue, dropping recently reported IPs"""
+        with self.lock:
+            incoming, self.incoming = self.incoming, []
+        if not incoming:
+            return False
+        
+        cutoff = time.time() - self.dedupe_seconds
+        added = False
+        # pending is read by get_pending_count() on other threads
+        with self.lock:
+            for report in incoming:
+                if self.reported.get(report['ip'], 0) >= cutoff:
+                    continue
+                self.reported[report['ip']] = report['time']
+                self.pending.append(report)
+                added = True
+        self.save()
+        return added
+    
+    def encode_batch(self, reports):
+        """Returns the gzip-compressed JSON body of one upload"""
+        body = {'version': REPORT_FORMAT_VERSION, 'sent_at': int(time.time()), 'reports': reports}
+        return gzip.compress(json.dumps(body, separators=(',', ':')).encode('utf-8'))
+    
+    def send_batch(self, reports):
+        """POSTs one batch, returns True if the collector accepted it.
+        
+        Raises ValueError if the collector rejected it for good (4xx other than 408/429)."""
+        request = urllib.request.Request(self.url, data=self.encode_batch(reports), method='POST', headers={
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'User-Agent': 'CheatersBlocker',
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return 200 <= response.status < 300
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code not in (408, 429):
+                raise ValueError(f"collector rejected reports: HTTP {e.code}")
+            self.last_error = f"HTTP {e.code}"
+        except Exception as e:
+            self.last_error = str(e)
+        return False
+    
+    def get_backoff(self):
+        """Returns seconds to wait after the current number of failures (with jitter)"""
+        delay = min(self.backoff_base * (2 ** (self.failures - 1)), self.backoff_max)
+        return delay * random.uniform(0.8, 1.2)
+    
+    def flush(self):
+        """Sends pending reports in batches until done or a send fails, returns the number sent"""
+        self.take_incoming()
+        sent = 0
+        while self.pending:
+            batch = self.pending[:self.batch_size]
+            try:
+                accepted = self.send_batch(batch)
+            except ValueError as e:
+                # Resending would fail the same way: drop the batch instead of blocking the queue
+                print(f"Dropping {len(batch)} reports: {e}")
+                with self.lock:
+                    del self.pending[:len(batch)]
+                self.save()
+                continue
+            if not accepted:
+                self.failures += 1
+                self.retry_at = time.monotonic() + self.get_backoff()
+                print(f"Report upload failed ({self.last_error}), retrying in {self.retry_at - time.monotonic():.0f}s")
+                break
+            
+            self.failures = 0
+            self.retry_at = 0.0
+            with self.lock:
+                del self.pending[:len(batch)]
+            self.save()
+            sent += len(batch)
+        self.sent += sent
+        return sent
+    
+    def run(self, stop_event, on_sent=None):
+        """Uploads reports until stopped; on_sent(count) is called after successful sends"""
+        while not stop_event.is_set():
+            # Sleep until a report arrives, or the backoff ends if reports are waiting
+            timeout = None
+            if self.pending:
+                timeout = max(self.retry_at - time.monotonic(), 0.0)
+            self.wake_event.wait(timeout)
+            self.wake_event.clear()
+            if stop_event.is_set():
+                break
+            
+            if self.take_incoming() and len(self.pending) < self.batch_size:
+                # Let a burst of blocks end up in one batch
+                stop_event.wait(self.batch_delay)
+                self.take_incoming()
+            if not self.pending or time.monotonic() < self.retry_at:
+                continue
+            sent = self.flush()
+            if sent and on_sent is not None:
+                on_sent(sent)
+        # Reports added just before exit are kept for the next run
+        self.take_incoming()
+    
+    def wake(self):
+        """Wakes run() early, e.g. after its stop event was set"""
+        self.wake_event.set()
@@ -0,0 +1,66 @@
+"""
+Shared test setup: makes the application modules importable and provides
+stub executables that stand in for system tools (nft, conntrack).
+"""
+
+import os
+import sys
+import stat
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubTool:
+    """Shell script that logs its arguments and stdin and replies with canned output per option"""
+    
+    def __init__(self, directory, name):
+        self.path = os.path.join(directory, name)
+        self.base = os.path.join(directory, f"{name}-reply")
+        self.log_path = os.path.join(directory, f"{name}.log")
+        with open(self.path, 'w') as script:
+            script.write(f"""#!/bin/sh
+echo "ARGS $*" >> "{self.log_path}"
+for last in "$@"; do :; done
+[ "$last" = "-" ] && cat >> "{self.log_path}"
+echo "END" >> "{self.log_path}"
+reply="{self.base}$1"
+[ -f "$reply.out" ] && cat "$reply.out"
+[ -f "$reply.err" ] && cat "$reply.err" >&2
+[ -f "$reply.code" ] && exit "$(cat "$reply.code")"
+exit 0
+""")
+        os.chmod(self.path, os.stat(self.path).st_mode | stat.S_IXUSR)
+    
+    def reply(self, option, stdout='', stderr='', returncode=0):
+        """Sets what runs with the given first argument print and return"""
+        for suffix, content in (('.out', stdout), ('.err', stderr), ('.code', str(returncode))):
+            with open(self.base + option + suffix, 'w') as reply_file:
+                reply_file.write(content)
+    
+    def get_calls(self):
+        """Returns [(args, stdin text)] of all runs so far"""
+        if not os.path.exists(self.log_path):
+            return []
+        calls = []
+        with open(self.log_path) as log_file:
+            for line in log_file.read().splitlines():
+                if line.startswith('ARGS '):
+                    calls.append((line[5:], []))
+                elif line != 'END' and calls:
+                    calls[-1][1].append(line)
+        return [(args, '\n'.join(stdin)) for args, stdin in calls]
+    
+    def clear(self):
+        """Forgets the runs so far"""
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+
+@pytest.fixture
+def stub_tool(tmp_path):
+    """Creates StubTool scripts in a temporary directory"""
+    if sys.platform == 'win32':
+        pytest.skip("stub tools are shell scripts")
+    return lambda name: StubTool(str(tmp_path), name)
@@ -0,0 +1,89 @@
+"""
+Writes the sample .pcap files used by test_peer_discovery.py
+
+Every capture holds the same game traffic behind a different link layer:
+an inbound and an outbound UDP packet of peer 5.6.7.8, and a TCP packet
+of 5.6.7.9 that peer discovery ignores. ethernet.pcap adds VLAN tags,
+non-IPv4 frames, local-only traffic and a gateway with a public address.
+Run it from anywhere: python tests/data/make_captures.py
+"""
+
+import os
+import socket
+import struct
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_TIME = 1760000000
+PAYLOAD = bytes(range(64))
+
+
+def ipv4(src, dst, protocol=17, src_port=3074, dst_port=3074):
+    """Returns an IPv4 packet with a UDP (or minimal TCP) header and PAYLOAD"""
+    if protocol == 17:
+        transport = struct.pack('>HHHH', src_port, dst_port, 8 + len(PAYLOAD), 0)
+    else:
+        transport = struct.pack('>HHIIBBHHH', src_port, dst_port, 1, 0, 0x50, 0x02, 64240, 0, 0)
+    total_length = 20 + len(transport) + len(PAYLOAD)
+    header = struct.pack('>BBHHHBBH4s4s', 0x45, 0, total_length, 1, 0, 64, protocol, 0,
+                         socket.inet_aton(src), socket.inet_aton(dst))
+    return header + transport + PAYLOAD
+
+
+def ethernet(packet, ethertype=0x0800, vlans=()):
+    """Wraps a packet in an Ethernet frame with optional (tpid, vlan id) tags"""
+    frame = bytes.fromhex('001122334455') + bytes.fromhex('66778899aabb')
+    for tpid, vlan_id in vlans:
+        frame += struct.pack('>HH', tpid, vlan_id)
+    return frame + struct.pack('>H', ethertype) + packet
+
+
+def linux_sll(packet):
+    """Wraps a packet in a Linux cooked capture v1 header"""
+    return struct.pack('>HHH8sH', 0, 1, 6, bytes.fromhex('66778899aabb0000'), 0x0800) + packet
+
+
+def linux_sll2(packet):
+    """Wraps a packet in a Linux cooked capture v2 header"""
+    return struct.pack('>HHIHBB8s', 0x0800, 0, 2, 1, 0, 6, bytes.fromhex('66778899aabb0000')) + packet
+
+
+def loopback(packet, byte_order='<'):
+    """Wraps a packet in a BSD loopback (NULL) header in the capturing host's byte order"""
+    return struct.pack(f'{byte_order}I', 2) + packet
+
+
+GAME_TRAFFIC = [
+    ipv4('5.6.7.8', '192.168.1.10'),
+    ipv4('192.168.1.10', '5.6.7.8'),
+    ipv4('5.6.7.9', '192.168.1.10', protocol=6, src_port=443, dst_port=50000),
+]
+
+
+def write_pcap(name, linktype, frames, byte_order='<', nanoseconds=False):
+    """Writes frames a quarter second apart as a classic pcap file"""
+    magic = 0xa1b23c4d if nanoseconds else 0xa1b2c3d4
+    records = [struct.pack(f'{byte_order}IHHiIII', magic, 2, 4, 0, 0, 65535, linktype)]
+    for index, frame in enumerate(frames):
+        fraction = (index + 1) * 250000 * (1000 if nanoseconds else 1)
+        records.append(struct.pack(f'{byte_order}IIII', BASE_TIME, fraction, len(frame), len(frame)) + frame)
+    with open(os.path.join(DATA_DIR, name), 'wb') as pcap_file:
+        pcap_file.write(b''.join(records))
+
+
+def main():
+    write_pcap('ethernet.pcap', 1, [ethernet(packet) for packet in GAME_TRAFFIC[:2]] + [
+        ethernet(GAME_TRAFFIC[2], vlans=[(0x8100, 10)]),
+        ethernet(ipv4('203.0.113.5', '192.168.1.10', src_port=3478, dst_port=3479), vlans=[(0x88a8, 100), (0x8100, 10)]),
+        ethernet(bytes(28), ethertype=0x0806),  # ARP
+        ethernet(ipv4('192.168.1.10', '192.168.1.1', dst_port=53)),
+        ethernet(ipv4('198.51.100.7', '5.6.7.10')),
+    ])
+    write_pcap('raw.pcap', 101, GAME_TRAFFIC)
+    write_pcap('ipv4.pcap', 228, GAME_TRAFFIC, byte_order='>')
+    write_pcap('null.pcap', 0, [loopback(GAME_TRAFFIC[0]), loopback(GAME_TRAFFIC[1], '>'), loopback(GAME_TRAFFIC[2])])
+    write_pcap('linux_sll.pcap', 113, [linux_sll(packet) for packet in GAME_TRAFFIC], nanoseconds=True)
+    write_pcap('linux_sll2.pcap', 276, [linux_sll2(packet) for packet in GAME_TRAFFIC], byte_order='>', nanoseconds=True)
+
+
+if __name__ == '__main__':
+    main()
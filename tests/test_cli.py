@@ -0,0 +1,88 @@
+"""Tests of headless operations against a stub nft in a temporary working directory"""
+
+import pytest
+
+from cli import HeadlessBlocker
+
+TABLE = 'inet cheatersblocker'
+MISSING_TABLE = "Error: No such file or directory; did you mean table 'filter' in family inet?\n"
+
+
+@pytest.fixture
+def blocker(stub_tool, tmp_path, monkeypatch):
+    """Returns (HeadlessBlocker on the nftables backend, nft stub) with settings and status in tmp_path"""
+    nft = stub_tool('nft')
+    nft.reply('-j', stderr=MISSING_TABLE, returncode=1)
+    (tmp_path / 'settings.ini').write_text(f"[Settings]\nfirewall_backend = nftables\nnft_path = {nft.path}\n")
+    monkeypatch.chdir(tmp_path)
+    return HeadlessBlocker(), nft
+
+
+def block(blocker, entry, dormant=False):
+    """Marks entry blocked in both directions, creating its rules unless dormant"""
+    status = {'in': True, 'out': True}
+    if dormant:
+        status['dormant'] = True
+    else:
+        blocker.firewall_manager.create_rule(entry)
+    blocker.block_status_manager.block_status[entry] = status
+
+
+def get_transaction(nft):
+    """Returns the lines of the only `nft -f -` run"""
+    stdins = [stdin for args, stdin in nft.get_calls() if args == '-f -']
+    assert len(stdins) == 1
+    return stdins[0].splitlines()
+
+
+def test_allowlist_change_skips_dormant_entries(blocker):
+    blocker, nft = blocker
+    block(blocker, '1.2.3.0-1.2.3.255')
+    block(blocker, '5.6.7.0-5.6.7.255', dormant=True)
+    nft.clear()
+    
+    changed, affected = blocker.update_allowlist(['1.2.3.4', '5.6.7.8'])
+    
+    assert changed == ['1.2.3.4', '5.6.7.8']
+    assert affected == ['1.2.3.0-1.2.3.255']
+    stdin = '\n'.join(stdin for _, stdin in nft.get_calls())
+    assert '1.2.3.5-1.2.3.255' in stdin
+    assert '5.6.7' not in stdin
+    assert all('5.6.7.0-5.6.7.255' not in entries for entries in blocker.firewall_manager.entries.values())
+
+
+def test_update_rule_ignores_dormant_status(blocker):
+    blocker, nft = blocker
+    nft.clear()
+    
+    blocker.firewall_manager.update_rule('5.6.7.0-5.6.7.255', {'in': True, 'out': True, 'dormant': True})
+    
+    assert nft.get_calls() == []
+
+
+def test_allowlist_change_is_one_transaction(blocker):
+    blocker, nft = blocker
+    for entry in ['1.2.3.0-1.2.3.255', '1.2.4.0-1.2.4.255', '1.2.6.0-1.2.6.255']:
+        block(blocker, entry)
+    nft.clear()
+    
+    _, affected = blocker.update_allowlist(['1.2.0.0-1.2.255.255'])
+    
+    assert len(affected) == 3
+    assert [args for args, _ in nft.get_calls()] == ['-f -']
+
+
+def test_expired_blocks_are_removed_in_one_transaction(blocker):
+    blocker, nft = blocker
+    entries = ['1.2.3.0-1.2.3.255', '1.2.5.0-1.2.5.255', '1.2.7.0-1.2.7.255']
+    for entry in entries:
+        block(blocker, entry)
+        blocker.block_status_manager.block_status[entry]['expires_at'] = 1.0
+    nft.clear()
+    
+    assert sorted(blocker.expire()) == entries
+    assert [args for args, _ in nft.get_calls()] == ['-f -']
+    elements = ', '.join(entries)
+    assert get_transaction(nft) == [f'delete element {TABLE} block_in {{ {elements} }}',
+                                    f'delete element {TABLE} block_out {{ {elements} }}']
+    assert blocker.firewall_manager.entries == {'in': {}, 'out': {}}
@@ -0,0 +1,104 @@
+"""Tests of the control socket transports, token handshake and rejection of foreign protocols"""
+
+import os
+import socket
+import stat
+import threading
+import time
+
+import pytest
+
+from control import ControlDispatcher, ControlServer, send_commands
+
+TOKEN = 'a3f1c2d4e5b6a7980112233445566778'
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def dispatcher(calls):
+    dispatcher = ControlDispatcher()
+    dispatcher.register('block', lambda args: calls.append(('block', args)) or "in=1 out=1")
+    return dispatcher
+
+
+@pytest.fixture
+def start_server(dispatcher):
+    """Runs servers on background threads until the test ends"""
+    stop_event = threading.Event()
+    threads = []
+    
+    def start(**options):
+        server = ControlServer(dispatcher, **options)
+        thread = threading.Thread(target=server.run, args=(stop_event,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline:
+            if (server.path is None and server.port) or (server.path is not None and os.path.exists(server.path)):
+                return server
+            time.sleep(0.01)
+        raise TimeoutError("control server did not start")
+    
+    yield start
+    stop_event.set()
+    for thread in threads:
+        thread.join(5.0)
+
+
+def exchange(port, data):
+    """Sends raw bytes over TCP, returns everything the server wrote before closing"""
+    with socket.create_connection(('127.0.0.1', port), timeout=5.0) as sock:
+        sock.sendall(data)
+        received = b''
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return received.decode('utf-8')
+            received += chunk
+
+
+def test_tcp_needs_a_token():
+    with pytest.raises(ValueError):
+        ControlServer(ControlDispatcher(), 0)
+
+
+def test_tcp_commands_after_the_handshake(start_server, calls):
+    server = start_server(port=0, token=TOKEN)
+    replies = send_commands(['PING', 'BLOCK in 1.2.3.4'], server.port, token=TOKEN)
+    assert replies == ['OK pong', 'OK in=1 out=1']
+    assert calls == [('block', ['in', '1.2.3.4'])]
+
+
+def test_wrong_token_is_rejected(start_server, calls):
+    server = start_server(port=0, token=TOKEN)
+    assert send_commands(['BLOCK 1.2.3.4'], server.port, token='guess') == ['ERR unauthorized']
+    assert exchange(server.port, b"BLOCK 1.2.3.4\n") == "ERR unauthorized\n"
+    assert calls == []
+
+
+def test_http_request_runs_nothing(start_server, calls):
+    server = start_server(port=0, token=TOKEN)
+    request = (b"POST / HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: text/plain\r\n\r\n"
+               b"AUTH " + TOKEN.encode() + b"\nBLOCK 1.2.3.4\n")
+    assert exchange(server.port, request) == "ERR unauthorized\n"
+    assert calls == []
+
+
+def test_connection_closes_at_the_first_unknown_line(start_server, calls):
+    server = start_server(port=0, token=TOKEN)
+    data = f"AUTH {TOKEN}\nBLOCK 1.1.1.1\nHost: evil.example\nBLOCK 2.2.2.2\n".encode()
+    assert exchange(server.port, data) == "OK authenticated\nOK in=1 out=1\nERR unknown command Host:\n"
+    assert calls == [('block', ['1.1.1.1'])]
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="no Unix sockets")
+def test_unix_socket_is_owner_only(start_server, calls, tmp_path):
+    path = str(tmp_path / 'control.sock')
+    start_server(path=path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert send_commands(['BLOCK out 5.6.7.8', 'STATS'], path=path)[0] == 'OK in=1 out=1'
+    assert calls == [('block', ['out', '5.6.7.8'])]
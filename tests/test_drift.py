@@ -0,0 +1,72 @@
+"""Tests of drift repair batching and its share of the check budget"""
+
+from core import FirewallRuleManager
+from drift import DriftDetector, DriftReport, record_repair
+
+
+class FakeBatch:
+    """Recorded repair that counts its submissions"""
+    
+    def __init__(self):
+        self.submitted = 0
+    
+    def submit_batch(self):
+        """Counts instead of running netsh"""
+        self.submitted += 1
+        return 0
+
+
+def create_detector(monkeypatch):
+    """Returns (detector, list of enumerations) with netsh listing no rules"""
+    listings = []
+    
+    def enumerate_rules():
+        listings.append(1)
+        return []
+    
+    detector = DriftDetector()
+    monkeypatch.setattr(detector, 'enumerate_rules', enumerate_rules)
+    return detector, listings
+
+
+def test_repair_is_one_netsh_script(monkeypatch):
+    runs = []
+    monkeypatch.setattr('core.subprocess.run', lambda command, **kwargs: runs.append(command))
+    monkeypatch.setattr('core.subprocess.CREATE_NO_WINDOW', 0, raising=False)
+    report = DriftReport(missing=[('1.2.3.4', 'in'), ('5.6.7.0-5.6.7.255', 'out')],
+                         changed=[('9.9.9.9', 'in')], extra=['IPBlocker_8_8_8_8_IN'])
+    recorder = FirewallRuleManager().create_recorder()
+    
+    record_repair(report, recorder)
+    assert [action for action, _, _ in recorder.recording] == ['delete', 'add', 'add', 'add', 'delete']
+    assert runs == []
+    
+    assert recorder.submit_batch() == 5
+    assert len(runs) == 1
+    assert runs[0][:2] == ['netsh', '-f']
+
+
+def test_queued_repair_takes_the_next_check(monkeypatch):
+    detector, listings = create_detector(monkeypatch)
+    assert detector.check() is not None
+    batch = FakeBatch()
+    
+    detector.queue_repair(batch, detector.generation)
+    assert detector.check() is None
+    assert batch.submitted == 1
+    assert listings == [1]  # The repair replaced the poll
+    
+    # The check after a repair lists and diffs again
+    assert detector.check() is not None
+    assert batch.submitted == 1
+
+
+def test_stale_repair_is_dropped(monkeypatch):
+    detector, listings = create_detector(monkeypatch)
+    batch = FakeBatch()
+    detector.queue_repair(batch, detector.generation)
+    detector.reset()  # Saved status changed after the diff
+    
+    assert detector.check() is None
+    assert batch.submitted == 0
+    assert detector.check() is not None
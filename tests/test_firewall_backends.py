@@ -0,0 +1,225 @@
+"""Tests of the nftables backend and conntrack flow termination against stub nft/conntrack scripts"""
+
+import json
+
+from core import ip_to_int
+from firewall_backends import NftablesBackend, merge_intervals, parse_set_element
+
+TABLE = 'inet cheatersblocker'
+MISSING_TABLE = "Error: No such file or directory; did you mean table 'filter' in family inet?\n"
+
+
+def make_listing(in_elements, out_elements, chains=('input', 'forward', 'output')):
+    """Returns `nft -j list table` output with the given set elements"""
+    objects = [{'metainfo': {'version': '1.0.2', 'json_schema_version': 1}},
+               {'table': {'family': 'inet', 'name': 'cheatersblocker', 'handle': 7}}]
+    for name, elements in (('block_in', in_elements), ('block_out', out_elements)):
+        set_object = {'family': 'inet', 'name': name, 'table': 'cheatersblocker', 'type': 'ipv4_addr',
+                      'handle': 1, 'flags': ['interval']}
+        if elements:
+            set_object['elem'] = elements
+        objects.append({'set': set_object})
+    for chain in chains:
+        objects.append({'chain': {'family': 'inet', 'table': 'cheatersblocker', 'name': chain, 'handle': 3,
+                                  'type': 'filter', 'hook': chain, 'prio': 0, 'policy': 'accept'}})
+    return json.dumps({'nftables': objects})
+
+
+def get_transactions(nft):
+    """Returns the stdin of every `nft -f -` run"""
+    return [stdin.splitlines() for args, stdin in nft.get_calls() if args == '-f -']
+
+
+def create_backend(stub_tool, listing=None):
+    """Returns (backend, nft stub) with the table missing from the kernel unless a listing is given"""
+    nft = stub_tool('nft')
+    if listing is None:
+        nft.reply('-j', stderr=MISSING_TABLE, returncode=1)
+    else:
+        nft.reply('-j', stdout=listing)
+    return NftablesBackend(nft_path=nft.path), nft
+
+
+def test_first_change_installs_the_whole_table(stub_tool):
+    backend, nft = create_backend(stub_tool)
+    backend.create_rule('1.2.3.4')
+    
+    calls = nft.get_calls()
+    assert [args for args, _ in calls] == [f'-j list table {TABLE}', '-f -']
+    script = get_transactions(nft)[0]
+    assert script[:3] == [f'table {TABLE}', f'delete table {TABLE}', f'table {TABLE} {{']
+    assert script.count('\t\t\t1.2.3.4') == 2  # In both sets
+    assert '\t\tip saddr @block_in drop' in script
+    assert backend.applied == {'in': [(ip_to_int('1.2.3.4'),) * 2], 'out': [(ip_to_int('1.2.3.4'),) * 2]}
+
+
+def test_later_changes_are_element_diffs(stub_tool):
+    backend, nft = create_backend(stub_tool)
+    backend.create_rule('1.2.3.4')
+    nft.clear()
+    
+    backend.create_rule('5.6.7.0/24', 'in')
+    backend.create_rule('5.6.8.0/24', 'in')
+    backend.delete_rule('1.2.3.4')
+    
+    assert [args for args, _ in nft.get_calls()] == ['-f -'] * 3
+    assert get_transactions(nft) == [
+        [f'add element {TABLE} block_in {{ 5.6.7.0-5.6.7.255 }}'],
+        # Adjacent entries merge, so the old element is deleted before the grown one is added
+        [f'delete element {TABLE} block_in {{ 5.6.7.0-5.6.7.255 }}',
+         f'add element {TABLE} block_in {{ 5.6.7.0-5.6.8.255 }}'],
+        [f'delete element {TABLE} block_in {{ 1.2.3.4 }}',
+         f'delete element {TABLE} block_out {{ 1.2.3.4 }}'],
+    ]
+
+
+def test_batch_is_one_transaction(stub_tool):
+    backend, nft = create_backend(stub_tool)
+    backend.create_rule('1.2.3.4')
+    nft.clear()
+    
+    backend.begin_batch()
+    backend.create_rule('10.1.0.0/16')
+    backend.create_rule('20.0.0.1', 'out')
+    backend.delete_rule('1.2.3.4', 'in')
+    assert nft.get_calls() == []
+    statements = backend.submit_batch()
+    
+    assert get_transactions(nft) == [[
+        f'delete element {TABLE} block_in {{ 1.2.3.4 }}',
+        f'add element {TABLE} block_in {{ 10.1.0.0-10.1.255.255 }}',
+        f'add element {TABLE} block_out {{ 10.1.0.0-10.1.255.255, 20.0.0.1 }}',
+    ]]
+    assert statements == 3
+
+
+def test_failed_transaction_reinstalls_the_table(stub_tool):
+    backend, nft = create_backend(stub_tool)
+    backend.create_rule('1.2.3.4')
+    nft.reply('-f', stderr="Error: Could not process rule: No such file or directory\n", returncode=1)
+    backend.create_rule('1.2.3.5')
+    assert backend.applied is None
+    
+    nft.reply('-f')
+    nft.clear()
+    backend.create_rule('1.2.3.6')
+    # The table is listed again and, being unreadable, installed from scratch
+    assert [args for args, _ in nft.get_calls()] == [f'-j list table {TABLE}', '-f -']
+    assert get_transactions(nft)[0][1] == f'delete table {TABLE}'
+
+
+def test_new_process_continues_from_kernel_sets(stub_tool):
+    listing = make_listing(['1.2.3.4', {'range': ['5.6.7.0', '5.6.7.255']}],
+                           [{'prefix': {'addr': '10.0.0.0', 'len': 8}}])
+    backend, nft = create_backend(stub_tool, listing)
+    
+    backend.begin_batch()
+    backend.create_rule('1.2.3.4', 'in')
+    backend.create_rule('5.6.7.0/24', 'in')
+    backend.create_rule('10.0.0.0/8', 'out')
+    assert backend.submit_batch() == 0
+    assert [args for args, _ in nft.get_calls()] == [f'-j list table {TABLE}']
+    
+    backend.create_rule('9.9.9.9', 'out')
+    assert get_transactions(nft) == [[f'add element {TABLE} block_out {{ 9.9.9.9 }}']]
+
+
+def test_read_applied(stub_tool):
+    listing = make_listing(['1.2.3.4', {'range': ['5.6.7.0', '5.6.7.255']}], [])
+    backend, _ = create_backend(stub_tool, listing)
+    assert backend.read_applied() == {
+        'in': [(ip_to_int('1.2.3.4'),) * 2, (ip_to_int('5.6.7.0'), ip_to_int('5.6.7.255'))],
+        'out': [],
+    }
+
+
+def test_read_applied_rejects_foreign_tables(stub_tool):
+    # A chain is missing
+    backend, _ = create_backend(stub_tool, make_listing(['1.2.3.4'], [], chains=('input', 'forward')))
+    assert backend.read_applied() is None
+    # An element format this version does not know
+    backend, _ = create_backend(stub_tool, make_listing([{'set': ['1.2.3.4']}], []))
+    assert backend.read_applied() is None
+    # Counters were switched on since the table was installed
+    backend, _ = create_backend(stub_tool, make_listing(['1.2.3.4'], []))
+    backend.counters = True
+    assert backend.read_applied() is None
+
+
+def test_parse_set_element():
+    assert parse_set_element('1.2.3.4') == (ip_to_int('1.2.3.4'),) * 2
+    assert parse_set_element({'range': ['5.6.7.0', '5.6.7.255']}) == (ip_to_int('5.6.7.0'), ip_to_int('5.6.7.255'))
+    assert parse_set_element({'prefix': {'addr': '10.0.0.0', 'len': 8}}) == (ip_to_int('10.0.0.0'), ip_to_int('10.255.255.255'))
+    assert parse_set_element({'elem': {'val': '1.2.3.4', 'counter': {'packets': 1, 'bytes': 60}}}) == (ip_to_int('1.2.3.4'),) * 2
+    assert parse_set_element({'elem': {'val': {'range': ['1.0.0.0', '1.0.0.9']}}}) == (ip_to_int('1.0.0.0'), ip_to_int('1.0.0.9'))
+    assert parse_set_element('not an address') is None
+    assert parse_set_element({'set': ['1.2.3.4']}) is None
+
+
+def test_merge_intervals():
+    assert merge_intervals([(5, 9), (1, 3), (4, 4), (20, 30), (25, 26)]) == [(1, 9), (20, 30)]
+
+
+def test_drop_counts_from_element_counters(stub_tool):
+    backend, nft = create_backend(stub_tool)
+    backend.counters = True
+    backend.begin_batch()
+    backend.create_rule('1.2.3.4', 'in')
+    backend.create_rule('1.2.3.5', 'in')
+    backend.create_rule('8.8.8.8', 'out')
+    backend.submit_batch()
+    assert '\t\tcounter' in get_transactions(nft)[0]
+    
+    counted = {'elem': {'val': {'range': ['1.2.3.4', '1.2.3.5']}, 'counter': {'packets': 3, 'bytes': 180}}}
+    silent = {'elem': {'val': '8.8.8.8', 'counter': {'packets': 0, 'bytes': 0}}}
+    nft.reply('-j', stdout=make_listing([counted], [silent]))
+    # Adjacent entries share the merged element and its count
+    assert backend.get_drop_counts(['1.2.3.4', '1.2.3.5', '8.8.8.8']) == {'1.2.3.4': 3, '1.2.3.5': 3, '8.8.8.8': 0}
+
+
+CONNTRACK_LISTING = """\
+udp      17 29 src=192.168.1.10 dst=5.6.7.8 sport=3074 dport=3074 src=5.6.7.8 dst=203.0.113.1 sport=3074 dport=3074 mark=0 use=1
+udp      17 25 src=5.6.7.9 dst=203.0.113.1 sport=3075 dport=3074 src=192.168.1.10 dst=5.6.7.9 sport=3074 dport=3075 mark=0 use=1
+udp      17 12 src=192.168.1.10 dst=8.8.8.8 sport=5353 dport=53 src=8.8.8.8 dst=203.0.113.1 sport=53 dport=5353 mark=0 use=1
+"""
+
+
+def test_terminate_flows_of_blocked_entries(stub_tool):
+    backend, _ = create_backend(stub_tool)
+    conntrack = stub_tool('conntrack')
+    conntrack.reply('-L', stdout=CONNTRACK_LISTING,
+                    stderr="conntrack v1.4.6 (conntrack-tools): 3 flow entries have been shown.\n")
+    conntrack.reply('-D', stderr="conntrack v1.4.6 (conntrack-tools): 1 flow entries have been deleted.\n")
+    backend.conntrack.conntrack_path = conntrack.path
+    backend.set_scope(protocol='udp')
+    backend.create_rule('5.6.7.0/24')
+    
+    assert backend.terminate_flows(['5.6.7.0/24']) == 2
+    # One listing, then one deletion per peer address on the side it appeared on
+    assert [args for args, _ in conntrack.get_calls()] == [
+        '-L -f ipv4 -p udp',
+        '-D -d 5.6.7.8 -f ipv4 -p udp',
+        '-D -s 5.6.7.9 -f ipv4 -p udp',
+    ]
+
+
+def test_terminate_flows_that_already_ended(stub_tool, capsys):
+    backend, _ = create_backend(stub_tool)
+    conntrack = stub_tool('conntrack')
+    conntrack.reply('-L', stdout=CONNTRACK_LISTING)
+    conntrack.reply('-D', stderr="conntrack v1.4.6 (conntrack-tools): 0 flow entries have been deleted.\n",
+                    returncode=1)
+    backend.conntrack.conntrack_path = conntrack.path
+    backend.create_rule('8.8.8.8', 'out')
+    
+    assert backend.terminate_flows(['8.8.8.8']) == 0
+    assert [args for args, _ in conntrack.get_calls()] == ['-L -f ipv4', '-D -d 8.8.8.8 -f ipv4']
+    assert 'Error' not in capsys.readouterr().out
+
+
+def test_terminate_without_flows(stub_tool):
+    backend, _ = create_backend(stub_tool)
+    conntrack = stub_tool('conntrack')
+    backend.conntrack.conntrack_path = conntrack.path
+    assert backend.terminate_flows(['1.2.3.4']) == 0  # Not blocked: nothing to look up
+    assert conntrack.get_calls() == []
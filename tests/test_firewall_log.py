@@ -0,0 +1,130 @@
+"""Tests of the incremental firewall log parser on a sample pfirewall.log"""
+
+import os
+import shutil
+
+import pytest
+
+from core import ip_to_int
+from firewall_log import FirewallLogTailer
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'pfirewall.log')
+ENTRIES = {
+    'peers': (ip_to_int('5.6.7.0'), ip_to_int('5.6.7.255')),
+    'host': (ip_to_int('203.0.113.5'), ip_to_int('203.0.113.5')),
+    'dns': (ip_to_int('1.1.1.1'), ip_to_int('1.1.1.1')),
+}
+SAMPLE_HITS = {'peers': (2, '2026-10-18 21:04:13'), 'host': (1, '2026-10-18 21:04:12')}
+LATE_DROP = b"2026-10-18 21:05:00 DROP UDP 5.6.7.20 192.168.1.10 3074 3074 0 - - - - - - - RECEIVE 0\r\n"
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = str(tmp_path / 'pfirewall.log')
+    shutil.copyfile(SAMPLE_LOG, path)
+    return path
+
+
+def create_tailer(log_path, chunk_size=None):
+    """Returns a tailer of the log with its state next to it"""
+    tailer = FirewallLogTailer(log_path, os.path.join(os.path.dirname(log_path), 'firewall_log.ini'))
+    if chunk_size is not None:
+        tailer.chunk_size = chunk_size
+    tailer.set_entries(ENTRIES)
+    return tailer
+
+
+def append(path, data):
+    with open(path, 'ab') as log_file:
+        log_file.write(data)
+
+
+def test_counts_drops_by_direction(log_path):
+    # ALLOW lines, the local side of a drop and addresses outside the blocklist are not counted
+    assert create_tailer(log_path).poll() == SAMPLE_HITS
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 1 << 20])
+def test_chunk_boundaries(log_path, chunk_size):
+    tailer = create_tailer(log_path, chunk_size)
+    assert tailer.poll() == SAMPLE_HITS
+    assert tailer.offset == os.path.getsize(log_path)
+
+
+def test_partial_last_line_waits_for_the_rest(log_path):
+    tailer = create_tailer(log_path, chunk_size=16)
+    size = os.path.getsize(log_path)
+    append(log_path, LATE_DROP[:30])
+    assert tailer.poll() == SAMPLE_HITS
+    assert tailer.offset == size
+    
+    append(log_path, LATE_DROP[30:])
+    assert tailer.poll() == {'peers': (3, '2026-10-18 21:05:00')}
+    assert tailer.poll() == {}
+
+
+def test_appended_lines_are_counted_once(log_path):
+    tailer = create_tailer(log_path)
+    tailer.poll()
+    append(log_path, LATE_DROP)
+    assert tailer.poll() == {'peers': (3, '2026-10-18 21:05:00')}
+    assert tailer.get_hits('host') == (1, '2026-10-18 21:04:12')
+    assert tailer.get_hits('dns') == (0, '')
+
+
+def test_state_survives_a_restart(log_path):
+    create_tailer(log_path).poll()
+    
+    tailer = create_tailer(log_path)
+    assert tailer.get_hits('peers') == SAMPLE_HITS['peers']
+    assert tailer.poll() == {}
+    append(log_path, LATE_DROP)
+    assert tailer.poll() == {'peers': (3, '2026-10-18 21:05:00')}
+
+
+def test_truncated_log_is_read_from_the_start(log_path):
+    tailer = create_tailer(log_path)
+    tailer.poll()
+    with open(log_path, 'wb') as log_file:
+        log_file.write(LATE_DROP)
+    assert tailer.poll() == {'peers': (3, '2026-10-18 21:05:00')}
+    assert tailer.offset == len(LATE_DROP)
+
+
+def test_rotated_log_is_read_from_the_start(log_path):
+    tailer = create_tailer(log_path)
+    tailer.poll()
+    # Windows renames the full log to pfirewall.log.old and starts a new one, here one that is larger
+    rotated = log_path + '.new'
+    with open(SAMPLE_LOG, 'rb') as sample, open(rotated, 'wb') as log_file:
+        log_file.write(sample.read() + LATE_DROP)
+    os.replace(log_path, log_path + '.old')
+    os.replace(rotated, log_path)
+    assert tailer.poll() == {'peers': (5, '2026-10-18 21:05:00'), 'host': (2, '2026-10-18 21:04:12')}
+
+
+def test_fields_header_sets_the_columns(log_path):
+    with open(log_path, 'wb') as log_file:
+        log_file.write(b"#Fields: date time path action protocol dst-ip src-ip\r\n"
+                       b"2026-10-18 22:00:00 SEND DROP UDP 203.0.113.5 192.168.1.10\r\n"
+                       b"2026-10-18 22:00:01 RECEIVE DROP UDP 192.168.1.10 5.6.7.8\r\n")
+    tailer = create_tailer(log_path)
+    assert tailer.poll() == {'host': (1, '2026-10-18 22:00:00'), 'peers': (1, '2026-10-18 22:00:01')}
+    assert tailer.fields[:3] == ['date', 'time', 'path']
+
+
+def test_lines_wait_until_there_are_entries(log_path):
+    tailer = create_tailer(log_path)
+    tailer.set_entries({})
+    assert tailer.poll() == {}
+    assert tailer.offset == 0
+    tailer.set_entries(ENTRIES)
+    assert tailer.poll() == SAMPLE_HITS
+
+
+def test_skip_to_end_ignores_earlier_lines(log_path):
+    tailer = create_tailer(log_path)
+    tailer.skip_to_end()
+    assert tailer.poll() == {}
+    append(log_path, LATE_DROP)
+    assert tailer.poll() == {'peers': (1, '2026-10-18 21:05:00')}
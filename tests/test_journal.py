@@ -0,0 +1,27 @@
+"""Tests of the transaction journal's checkpoint state"""
+
+from journal import TransactionJournal
+
+
+def test_only_a_checkpoint_counts_as_clean(tmp_path):
+    journal = TransactionJournal(str(tmp_path / 'transactions.journal'))
+    assert not journal.is_checkpointed()  # First run
+    
+    journal.checkpoint()
+    assert journal.is_checkpointed()
+    
+    transaction = journal.begin('block', 'both', {'1.2.3.4': {'in': False, 'out': False}})
+    transaction.mark_done(['1.2.3.4'])
+    assert not journal.is_checkpointed()  # Open operation, as after a crash
+    
+    transaction.commit()
+    assert journal.is_checkpointed()
+
+
+def test_torn_journal_is_not_clean(tmp_path):
+    path = tmp_path / 'transactions.journal'
+    path.write_text('{"op":"checkpoint","time":1}\n{"op":"beg')
+    assert not TransactionJournal(str(path)).is_checkpointed()
+    
+    path.write_text('{"op":"chec')
+    assert not TransactionJournal(str(path)).is_checkpointed()
@@ -0,0 +1,92 @@
+"""Tests of pcap parsing and peer tracking on the sample captures in tests/data"""
+
+import os
+import shutil
+
+import pytest
+
+from peer_discovery import PeerDiscoveryEngine, PeerTracker
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+BASE_TIME = 1760000000
+PACKET_SIZE = 20 + 8 + 64
+LINK_CAPTURES = ['raw.pcap', 'ipv4.pcap', 'null.pcap', 'linux_sll.pcap', 'linux_sll2.pcap', 'ethernet.pcap']
+
+
+def read_capture(name, chunk_size=None, **options):
+    """Returns (engine, packets read) after streaming a sample capture"""
+    engine = PeerDiscoveryEngine(**options)
+    if chunk_size is not None:
+        engine.chunk_size = chunk_size
+    return engine, engine.read_pcap(os.path.join(DATA_DIR, name))
+
+
+def get_peers(engine):
+    """Returns {address: (packets, bytes, last_seen)}"""
+    return {peer[0]: (peer[1], peer[2], peer[5]) for peer in engine.tracker.get_active_peers(idle_timeout=3600)}
+
+
+@pytest.mark.parametrize('name', LINK_CAPTURES)
+def test_link_types(name):
+    # Little and big endian, micro and nanosecond captures all yield the same game peer
+    engine, packets = read_capture(name)
+    peers = get_peers(engine)
+    assert peers['5.6.7.8'] == (2, 2 * PACKET_SIZE, pytest.approx(BASE_TIME + 0.5))
+    assert '5.6.7.9' not in peers  # TCP
+    if name != 'ethernet.pcap':
+        assert (packets, engine.packets_matched) == (3, 2)
+
+
+def test_ethernet_frames():
+    engine, packets = read_capture('ethernet.pcap')
+    assert packets == engine.packets_seen == 7
+    # Double VLAN tags are skipped; ARP and LAN-only traffic are not peers
+    assert set(get_peers(engine)) == {'5.6.7.8', '203.0.113.5', '198.51.100.7'}
+
+
+def test_local_addresses_pick_the_remote_side():
+    engine, _ = read_capture('ethernet.pcap', local_ips=['198.51.100.7'])
+    assert set(get_peers(engine)) == {'5.6.7.8', '203.0.113.5', '5.6.7.10'}
+
+
+def test_port_filter():
+    engine, _ = read_capture('ethernet.pcap', ports=[3074])
+    assert set(get_peers(engine)) == {'5.6.7.8', '198.51.100.7'}
+
+
+@pytest.mark.parametrize('chunk_size', [1, 17, 100, 1 << 20])
+def test_chunk_boundaries(chunk_size):
+    engine, packets = read_capture('linux_sll2.pcap', chunk_size)
+    assert packets == 3
+    assert get_peers(engine)['5.6.7.8'][:2] == (2, 2 * PACKET_SIZE)
+
+
+def test_truncated_capture_stops_at_the_last_complete_record(tmp_path):
+    path = str(tmp_path / 'truncated.pcap')
+    shutil.copyfile(os.path.join(DATA_DIR, 'raw.pcap'), path)
+    with open(path, 'r+b') as pcap_file:
+        pcap_file.truncate(os.path.getsize(path) - 10)
+    engine = PeerDiscoveryEngine()
+    engine.chunk_size = 64
+    assert engine.read_pcap(path) == 2
+
+
+def test_rejects_other_formats(tmp_path):
+    path = str(tmp_path / 'capture.pcapng')
+    with open(path, 'wb') as pcap_file:
+        pcap_file.write(bytes.fromhex('0a0d0d0a1c0000004d3c2b1a') + bytes(16))
+    with pytest.raises(ValueError):
+        PeerDiscoveryEngine().read_pcap(path)
+
+
+def test_tracker_evicts_least_recently_seen():
+    seen = []
+    tracker = PeerTracker(max_peers=2, on_new_peer=seen.append)
+    tracker.add(1, 100, 10.0)
+    tracker.add(2, 100, 11.0)
+    tracker.add(1, 100, 12.0)
+    tracker.add(3, 100, 13.0)
+    assert seen == ['0.0.0.1', '0.0.0.2', '0.0.0.3']
+    assert {peer[0] for peer in tracker.get_active_peers()} == {'0.0.0.1', '0.0.0.3'}
+    # Peers idle for longer than the timeout are left out
+    assert [peer[0] for peer in tracker.get_active_peers(now=25.0, idle_timeout=12.5)] == ['0.0.0.3']
@@ -0,0 +1,185 @@
+"""Tests of the report upload queue against a local HTTP collector"""
+
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from reports import REPORT_FORMAT_VERSION, ReportQueue
+
+
+class Collector:
+    """Local HTTP server that records uploaded batches and answers with scripted status codes"""
+    
+    def __init__(self):
+        self.batches = []  # Decoded bodies of all requests, accepted or not
+        self.headers = []
+        self.statuses = []  # Status codes of the next requests, 200 when empty
+        collector = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                collector.headers.append(dict(self.headers))
+                collector.batches.append(json.loads(gzip.decompress(body)))
+                status = collector.statuses.pop(0) if collector.statuses else 200
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/reports"
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+    
+    def get_reported_ips(self, batch_index):
+        return [report['ip'] for report in self.batches[batch_index]['reports']]
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def collector():
+    collector = Collector()
+    yield collector
+    collector.close()
+
+
+@pytest.fixture
+def create_queue(collector, tmp_path):
+    """Returns a factory of queues sharing one queue file, like restarts of the app"""
+    path = str(tmp_path / 'report_queue.json')
+    return lambda **options: ReportQueue(collector.url, path, **{'batch_delay': 0.0, 'timeout': 5.0, **options})
+
+
+def test_sends_gzip_batches(collector, create_queue):
+    queue = create_queue(batch_size=2)
+    for index in range(5):
+        queue.add(f"5.6.7.{index}", 'both', timestamp=1000 + index, source='hotkey')
+    assert queue.get_pending_count() == 5
+    
+    assert queue.flush() == 5
+    assert [len(batch['reports']) for batch in collector.batches] == [2, 2, 1]
+    assert collector.headers[0]['Content-Encoding'] == 'gzip'
+    assert collector.headers[0]['Content-Type'] == 'application/json'
+    assert collector.batches[0]['version'] == REPORT_FORMAT_VERSION
+    assert collector.batches[0]['reports'][0] == {'ip': '5.6.7.0', 'direction': 'both', 'time': 1000, 'source': 'hotkey'}
+    assert collector.get_reported_ips(2) == ['5.6.7.4']
+    assert queue.get_pending_count() == 0
+    assert queue.sent == 5
+
+
+def test_dedupes_recently_reported_ips(collector, create_queue):
+    queue = create_queue()
+    queue.add('5.6.7.8', 'in')
+    queue.add('5.6.7.8', 'out')
+    queue.add('5.6.7.9', 'in')
+    assert queue.flush() == 2
+    
+    # Still within the window after a restart
+    queue = create_queue()
+    queue.add('5.6.7.8', 'both')
+    assert queue.flush() == 0
+    assert len(collector.batches) == 1
+    assert collector.get_reported_ips(0) == ['5.6.7.8', '5.6.7.9']
+
+
+def test_reports_again_after_the_dedupe_window(collector, create_queue):
+    queue = create_queue(dedupe_seconds=60)
+    queue.add('5.6.7.8', 'in', timestamp=time.time() - 120)
+    queue.flush()
+    queue.add('5.6.7.8', 'in')
+    assert queue.flush() == 1
+    assert len(collector.batches) == 2
+
+
+def test_backs_off_after_server_errors(collector, create_queue):
+    queue = create_queue(batch_size=1, backoff_base=5.0, backoff_max=60.0)
+    collector.statuses = [503]
+    queue.add('5.6.7.8', 'in')
+    queue.add('5.6.7.9', 'in')
+    
+    assert queue.flush() == 0
+    assert queue.failures == 1
+    assert 4.0 - 0.5 <= queue.retry_at - time.monotonic() <= 6.0
+    assert queue.get_pending_count() == 2  # The failed batch stays first in line
+    assert 'HTTP 503' in queue.last_error
+    
+    queue.failures = 2
+    assert 8.0 <= queue.get_backoff() <= 12.0
+    queue.failures = 10
+    assert queue.get_backoff() <= 60.0 * 1.2
+    queue.failures = 1
+    
+    assert queue.flush() == 2
+    assert queue.failures == 0 and queue.retry_at == 0.0
+    assert [collector.get_reported_ips(index) for index in range(3)] == [['5.6.7.8'], ['5.6.7.8'], ['5.6.7.9']]
+
+
+def test_retries_rate_limited_batches(collector, create_queue):
+    queue = create_queue()
+    collector.statuses = [429]
+    queue.add('5.6.7.8', 'in')
+    assert queue.flush() == 0
+    assert queue.get_pending_count() == 1
+
+
+def test_drops_permanently_rejected_batches(collector, create_queue, capsys):
+    queue = create_queue(batch_size=1)
+    collector.statuses = [400]
+    queue.add('5.6.7.8', 'in')
+    queue.add('5.6.7.9', 'in')
+    
+    # The rejected batch does not block the one behind it
+    assert queue.flush() == 1
+    assert queue.failures == 0
+    assert queue.get_pending_count() == 0
+    assert 'Dropping 1 reports: collector rejected reports: HTTP 400' in capsys.readouterr().out
+    assert create_queue().get_pending_count() == 0
+
+
+def test_queue_survives_a_restart(collector, create_queue):
+    queue = create_queue()
+    collector.statuses = [500]
+    queue.add('5.6.7.8', 'in')
+    queue.add('5.6.7.9', 'out')
+    assert queue.flush() == 0
+    
+    queue = create_queue()
+    assert queue.get_pending_count() == 2
+    assert queue.flush() == 2
+    assert collector.get_reported_ips(1) == ['5.6.7.8', '5.6.7.9']
+    assert create_queue().get_pending_count() == 0
+
+
+def test_run_keeps_reports_added_before_exit(collector, create_queue):
+    queue = create_queue()
+    stop_event = threading.Event()
+    sent = []
+    uploader = threading.Thread(target=queue.run, args=(stop_event, sent.append))
+    uploader.start()
+    
+    queue.add('5.6.7.8', 'in')
+    deadline = time.monotonic() + 5.0
+    while not sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sent == [1]
+    
+    stop_event.set()
+    queue.add('5.6.7.9', 'in')
+    queue.wake()
+    uploader.join(5.0)
+    assert not uploader.is_alive()
+    
+    queue = create_queue()
+    assert queue.get_pending_count() == 1
+    assert queue.flush() == 1
+    assert collector.get_reported_ips(1) == ['5.6.7.9']